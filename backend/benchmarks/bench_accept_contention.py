@@ -0,0 +1,94 @@
+"""N deliverers racing to accept the same pending order.
+
+Compares the old read-then-write accept (find_one, check, update_one) with
+the guarded find_one_and_update in utils.transitions. Needs a real MongoDB:
+set MONGODB_URL (default mongodb://localhost:27017); the benchmark works in
+a throwaway database and drops it afterwards.
+
+Usage: python -m benchmarks.bench_accept_contention [--acceptors N] [--rounds R]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from models.schemas import OrderStatus
+from utils.database import close_mongo_connection, connect_to_mongo, database
+from utils.transitions import ACCEPTOR, transition_order, transition_timestamps
+
+BENCH_DB = "owlhacks_delivery_bench"
+
+async def legacy_accept(db, order_id: str, deliverer_id: str) -> bool:
+    """The pre-transition-engine accept_order: two round trips, no guard on the write"""
+    order = await db.orders.find_one({"_id": ObjectId(order_id)})
+    if order["status"] != OrderStatus.PENDING or order["customer_id"] == deliverer_id:
+        return False
+    await db.orders.update_one(
+        {"_id": ObjectId(order_id)},
+        {"$set": {"deliverer_id": deliverer_id, "status": OrderStatus.ACCEPTED, "accepted_at": datetime.utcnow()}}
+    )
+    return True
+
+async def guarded_accept(db, order_id: str, deliverer_id: str) -> bool:
+    try:
+        await transition_order(
+            order_id, OrderStatus.ACCEPTED, deliverer_id, ACCEPTOR,
+            set_fields={"deliverer_id": deliverer_id, **transition_timestamps(OrderStatus.ACCEPTED)}
+        )
+        return True
+    except HTTPException:
+        return False
+
+async def race(db, accept, acceptors: int):
+    result = await db.orders.insert_one({
+        "customer_id": "customer",
+        "status": OrderStatus.PENDING,
+        "delivery_points": 10,
+        "created_at": datetime.utcnow()
+    })
+    order_id = str(result.inserted_id)
+
+    async def timed(deliverer_id):
+        start = time.perf_counter()
+        won = await accept(db, order_id, deliverer_id)
+        return won, (time.perf_counter() - start) * 1e3
+
+    outcomes = await asyncio.gather(*(timed(f"deliverer-{i}") for i in range(acceptors)))
+    final = await db.orders.find_one({"_id": result.inserted_id})
+    winners = [won for won, _ in outcomes if won]
+    return len(winners), final["deliverer_id"], [latency for _, latency in outcomes]
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--acceptors", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    await connect_to_mongo()
+    database.database = database.client[BENCH_DB]
+    db = database.database
+    try:
+        print(f"{args.acceptors} concurrent acceptors x {args.rounds} orders")
+        print(f"{'mode':>8} {'winners/order':>14} {'multi-win orders':>17} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, accept in (("legacy", legacy_accept), ("guarded", guarded_accept)):
+            winner_counts, latencies = [], []
+            for _ in range(args.rounds):
+                winners, _, round_latencies = await race(db, accept, args.acceptors)
+                winner_counts.append(winners)
+                latencies.extend(round_latencies)
+            latencies.sort()
+            print(
+                f"{name:>8} {statistics.mean(winner_counts):>14.2f} "
+                f"{sum(1 for count in winner_counts if count > 1):>17} "
+                f"{statistics.median(latencies):>8.2f} {latencies[int(0.99 * (len(latencies) - 1))]:>8.2f}"
+            )
+    finally:
+        await database.client.drop_database(BENCH_DB)
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
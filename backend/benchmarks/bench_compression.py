@@ -0,0 +1,112 @@
+"""Bytes on the wire and CPU per response for each encoding, on representative route payloads.
+
+Bodies are rendered the way the routes render them, then pushed through
+CompressionMiddleware in 64 KB chunks as a streaming response would be.
+CPU is process time per response, so it is what one worker spends.
+
+Usage: python -m benchmarks.bench_compression [--repeat N] [--orders N]
+"""
+import argparse
+import asyncio
+import base64
+import io
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+
+from PIL import Image
+
+from benchmarks.bench_order_list import make_orders
+from models.schemas import Establishment, Order
+from routers.establishments import TEMPLE_ESTABLISHMENTS
+from utils import compression
+from utils.compression import CompressionMiddleware
+from utils.serialization import dumps, documents_response, models_response
+
+STREAM_CHUNK = 64 * 1024
+
+def photo_data_url(rng: random.Random) -> str:
+    """A phone-sized JPEG as the legacy inline completion_image_url"""
+    image = Image.new("RGB", (800, 600))
+    image.putdata([(x % 256, (x // 800 + rng.randrange(8)) % 256, 128) for x in range(800 * 600)])
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=80)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+def payloads(order_count: int) -> Dict[str, bytes]:
+    rng = random.Random(42)
+    orders = make_orders(order_count, rng)
+    with_images = [dict(order, completion_image_url=photo_data_url(rng)) for order in orders[:10]]
+    establishments = [Establishment(_id=f"{i:024x}", **est) for i, est in enumerate(TEMPLE_ESTABLISHMENTS)]
+    return {
+        f"GET /orders/my-orders ({order_count} orders)": documents_response(orders, Order).body,
+        "GET /orders/my-orders?include_images (10 orders)": documents_response(with_images, Order).body,
+        "GET /establishments/": models_response(establishments, Establishment).body,
+        "GET /establishments/{id}/menu": dumps(TEMPLE_ESTABLISHMENTS[1]["menu_items"]),
+    }
+
+def make_app(body: bytes):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        for offset in range(0, len(body), STREAM_CHUNK):
+            chunk = body[offset:offset + STREAM_CHUNK]
+            await send({"type": "http.response.body", "body": chunk, "more_body": offset + STREAM_CHUNK < len(body)})
+    return app
+
+def through_middleware(body: bytes, accept_encoding: str) -> Callable[[], int]:
+    middleware = CompressionMiddleware(make_app(body))
+    scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    loop = asyncio.new_event_loop()
+
+    def run() -> int:
+        sent = 0
+
+        async def send(message):
+            nonlocal sent
+            sent += len(message.get("body", b""))
+
+        loop.run_until_complete(middleware(scope, None, send))
+        return sent
+    return run
+
+def cpu_per_call(repeat: int, fn: Callable[[], int]) -> Tuple[float, int]:
+    size = fn()
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat, size
+
+def settings() -> List[Tuple[str, str, dict]]:
+    """(label, Accept-Encoding, module settings) for each configuration measured"""
+    configs = [("identity", "identity", {})]
+    configs += [(f"gzip -{level}", "gzip", {"GZIP_LEVEL": level}) for level in (1, 6, 9)]
+    if compression.brotli is not None:
+        configs += [(f"br q{quality}", "br", {"BROTLI_QUALITY": quality}) for quality in (1, 4, 11)]
+    return configs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--orders", type=int, default=50)
+    args = parser.parse_args()
+
+    defaults = {"GZIP_LEVEL": compression.GZIP_LEVEL, "BROTLI_QUALITY": compression.BROTLI_QUALITY}
+    if compression.brotli is None:
+        print("brotli is not installed; measuring gzip only")
+    print(f"defaults: gzip -{defaults['GZIP_LEVEL']}, br q{defaults['BROTLI_QUALITY']}, "
+          f"minimum {compression.COMPRESSION_MIN_BYTES} bytes")
+    for route, body in payloads(args.orders).items():
+        print(f"\n{route}: {len(body):,} bytes uncompressed")
+        print(f"{'encoding':<10} {'bytes':>11} {'ratio':>7} {'cpu ms':>9} {'MB/s':>8}")
+        for label, accept, overrides in settings():
+            for name, value in overrides.items():
+                setattr(compression, name, value)
+            seconds, size = cpu_per_call(args.repeat, through_middleware(body, accept))
+            for name, value in defaults.items():
+                setattr(compression, name, value)
+            throughput = len(body) / seconds / 1e6 if seconds else float("inf")
+            print(f"{label:<10} {size:>11,} {size / len(body):>7.1%} {seconds * 1e3:>9.3f} {throughput:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compare scalar calculate_distance against the vectorized batch engine.
+
+Usage: python -m benchmarks.bench_distance [--repeat N]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from utils.distance import distance_matrix, distances_from
+from utils.geo import calculate_distance
+
+ORIGIN = (39.9812, -75.1550)  # Temple main campus
+SIZES = (10, 1_000, 100_000)
+
+def random_points(count: int, rng: random.Random):
+    return [(39.95 + rng.random() * 0.06, -75.18 + rng.random() * 0.06) for _ in range(count)]
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def scalar_sorted(points):
+    lat, lon = ORIGIN
+    return sorted(calculate_distance(lat, lon, p_lat, p_lon) for p_lat, p_lon in points)
+
+def vectorized_sorted(points):
+    return np.sort(distances_from(ORIGIN[0], ORIGIN[1], points))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'points':>8} {'scalar ms':>11} {'vector ms':>11} {'speedup':>8}")
+    for size in SIZES:
+        points = random_points(size, rng)
+        # Sanity check: both engines agree
+        assert np.allclose(scalar_sorted(points), vectorized_sorted(points))
+        scalar = best_of(args.repeat, lambda: scalar_sorted(points))
+        vector = best_of(args.repeat, lambda: vectorized_sorted(points))
+        print(f"{size:>8} {scalar * 1e3:>11.3f} {vector * 1e3:>11.3f} {scalar / vector:>7.1f}x")
+
+    print()
+    print("many-to-many (deliverers x pickups)")
+    for deliverers, pickups in ((10, 100), (100, 1_000), (1_000, 1_000)):
+        origins = random_points(deliverers, rng)
+        destinations = random_points(pickups, rng)
+        scalar = best_of(1, lambda: [
+            [calculate_distance(o_lat, o_lon, d_lat, d_lon) for d_lat, d_lon in destinations]
+            for o_lat, o_lon in origins
+        ])
+        vector = best_of(args.repeat, lambda: distance_matrix(origins, destinations))
+        print(f"{deliverers:>5} x {pickups:<6} {scalar * 1e3:>11.3f} {vector * 1e3:>11.3f} {scalar / vector:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Serialize a 1,000-order /orders/my-orders page the old way and the new way.
+
+The old path built an Order model per document and let FastAPI validate and
+encode the response_model a second time; the new path encodes the MongoDB
+documents directly with orjson (utils.serialization). The database read is
+the same for both and is left out, so this runs without MongoDB.
+
+Usage: python -m benchmarks.bench_order_list [--orders N] [--repeat R]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models.schemas import Order, OrderStatus
+from utils.serialization import documents_response
+
+def make_orders(count: int, rng: random.Random) -> List[dict]:
+    """Documents as Motor returns them: ObjectIds, millisecond datetimes, nested dicts"""
+    now = datetime.utcnow().replace(microsecond=0)
+    customer_id = str(ObjectId())
+    orders = []
+    for i in range(count):
+        created = now - timedelta(minutes=i, milliseconds=rng.randrange(1000))
+        status = rng.choice(list(OrderStatus))
+        order = {
+            "_id": ObjectId(),
+            "customer_id": customer_id,
+            "establishment_id": str(ObjectId()),
+            "items": [
+                {"name": f"Item {n}", "quantity": rng.randint(1, 3), "price": round(rng.uniform(2, 15), 2), "notes": None}
+                for n in range(rng.randint(1, 4))
+            ],
+            "delivery_location": {
+                "latitude": 39.98 + rng.random() / 100,
+                "longitude": -75.15 - rng.random() / 100,
+                "address": f"{rng.randint(1000, 2000)} N Broad St"
+            },
+            "special_instructions": "Leave at the front desk" if i % 3 == 0 else None,
+            "delivery_points": rng.randint(5, 50),
+            "status": status.value,
+            "created_at": created,
+        }
+        if status != OrderStatus.PENDING:
+            order["deliverer_id"] = str(ObjectId())
+            order["accepted_at"] = created + timedelta(minutes=5)
+        orders.append(order)
+    return orders
+
+RESPONSE_FIELD = create_response_field(name="Response_get_my_orders", type_=List[Order], mode="serialization")
+
+async def legacy_render(docs: List[dict]) -> bytes:
+    """Pre-change my-orders: Order(**doc) per document, then FastAPI's response_model pass"""
+    orders = []
+    for order in docs:
+        order = dict(order)
+        order["id"] = str(order["_id"])
+        del order["_id"]
+        orders.append(Order(**order))
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=orders)
+    return JSONResponse(content).body
+
+def fast_render(docs: List[dict]) -> bytes:
+    return documents_response(docs, Order).body
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    docs = make_orders(args.orders, random.Random(42))
+    loop = asyncio.new_event_loop()
+    legacy = lambda: loop.run_until_complete(legacy_render(docs))
+
+    # Sanity check: clients see the same JSON either way
+    assert json.loads(legacy()) == json.loads(fast_render(docs))
+
+    legacy_time = best_of(args.repeat, legacy)
+    fast_time = best_of(args.repeat, lambda: fast_render(docs))
+    print(f"{'orders':>8} {'legacy ms':>11} {'orjson ms':>11} {'speedup':>8}")
+    print(f"{args.orders:>8} {legacy_time * 1e3:>11.3f} {fast_time * 1e3:>11.3f} {legacy_time / fast_time:>7.1f}x")
+    loop.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Replay a dinner-hour mix of the order lifecycle against the real app.
+
+Each virtual user registers, logs in, then loops over weighted actions
+(browse establishments, poll /available, place orders, accept and deliver
+other users' orders with a photo, confirm their own deliveries) with think
+time between them. Reports throughput and p50/p95/p99 per route and writes
+the results as JSON for comparison across commits.
+
+Targets:
+  in-process (default)  the FastAPI app from main.py over httpx's ASGI transport,
+                        with lifespan; MongoDB from MONGODB_URL, or an in-memory
+                        stand-in with --memory (needs mongomock-motor)
+  --url URL             an already running server, e.g. uvicorn main:app
+
+Usage: python -m benchmarks.loadtest [--users N] [--duration S] [--memory]
+                                     [--url URL] [--out FILE] [--compare FILE]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+
+PASSWORD = "loadtest-password"
+
+# Relative weights of what an active user does next
+ACTIONS = {
+    "browse": 20,
+    "poll_available": 35,
+    "my_orders": 15,
+    "place_order": 10,
+    "deliver": 10,
+    "confirm": 10,
+}
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def sample_photo() -> bytes:
+    """A small real JPEG when Pillow is available, so background processing has work to do"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return os.urandom(64 * 1024)
+    image = Image.new("RGB", (1200, 900), (180, 40, 60))
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+class Recorder:
+    """Latency samples and status codes per route template"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.errors[route] += 1
+            self.statuses[route][type(e).__name__] += 1
+            return None
+        self.latencies[route].append((time.perf_counter() - start) * 1e3)
+        self.statuses[route][str(response.status_code)] += 1
+        if response.status_code >= 500:
+            self.errors[route] += 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route in sorted(self.latencies.keys() | self.errors.keys()):
+            samples = self.latencies.get(route) or [0.0]
+            count = sum(self.statuses[route].values())
+            routes[route] = {
+                "requests": count,
+                "throughput_rps": round(count / elapsed, 2),
+                "p50_ms": round(percentile(samples, 50), 2),
+                "p95_ms": round(percentile(samples, 95), 2),
+                "p99_ms": round(percentile(samples, 99), 2),
+                "mean_ms": round(statistics.fmean(samples), 2),
+                "max_ms": round(max(samples), 2),
+                "statuses": dict(self.statuses[route]),
+                "errors": self.errors.get(route, 0),
+            }
+        total = sum(route["requests"] for route in routes.values())
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2),
+            "errors": sum(self.errors.values()),
+            "routes": routes,
+        }
+
+class VirtualUser:
+    def __init__(self, index: int, run_id: str, client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, photo: bytes):
+        self.name = f"lt{run_id}u{index}"
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.photo = photo
+        self.headers = {}
+        self.establishments = []
+        self.menus = {}
+        self.available = []
+
+    async def call(self, route: str, method: str, url: str, **kwargs):
+        return await self.recorder.call(self.client, route, method, url, headers=self.headers, **kwargs)
+
+    async def sign_up(self) -> bool:
+        email = f"{self.name}@temple.edu"
+        await self.call("POST /api/auth/register", "POST", "/api/auth/register",
+                        json={"username": self.name, "email": email, "password": PASSWORD})
+        response = await self.call("POST /api/auth/login", "POST", "/api/auth/login",
+                                   json={"email": email, "password": PASSWORD})
+        if response is None or response.status_code != 200:
+            return False
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return True
+
+    async def browse(self):
+        response = await self.call("GET /api/establishments/", "GET", "/api/establishments/",
+                                   params={"lat": 39.9812, "lon": -75.1550, "limit": 20})
+        if response is not None and response.status_code == 200:
+            self.establishments = response.json()
+
+    async def poll_available(self):
+        response = await self.call("GET /api/orders/available", "GET", "/api/orders/available", params={"limit": 20})
+        if response is not None and response.status_code == 200:
+            self.available = response.json()
+
+    async def my_orders(self):
+        await self.call("GET /api/orders/my-orders", "GET", "/api/orders/my-orders", params={"limit": 20})
+
+    async def place_order(self):
+        if not self.establishments:
+            await self.browse()
+        if not self.establishments:
+            return
+        establishment = self.rng.choice(self.establishments)
+        establishment_id = establishment["_id"]
+        if establishment_id not in self.menus:
+            response = await self.call("GET /api/establishments/{establishment_id}/menu", "GET",
+                                       f"/api/establishments/{establishment_id}/menu")
+            if response is None or response.status_code != 200:
+                return
+            self.menus[establishment_id] = response.json()
+        if not self.menus[establishment_id]:
+            return
+        item = self.rng.choice(self.menus[establishment_id])
+        cart = {
+            "establishment_id": establishment_id,
+            "items": [{"name": item["name"], "quantity": self.rng.randint(1, 2), "price": item["price"]}],
+            "delivery_location": {"latitude": 39.98, "longitude": -75.155, "address": "1801 N Broad St"},
+        }
+        # Like the cart UI: quote, then place the order at the quoted price
+        response = await self.call("POST /api/orders/quote", "POST", "/api/orders/quote", json=cart)
+        if response is None or response.status_code != 200:
+            return
+        await self.call("POST /api/orders/", "POST", "/api/orders/", json={
+            **cart, "delivery_points": response.json()["delivery_points"]
+        })
+
+    async def deliver(self):
+        """Accept someone's pending order, then drop it off with a photo"""
+        if not self.available:
+            await self.poll_available()
+        if not self.available:
+            return
+        order = self.available.pop(self.rng.randrange(len(self.available)))
+        response = await self.call("PUT /api/orders/{order_id}/accept", "PUT", f"/api/orders/{order['_id']}/accept")
+        if response is None or response.status_code != 200:
+            return  # Lost the race to another deliverer
+        await self.call("PUT /api/orders/{order_id}/update-status", "PUT",
+                        f"/api/orders/{order['_id']}/update-status", json={"status": "picked_up"})
+        await self.call("POST /api/orders/{order_id}/upload-image", "POST",
+                        f"/api/orders/{order['_id']}/upload-image",
+                        files={"file": ("delivery.jpg", self.photo, "image/jpeg")})
+
+    async def confirm(self):
+        response = await self.call("GET /api/orders/my-orders", "GET", "/api/orders/my-orders",
+                                   params={"status_filter": "delivered", "limit": 5})
+        if response is None or response.status_code != 200:
+            return
+        for order in response.json():
+            await self.call("PUT /api/orders/{order_id}/complete", "PUT", f"/api/orders/{order['_id']}/complete")
+
+    async def run(self, deadline: float, think: float):
+        if not await self.sign_up():
+            return
+        names, weights = zip(*ACTIONS.items())
+        while time.perf_counter() < deadline:
+            action = self.rng.choices(names, weights)[0]
+            await getattr(self, action)()
+            await asyncio.sleep(think * self.rng.uniform(0.5, 1.5))
+
+async def run_load(client: httpx.AsyncClient, args) -> dict:
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:6]
+    photo = sample_photo()
+    master = random.Random(args.seed)
+    start = time.perf_counter()
+    deadline = start + args.ramp + args.duration
+
+    async def start_user(index: int):
+        # Spread arrivals over the ramp-up so logins do not all land at once
+        await asyncio.sleep(args.ramp * index / max(1, args.users))
+        user = VirtualUser(index, run_id, client, recorder, random.Random(master.random()), photo)
+        await user.run(deadline, args.think_ms / 1e3)
+
+    await asyncio.gather(*(start_user(i) for i in range(args.users)))
+    return recorder.report(time.perf_counter() - start)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def use_memory_mongo():
+    """Swap Motor for mongomock-motor and keep blobs on local disk (GridFS needs a real server)"""
+    try:
+        import mongomock_motor
+    except ImportError:
+        raise SystemExit("--memory needs mongomock-motor: pip install mongomock-motor")
+    os.environ.setdefault("BLOB_STORE", "local")
+    os.environ.setdefault("BLOB_STORE_PATH", tempfile.mkdtemp(prefix="loadtest-blobs-"))
+    import utils.database
+    utils.database.AsyncIOMotorClient = lambda *args, **kwargs: mongomock_motor.AsyncMongoMockClient()
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 60.0):
+    """Poll /api/ready, since the catalog loads in the background after startup"""
+    deadline = time.monotonic() + timeout
+    while (await client.get("/api/ready")).status_code != 200:
+        if time.monotonic() > deadline:
+            raise SystemExit("Server did not become ready")
+        await asyncio.sleep(0.1)
+
+async def run_in_process(args) -> dict:
+    if args.memory:
+        use_memory_mongo()
+    from main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+            await wait_until_ready(client)
+            return await run_load(client, args)
+
+async def run_against_url(args) -> dict:
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        await wait_until_ready(client)
+        return await run_load(client, args)
+
+def print_report(results: dict, baseline: dict = None):
+    summary = results["summary"]
+    print(f"{summary['requests']} requests in {summary['elapsed_s']:.1f} s "
+          f"({summary['throughput_rps']:.1f} req/s), {summary['errors']} errors")
+    header = f"{'route':<48} {'reqs':>6} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    if baseline:
+        header += f" {'p95 vs base':>12}"
+    print(header)
+    for route, stats in summary["routes"].items():
+        line = (f"{route:<48} {stats['requests']:>6} {stats['throughput_rps']:>7.1f} "
+                f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+        base = (baseline or {}).get("summary", {}).get("routes", {}).get(route)
+        if base and base["p95_ms"]:
+            line += f" {(stats['p95_ms'] / base['p95_ms'] - 1) * 100:>+11.1f}%"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of steady load after ramp-up")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which users arrive")
+    parser.add_argument("--think-ms", type=float, default=200, help="mean pause between a user's actions")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--memory", action="store_true", help="in-process with an in-memory MongoDB stand-in")
+    parser.add_argument("--url", help="load an already running server instead of the in-process app")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="results JSON from an earlier run to compare p95 against")
+    args = parser.parse_args()
+
+    target = args.url or ("in-process (memory)" if args.memory else "in-process")
+    print(f"{args.users} users, {args.ramp:g} s ramp + {args.duration:g} s, think {args.think_ms:g} ms, target {target}")
+    summary = asyncio.run(run_against_url(args) if args.url else run_in_process(args))
+
+    results = {
+        "commit": git_commit(),
+        "recorded_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "summary": summary,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"comparing against {baseline.get('commit', '?')} from {baseline.get('recorded_at', '?')}")
+    print_report(results, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
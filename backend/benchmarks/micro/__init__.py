@@ -0,0 +1,2 @@
+# Microbenchmarks for functions every request touches. Run from the backend directory:
+#   python -m benchmarks.micro [--save baseline.json] [--compare baseline.json --threshold 0.25]
@@ -0,0 +1,66 @@
+"""Run the hot-path microbenchmarks, optionally saving or checking against a baseline.
+
+With --compare, exits with status 1 when any benchmark's median is more than
+--threshold slower than in the baseline, so it can gate a dependency bump or
+model change in CI.
+
+Usage: python -m benchmarks.micro [-k PATTERN ...] [--repeat N]
+                                  [--save FILE] [--compare FILE] [--threshold 0.25]
+"""
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime
+
+from benchmarks.micro import harness
+from benchmarks.micro.cases import all_cases, select
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="patterns", action="append", default=[], help="only benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--save", help="write results JSON here (usable as a later --compare baseline)")
+    parser.add_argument("--compare", help="baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed median slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    print(f"{'benchmark':<42} {'median':>10} {'min':>10} {'stdev':>10} {'alloc/call':>11} {'peak':>10} {'vs base':>8}")
+    results = []
+    for name, (fn, options) in select(all_cases(), args.patterns).items():
+        result = harness.run(name, fn, **{"repeat": args.repeat, **options})
+        results.append(result)
+        base = baseline.get(name)
+        change = f"{result.median_ns / base['median_ns'] - 1:+.0%}" if base else ""
+        print(
+            f"{name:<42} {harness.format_ns(result.median_ns):>10} {harness.format_ns(result.min_ns):>10} "
+            f"{harness.format_ns(result.stdev_ns):>10} {result.alloc_bytes_per_call:>10.0f}B "
+            f"{result.peak_alloc_bytes / 1024:>8.1f}KB {change:>8}"
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "recorded_at": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "results": {result.name: result.to_dict() for result in results},
+            }, f, indent=2)
+        print(f"results written to {args.save}")
+
+    if args.compare:
+        failures = harness.regressions(results, baseline, args.threshold)
+        if failures:
+            print(f"\n{len(failures)} benchmark(s) regressed by more than {args.threshold:.0%}:")
+            for failure in failures:
+                print(f"  {failure}")
+            return 1
+        print(f"\nno regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""The hot-path functions benchmarked by python -m benchmarks.micro"""
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from jose import jwt
+
+from benchmarks.bench_order_list import make_orders
+from models.schemas import Establishment, Location, Order, UserInDB
+from utils.auth import (
+    ALGORITHM, SECRET_KEY, create_access_token, get_password_hash, get_user_from_token,
+    validate_temple_email, verify_password,
+)
+from utils.catalog import CatalogSnapshot
+from utils.dispatch import rank_orders
+from utils.geo import GeoIndex, calculate_distance
+from utils.principal_cache import principal_cache
+from utils.serialization import documents_response
+
+ORIGIN = (39.9812, -75.1550)  # Temple main campus
+CATALOG_SIZES = (10, 1_000, 10_000)
+PAGE_SIZE = 50
+
+# name -> (zero-argument callable, options for harness.run)
+Case = Tuple[Callable[[], object], dict]
+
+def run_sync(coroutine):
+    """Drive a coroutine that completes without suspending (e.g. a cache hit) with no event loop overhead"""
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    coroutine.close()
+    raise RuntimeError("coroutine suspended; it needs a real event loop")
+
+def auth_cases() -> Dict[str, Case]:
+    email = "bench@temple.edu"
+    token = create_access_token({"sub": email}, expires_delta=timedelta(hours=1))
+    hashed = get_password_hash("bench-password")
+    # A warm principal cache is the common case for authenticated requests
+    principal_cache.put(UserInDB(_id="0" * 24, username="bench", email=email, points=100, hashed_password=hashed))
+    return {
+        "auth.create_access_token": (lambda: create_access_token({"sub": email}), {}),
+        "auth.jwt_decode": (lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]), {}),
+        "auth.get_user_from_token[cached]": (lambda: run_sync(get_user_from_token(token)), {}),
+        "auth.verify_password": (lambda: verify_password("bench-password", hashed), {"number": 1, "repeat": 5}),
+        "auth.validate_temple_email": (lambda: validate_temple_email("someone.else@temple.edu"), {}),
+    }
+
+def order_cases() -> Dict[str, Case]:
+    docs = make_orders(PAGE_SIZE, random.Random(7))
+
+    def build_models():
+        for doc in docs:
+            order = dict(doc)
+            order["id"] = str(order.pop("_id"))
+            Order(**order)
+
+    single = dict(docs[0])
+    single["id"] = str(single.pop("_id"))
+    return {
+        "orders.Order(**doc)": (lambda: Order(**single), {}),
+        f"orders.Order(**doc) x{PAGE_SIZE}": (build_models, {}),
+        f"orders.documents_response x{PAGE_SIZE}": (lambda: documents_response(docs, Order), {}),
+    }
+
+def geo_cases() -> Dict[str, Case]:
+    rng = random.Random(42)
+    cases = {}
+    for size in CATALOG_SIZES:
+        points = [(39.95 + rng.random() * 0.06, -75.18 + rng.random() * 0.06) for _ in range(size)]
+        index = GeoIndex((lat, lon, i) for i, (lat, lon) in enumerate(points))
+
+        def sort_by_distance(points=points):
+            return sorted(points, key=lambda p: calculate_distance(ORIGIN[0], ORIGIN[1], p[0], p[1]))
+
+        cases[f"geo.calculate_distance+sort n={size}"] = (sort_by_distance, {})
+        cases[f"geo.GeoIndex.nearest(10) n={size}"] = (lambda index=index: index.nearest(*ORIGIN, limit=10), {})
+    cases["geo.calculate_distance"] = (lambda: calculate_distance(ORIGIN[0], ORIGIN[1], 39.9526, -75.1652), {})
+    return cases
+
+def dispatch_cases() -> Dict[str, Case]:
+    rng = random.Random(11)
+    establishments = tuple(
+        Establishment(
+            _id=f"{i:024x}", name=f"Place {i}", category="Food",
+            location=Location(latitude=39.95 + rng.random() * 0.06, longitude=-75.18 + rng.random() * 0.06, address="")
+        )
+        for i in range(50)
+    )
+    snapshot = CatalogSnapshot(version=1, loaded_at=datetime.utcnow(), establishments=establishments)
+    now = datetime.utcnow()
+    cases = {}
+    for size in (100, 2_000):
+        orders = [
+            {
+                "_id": f"{i:024x}",
+                "establishment_id": rng.choice(establishments).id,
+                "delivery_location": {"latitude": 39.95 + rng.random() * 0.06, "longitude": -75.18 + rng.random() * 0.06},
+                "delivery_points": rng.randint(1, 20),
+                "created_at": now - timedelta(minutes=rng.random() * 60),
+            }
+            for i in range(size)
+        ]
+        cases[f"dispatch.rank_orders(10) n={size}"] = (
+            lambda orders=orders: rank_orders(snapshot, ORIGIN[0], ORIGIN[1], orders, 10, now=now), {}
+        )
+    return cases
+
+def all_cases() -> Dict[str, Case]:
+    return {**auth_cases(), **order_cases(), **geo_cases(), **dispatch_cases()}
+
+def select(cases: Dict[str, Case], patterns: List[str]) -> Dict[str, Case]:
+    if not patterns:
+        return cases
+    return {name: case for name, case in cases.items() if any(pattern in name for pattern in patterns)}
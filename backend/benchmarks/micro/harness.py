@@ -0,0 +1,106 @@
+"""Timing, allocation tracking and baseline comparison for microbenchmarks"""
+import gc
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+# Each timed repeat runs the function enough times to take at least this long
+MIN_REPEAT_SECONDS = 0.05
+
+@dataclass
+class Result:
+    name: str
+    number: int  # calls per repeat
+    repeat: int
+    median_ns: float  # per call
+    min_ns: float
+    stdev_ns: float
+    alloc_bytes_per_call: float  # net allocation still live after a call
+    peak_alloc_bytes: int  # high-water mark while running one repeat
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+def _time_calls(fn: Callable[[], object], number: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter_ns() - start) / number
+
+def calibrate(fn: Callable[[], object]) -> int:
+    """Smallest power-of-ten-ish call count whose run takes MIN_REPEAT_SECONDS"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= MIN_REPEAT_SECONDS:
+            return number
+        number *= 2 if number < 8 else 5
+
+def _allocations(fn: Callable[[], object], number: int):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(number):
+            fn()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (after - before) / number, peak - before
+
+def run(name: str, fn: Callable[[], object], repeat: int = 7, warmup: int = 1, number: Optional[int] = None) -> Result:
+    """Warm up, then time `repeat` batches of calls; allocations are measured in a separate pass"""
+    for _ in range(warmup):
+        fn()
+    number = number or calibrate(fn)
+
+    # Keep the collector out of the timings; it runs between repeats instead
+    gc_was_enabled = gc.isenabled()
+    timings = []
+    try:
+        for _ in range(repeat):
+            gc.collect()
+            gc.disable()
+            timings.append(_time_calls(fn, number))
+            if gc_was_enabled:
+                gc.enable()
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    per_call, peak = _allocations(fn, number)
+    return Result(
+        name=name,
+        number=number,
+        repeat=repeat,
+        median_ns=statistics.median(timings),
+        min_ns=min(timings),
+        stdev_ns=statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        alloc_bytes_per_call=per_call,
+        peak_alloc_bytes=peak,
+    )
+
+def format_ns(ns: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.0f} ns"
+
+def regressions(results: List[Result], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Benchmarks whose median got more than `threshold` (0.25 = 25%) slower than the baseline"""
+    failures = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None or not base.get("median_ns"):
+            continue
+        change = result.median_ns / base["median_ns"] - 1
+        if change > threshold:
+            failures.append(
+                f"{result.name}: {format_ns(base['median_ns'])} -> {format_ns(result.median_ns)} ({change:+.0%})"
+            )
+    return failures
@@ -1,19 +1,84 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 # Import routers
-from routers import auth, orders, establishments
+from routers import auth, orders, establishments, admin
+from routers.establishments import TEMPLE_ESTABLISHMENTS
 
 # Import database utilities
-from utils.database import connect_to_mongo, close_mongo_connection
+from utils.database import connect_to_mongo, close_mongo_connection, database, ping
+from utils.catalog import catalog
+from utils.indexes import ensure_indexes
+from utils.migrations import run_migrations
+from utils.hashing import password_hasher
+from utils.images import image_processor
+from utils.jobs import job_queue
+from utils.compression import CompressionMiddleware
+from utils.log import get_logger
+from utils.metrics import MetricsMiddleware, pool_metrics, render_metrics
+from pymongo.errors import ConnectionFailure
+from typing import Optional
+import asyncio
+import os
+
+READINESS_TIMEOUT_SECONDS = float(os.environ.get("READINESS_TIMEOUT_SECONDS", "2"))
+
+# Longest wait between attempts to reach MongoDB during startup
+STARTUP_RETRY_MAX_SECONDS = float(os.environ.get("STARTUP_RETRY_MAX_SECONDS", "30"))
+
+logger = get_logger("main")
+
+# Why startup gave up, e.g. a failing migration; reported by /api/ready
+startup_error: Optional[str] = None
+
+async def prepare_database():
+    """Index sync, migrations and the catalog load, retried until MongoDB answers.
+
+    Runs after startup, so the app serves /api/health and a 503 from
+    /api/ready while the database is unreachable instead of failing to boot.
+    Only connection failures are retried; any other error would fail the
+    same way again, so it is recorded for /api/ready and startup stops.
+    """
+    global startup_error
+    delay = 1.0
+    while True:
+        try:
+            # One ping fails fast; the steps below would each wait out server selection
+            await ping()
+            await ensure_indexes()
+            await run_migrations()
+            await catalog.load(TEMPLE_ESTABLISHMENTS)
+            break
+        except ConnectionFailure as e:
+            logger.warning("Database not ready, retrying in %.0fs: %s", delay, str(e) or type(e).__name__)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STARTUP_RETRY_MAX_SECONDS)
+        except Exception as e:
+            startup_error = str(e) or type(e).__name__
+            logger.error("Startup failed, not retrying: %s", startup_error)
+            return
+    catalog.start_watching()
+    # Side effects of order writes (payouts, refunds, photo processing) run here
+    await job_queue.start()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    preparing = asyncio.create_task(prepare_database(), name="prepare-database")
     yield
     # Shutdown
+    preparing.cancel()
+    try:
+        await preparing
+    except asyncio.CancelledError:
+        pass
+    await job_queue.shutdown()
+    await catalog.stop_watching()
+    await image_processor.shutdown()
+    password_hasher.shutdown()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -23,6 +88,12 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# gzip/brotli for JSON and other text bodies, negotiated per request
+app.add_middleware(CompressionMiddleware)
+
+# Per-route latency and status metrics, served at /api/metrics
+app.add_middleware(MetricsMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +101,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor"],  # Pagination cursor for order lists
 )
 
 # Health check endpoint
@@ -37,10 +109,37 @@ app.add_middleware(
 async def health_check():
     return {"status": "healthy"}
 
+# Readiness probe: 503 until MongoDB answers and the catalog is loaded, so load balancers skip this instance
+@app.get("/api/ready")
+async def readiness_check():
+    report = {"mongo": {"connected_at_startup": database.connected}, "pool": pool_metrics.stats()}
+    problems = []
+    try:
+        report["mongo"]["ping_ms"] = round(await asyncio.wait_for(ping(), READINESS_TIMEOUT_SECONDS), 3)
+    except Exception as e:
+        problems.append(f"mongo: {str(e) or type(e).__name__}")
+        report["mongo"]["last_error"] = database.last_error
+    report["catalog_version"] = catalog.version
+    if startup_error is not None:
+        problems.append(f"startup: {startup_error}")
+    elif catalog.version == 0:
+        problems.append("catalog not loaded")
+
+    report["status"] = "not_ready" if problems else "ready"
+    if problems:
+        report["problems"] = problems
+    return JSONResponse(report, status_code=503 if problems else 200)
+
+# Prometheus scrape endpoint
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(orders.router, prefix="/api/orders", tags=["orders"])
 app.include_router(establishments.router, prefix="/api/establishments", tags=["establishments"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
 if __name__ == "__main__":
     import uvicorn
@@ -74,12 +74,30 @@ class OrderCreate(BaseModel):
     items: List[OrderItem]
     delivery_location: Location
     special_instructions: Optional[str] = None
+    # The quoted price the customer agreed to; the server prices the order either way
+    delivery_points: Optional[int] = Field(default=None, ge=1)
+
+class QuoteRequest(BaseModel):
+    establishment_id: str
+    items: List[OrderItem]
+    delivery_location: Location
+
+class BatchQuoteRequest(BaseModel):
+    quotes: List[QuoteRequest] = Field(..., min_length=1)
+
+class DeliveryQuote(BaseModel):
     delivery_points: int
+    subtotal: float
+    distance_miles: float
+    night: bool
+
+class BatchQuoteResult(BaseModel):
+    quote: Optional[DeliveryQuote] = None
+    error: Optional[str] = None
 
 class OrderUpdate(BaseModel):
     status: OrderStatus
     deliverer_id: Optional[str] = None
-    completion_image_url: Optional[str] = None
 
 class Order(BaseModel):
     id: Optional[PyObjectId] = Field(default=None, alias="_id")
@@ -95,6 +113,11 @@ class Order(BaseModel):
     accepted_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     completion_image_url: Optional[str] = None
+    has_completion_image: bool = False
+    completion_image_id: Optional[str] = None
+    completion_thumbnail_id: Optional[str] = None
+    completion_thumbnail_url: Optional[str] = None
+    bundle_id: Optional[str] = None
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -102,6 +125,23 @@ class Order(BaseModel):
         json_encoders={ObjectId: str}
     )
 
+class DispatchCandidate(BaseModel):
+    order: Order
+    pickup_miles: float  # deliverer -> establishment
+    delivery_miles: float  # establishment -> delivery location
+    total_miles: float
+    waiting_minutes: float
+    score: float
+
+class BundleProposal(BaseModel):
+    order_ids: List[str]
+    establishment_ids: List[str]
+    total_points: int
+    orders: List[Order]
+
+class BundleAccept(BaseModel):
+    order_ids: List[str] = Field(..., min_length=2)
+
 # Token Models
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,159 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from typing import Optional
+from bson import ObjectId
+from models.schemas import UserResponse
+from utils.auth import get_current_admin
+from utils.catalog import catalog
+from utils.principal_cache import principal_cache
+from utils.pricing import quote_cache
+from utils.images import image_processor
+from utils.jobs import job_queue
+from utils.indexes import ensure_indexes, index_report
+from utils.serialization import dumps
+from utils.slow_queries import slow_query_log
+from utils.database import get_database
+from utils import ledger
+
+router = APIRouter()
+
+MAX_DEAD_JOBS = 200
+
+@router.post("/catalog/reload")
+async def reload_catalog(current_user: UserResponse = Depends(get_current_admin)):
+    """Re-sync the establishment catalog from the seed data and Mongo; other processes follow within CATALOG_POLL_SECONDS"""
+    snapshot = await catalog.load(publish=True)
+    return {
+        "version": snapshot.version,
+        "loaded_at": snapshot.loaded_at,
+        "establishments": len(snapshot.establishments)
+    }
+
+@router.get("/auth-cache")
+async def get_auth_cache_stats(current_user: UserResponse = Depends(get_current_admin)):
+    """Hit/miss counters for the authenticated-principal cache"""
+    return principal_cache.stats()
+
+@router.get("/quote-cache")
+async def get_quote_cache_stats(current_user: UserResponse = Depends(get_current_admin)):
+    """Hit/miss counters for the delivery quote cache"""
+    return quote_cache.stats()
+
+@router.get("/images")
+async def get_image_processing_stats(current_user: UserResponse = Depends(get_current_admin)):
+    """Completion photo processing counters, including bytes saved by re-encoding"""
+    return image_processor.stats()
+
+@router.get("/jobs")
+async def get_job_stats(current_user: UserResponse = Depends(get_current_admin)):
+    """Background job counts by state, plus this instance's worker counters"""
+    return {"counts": await job_queue.counts(), "workers": job_queue.stats()}
+
+@router.get("/jobs/dead")
+async def get_dead_jobs(
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_DEAD_JOBS),
+    current_user: UserResponse = Depends(get_current_admin)
+):
+    """Jobs that used up their retries, most recent first, with the last error"""
+    return Response(dumps(await job_queue.dead_jobs(limit, kind)), media_type="application/json")
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_dead_job(job_id: str, current_user: UserResponse = Depends(get_current_admin)):
+    """Put a dead job back on the queue with a fresh set of attempts"""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid job ID format"
+        )
+    if not await job_queue.retry(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dead job not found"
+        )
+    return {"message": "Job requeued"}
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: Optional[int] = Query(None, ge=1),
+    current_user: UserResponse = Depends(get_current_admin)
+):
+    """Most recent MongoDB commands over the slow-query threshold, newest first, with explain() plans"""
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "capacity": slow_query_log.entries.maxlen,
+        "entries": slow_query_log.recent(limit)
+    }
+
+@router.put("/slow-queries")
+async def configure_slow_queries(
+    threshold_ms: Optional[float] = Query(None, ge=0, description="Omit to turn slow-query capture off"),
+    size: Optional[int] = Query(None, ge=1, le=10_000),
+    current_user: UserResponse = Depends(get_current_admin)
+):
+    """Turn slow-query capture on or off, or change its threshold, without a restart"""
+    slow_query_log.configure(threshold_ms=threshold_ms, size=size)
+    return {"threshold_ms": slow_query_log.threshold_ms, "capacity": slow_query_log.entries.maxlen}
+
+@router.delete("/slow-queries")
+async def clear_slow_queries(current_user: UserResponse = Depends(get_current_admin)):
+    """Empty the slow-query ring buffer"""
+    slow_query_log.clear()
+    return {"message": "Slow query log cleared"}
+
+@router.get("/indexes")
+async def get_index_report(current_user: UserResponse = Depends(get_current_admin)):
+    """Missing, undeclared and unused indexes compared to the declared registry"""
+    return await index_report()
+
+@router.post("/indexes/sync")
+async def sync_indexes(current_user: UserResponse = Depends(get_current_admin)):
+    """Create any declared indexes that are missing"""
+    return await ensure_indexes()
+
+async def get_stored_points(user_id: str) -> int:
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid user ID format"
+        )
+    db = await get_database()
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"points": 1})
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return user.get("points", 0)
+
+@router.get("/ledger/{user_id}")
+async def get_ledger_balance(user_id: str, current_user: UserResponse = Depends(get_current_admin)):
+    """Compare a user's stored points with the total of their ledger entries"""
+    stored = await get_stored_points(user_id)
+    total, entries = await ledger.ledger_balance(user_id)
+    return {
+        "user_id": user_id,
+        "stored_points": stored,
+        "ledger_points": total,
+        "entries": entries,
+        "has_opening_balance": await ledger.has_opening_balance(user_id),
+        "in_sync": stored == total
+    }
+
+@router.post("/ledger/{user_id}/recompute")
+async def recompute_ledger_balance(user_id: str, current_user: UserResponse = Depends(get_current_admin)):
+    """Reset a user's stored points to their ledger total"""
+    await get_stored_points(user_id)
+    if not await ledger.has_opening_balance(user_id):
+        # Accounts created before the ledger existed have no complete history to replay
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User has no opening balance in the ledger; cannot recompute"
+        )
+    points = await ledger.recompute_balance(user_id)
+    if points is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Balance changed while recomputing; try again"
+        )
+    principal_cache.invalidate_user(user_id)
+    return {"user_id": user_id, "points": points}
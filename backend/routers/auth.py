@@ -4,13 +4,15 @@ from models.schemas import UserCreate, UserLogin, Token, UserResponse
 from utils.auth import (
     authenticate_user, 
     create_access_token, 
-    get_password_hash, 
+    get_password_hash_async, 
     validate_temple_email,
     get_current_user,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from utils.database import get_database
+from utils import ledger
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter()
 
@@ -50,7 +52,7 @@ async def register(user_data: UserCreate):
         )
     
     # Hash password and create user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     user_dict = {
         "username": user_data.username,
         "email": user_data.email,
@@ -59,8 +61,16 @@ async def register(user_data: UserCreate):
         "created_at": datetime.utcnow()
     }
     
-    result = await db.users.insert_one(user_dict)
+    try:
+        result = await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration; the unique indexes caught it
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User with this email or username already exists"
+        )
     user_dict["_id"] = str(result.inserted_id)  # Convert ObjectId to string
+    await ledger.record_grant(user_dict["_id"], user_dict["points"])
     
     return UserResponse(**user_dict)
 
@@ -95,7 +105,7 @@ async def get_user_by_id(user_id: str, current_user: UserResponse = Depends(get_
         )
     
     db = await get_database()
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {ledger.APPLIED_FIELD: 0})
     
     if not user:
         raise HTTPException(
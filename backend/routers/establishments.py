@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
+from typing import Callable, List, Optional
 from models.schemas import Establishment, UserResponse
 from utils.auth import get_current_user
-from utils.database import get_database
-import math
+from utils.catalog import CatalogSnapshot, get_catalog
+from utils.search import establishment_search
+from utils.http_cache import conditional_response
+from utils.serialization import dumps, models_response
+from bson import ObjectId
 
 router = APIRouter()
 
@@ -160,150 +163,145 @@ TEMPLE_ESTABLISHMENTS = [
     }
 ]
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate distance between two coordinates using Haversine formula (in miles)"""
-    R = 3959  # Earth's radius in miles
-    
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return R * c
+MAX_NEAREST_LIMIT = 100
+MAX_TYPEAHEAD_LIMIT = 20
 
 @router.get("/", response_model=List[Establishment])
 async def get_establishments(
+    request: Request,
     lat: Optional[float] = None, 
     lon: Optional[float] = None,
+    radius: Optional[float] = Query(None, gt=0, description="Only return establishments within this many miles"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_NEAREST_LIMIT, description="Return at most this many establishments"),
     current_user: UserResponse = Depends(get_current_user)
 ):
-    """Get all establishments, optionally sorted by distance"""
-    db = await get_database()
-    
-    # Force refresh establishments to match current template
-    # Clear all existing establishments and insert fresh ones
-    await db.establishments.delete_many({})
-    await db.establishments.insert_many(TEMPLE_ESTABLISHMENTS)
-    print(f"DEBUG: Refreshed {len(TEMPLE_ESTABLISHMENTS)} establishments in database")
-    
-    # Get establishments from database
-    establishments = []
-    async for est in db.establishments.find({"is_active": True}):
-        est["_id"] = str(est["_id"])  # Convert ObjectId to string
-        establishments.append(Establishment(**est))
+    """Get all establishments, optionally the nearest ones to a location"""
+    catalog = get_catalog()
+    has_origin = lat is not None and lon is not None
+    if not has_origin:
+        require_origin_for_radius(radius)
     
-    # Sort by distance if coordinates provided
-    if lat is not None and lon is not None:
-        for est in establishments:
-            est.distance = calculate_distance(
-                lat, lon, 
-                est.location.latitude, 
-                est.location.longitude
-            )
-        establishments.sort(key=lambda x: getattr(x, 'distance', 0))
+    def render() -> Response:
+        # Nearest-first from the spatial index if coordinates provided
+        if has_origin:
+            return models_response(nearest_establishments(catalog, lat, lon, limit=limit, radius=radius), Establishment)
+        
+        establishments = list(catalog.active)
+        return models_response(establishments[:limit] if limit else establishments, Establishment)
     
-    return establishments
+    # The body is a function of the catalog and the query string, so the catalog digest validates it
+    return conditional_response(request, f'"c-{catalog.digest}"', catalog.last_modified, render)
 
 @router.get("/search")
 async def search_establishments(
     query: str,
     lat: Optional[float] = None,
     lon: Optional[float] = None,
+    radius: Optional[float] = Query(None, gt=0, description="Only return establishments within this many miles"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_NEAREST_LIMIT, description="Return at most this many establishments"),
     current_user: UserResponse = Depends(get_current_user)
 ):
-    """Search establishments by name or category"""
-    db = await get_database()
-    
-    # Search query
-    search_filter = {
-        "$and": [
-            {"is_active": True},
-            {
-                "$or": [
-                    {"name": {"$regex": query, "$options": "i"}},
-                    {"category": {"$regex": query, "$options": "i"}}
-                ]
-            }
-        ]
-    }
-    
-    establishments = []
-    async for est in db.establishments.find(search_filter):
-        est["_id"] = str(est["_id"])  # Convert ObjectId to string
-        establishments.append(Establishment(**est))
+    """Search establishments by name, category or menu item, best match first"""
+    catalog = get_catalog()
+    scores = dict(establishment_search.search(query))
     
-    # Sort by distance if coordinates provided
+    # Within the radius if coordinates provided, nearest first among equally good matches
     if lat is not None and lon is not None:
-        for est in establishments:
-            est.distance = calculate_distance(
-                lat, lon,
-                est.location.latitude,
-                est.location.longitude
-            )
-        establishments.sort(key=lambda x: getattr(x, 'distance', 0))
+        establishments = nearest_establishments(
+            catalog, lat, lon, radius=radius, predicate=lambda est: est.id in scores
+        )
+    else:
+        require_origin_for_radius(radius)
+        establishments = [est for est in catalog.active if est.id in scores]
     
-    return establishments
+    establishments.sort(key=lambda est: -scores[est.id])
+    return models_response(establishments[:limit] if limit else establishments, Establishment)
 
-@router.get("/{establishment_id}", response_model=Establishment)
-async def get_establishment(
-    establishment_id: str,
+@router.get("/typeahead")
+async def typeahead(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(8, ge=1, le=MAX_TYPEAHEAD_LIMIT),
     current_user: UserResponse = Depends(get_current_user)
 ):
-    """Get specific establishment by ID"""
-    from bson import ObjectId
-    
+    """Suggest establishments, categories and menu items for a partially typed query"""
+    catalog = get_catalog()
+    suggestions = []
+    for suggestion in establishment_search.suggest(q, limit):
+        establishment = catalog.get(suggestion.establishment_id)
+        if establishment is None:
+            continue
+        suggestions.append({
+            "kind": suggestion.kind,
+            "text": suggestion.text,
+            "establishment_id": establishment.id,
+            "establishment_name": establishment.name,
+        })
+    return suggestions
+
+def require_origin_for_radius(radius: Optional[float]):
+    if radius is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="lat and lon are required when filtering by radius"
+        )
+
+def nearest_establishments(
+    catalog: CatalogSnapshot,
+    lat: float,
+    lon: float,
+    limit: Optional[int] = None,
+    radius: Optional[float] = None,
+    predicate: Optional[Callable[[Establishment], bool]] = None
+) -> List[Establishment]:
+    """Return copies of the nearest establishments annotated with distance, nearest first"""
+    # Catalog models are shared between requests, so never mutate them in place
+    return [
+        est.model_copy(update={"distance": distance})
+        for distance, est in catalog.geo.nearest(lat, lon, limit=limit, radius=radius, predicate=predicate)
+    ]
+
+def get_establishment_or_404(establishment_id: str) -> Establishment:
+    """Look up an establishment in the catalog snapshot; 400 for a malformed ID, 404 if unknown"""
     if not ObjectId.is_valid(establishment_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid establishment ID format"
         )
     
-    db = await get_database()
-    establishment = await db.establishments.find_one({"_id": ObjectId(establishment_id)})
-    
+    establishment = get_catalog().get(establishment_id)
     if not establishment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Establishment not found"
         )
-    
-    establishment["_id"] = str(establishment["_id"])  # Convert ObjectId to string
-    return Establishment(**establishment)
+    return establishment
+
+@router.get("/{establishment_id}", response_model=Establishment)
+async def get_establishment(
+    request: Request,
+    establishment_id: str,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Get specific establishment by ID"""
+    catalog = get_catalog()
+    establishment = get_establishment_or_404(establishment_id)
+    return conditional_response(
+        request, f'"e-{catalog.digests[establishment_id]}"', catalog.last_modified,
+        lambda: Response(establishment.model_dump_json(by_alias=True), media_type="application/json")
+    )
 
 @router.get("/{establishment_id}/menu")
 async def get_establishment_menu(
+    request: Request,
     establishment_id: str,
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Get menu items for a specific establishment"""
-    from bson import ObjectId
-    
-    if not ObjectId.is_valid(establishment_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid establishment ID format"
-        )
-    
-    db = await get_database()
-    establishment = await db.establishments.find_one({"_id": ObjectId(establishment_id)})
-    
-    print(f"DEBUG: Looking for establishment ID: {establishment_id}")
-    print(f"DEBUG: Found establishment: {establishment is not None}")
-    
-    if not establishment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Establishment not found"
-        )
-    
-    menu_items = establishment.get("menu_items", [])
-    print(f"DEBUG: Menu items count: {len(menu_items)}")
+    catalog = get_catalog()
+    get_establishment_or_404(establishment_id)
     
     # Return menu items if they exist, otherwise empty list
-    return menu_items
\ No newline at end of file
+    return conditional_response(
+        request, f'"m-{catalog.digests[establishment_id]}"', catalog.last_modified,
+        lambda: Response(dumps(list(catalog.menu(establishment_id))), media_type="application/json")
+    )
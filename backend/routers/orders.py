@@ -1,14 +1,127 @@
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Request, Response, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from models.schemas import Order, OrderCreate, OrderUpdate, OrderStatus, UserResponse
-from utils.auth import get_current_user
+from models.schemas import (
+    BatchQuoteRequest, BatchQuoteResult, BundleAccept, BundleProposal, DeliveryQuote, DispatchCandidate,
+    Order, OrderCreate, OrderUpdate, OrderStatus, QuoteRequest, UserResponse
+)
+from routers.establishments import get_establishment_or_404
+from utils.auth import get_current_user, get_current_user_from_query, get_current_user_from_header_or_query
+from utils.blobstore import blob_store, iter_upload, serve_blob, MAX_IMAGE_UPLOAD_BYTES
+from utils.images import image_processor
+from utils.serialization import documents_response
+from utils.log import get_logger
 from utils.database import get_database
+from utils.catalog import get_catalog
+from utils.bundles import MAX_BUNDLE_CANDIDATES, MAX_BUNDLE_ORDERS, accept_bundle, propose_bundles
+from utils.dispatch import MAX_CANDIDATES, RANKING_PROJECTION, rank_orders
+from utils.pricing import MAX_BATCH_QUOTES, price_items, quote_order
+from utils.principal_cache import principal_cache
+from utils import ledger
+from utils.settlement import AWAITING_SETTLEMENT, enqueue_delivery_credit, refund_unplaced_order
+from utils.transitions import (
+    ACCEPTOR,
+    CUSTOMER,
+    DELIVERER,
+    transition_bundle,
+    transition_order,
+    transition_timestamps
+)
+from utils.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    keyset_filter,
+    keyset_sort,
+    page_cursor
+)
+from utils.events import (
+    AVAILABLE_ORDERS_CHANNEL,
+    event_hub,
+    format_sse,
+    publish_order_event,
+    user_channel
+)
 from bson import ObjectId
-import base64
-from io import BytesIO
+from datetime import datetime
+
+logger = get_logger("orders")
 
 router = APIRouter()
 
+# Seconds between keep-alive comments on idle event streams
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Fields left out of list responses unless explicitly requested
+HEAVY_ORDER_FIELDS = ("completion_image_url",)
+
+MAX_DISPATCH_LIMIT = 50
+
+async def fetch_order_page(
+    filter_query: dict,
+    sort_field: str,
+    direction: int,
+    limit: int,
+    cursor: Optional[str],
+    include_images: bool
+) -> Response:
+    """Fetch one keyset page of orders as JSON, with the next-page cursor header"""
+    db = await get_database()
+    
+    after_cursor = keyset_filter(sort_field, direction, cursor)
+    if after_cursor:
+        filter_query = {"$and": [filter_query, after_cursor]}
+    projection = None if include_images else {field: 0 for field in HEAVY_ORDER_FIELDS}
+    
+    docs = await db.orders.find(filter_query, projection) \
+        .sort(keyset_sort(sort_field, direction)) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+    
+    next_cursor = page_cursor(docs, sort_field, limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    
+    # Our own documents: encode them directly rather than validating each as an Order
+    return documents_response(docs[:limit], Order, headers=headers)
+
+def quote_request(request: QuoteRequest) -> DeliveryQuote:
+    establishment = get_establishment_or_404(request.establishment_id)
+    quote = quote_order(get_catalog(), establishment, request.items, request.delivery_location)
+    return DeliveryQuote(
+        delivery_points=quote.delivery_points,
+        subtotal=quote.subtotal,
+        distance_miles=quote.distance_miles,
+        night=quote.night
+    )
+
+@router.post("/quote", response_model=DeliveryQuote)
+async def get_quote(
+    request: QuoteRequest,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Price a delivery before placing it"""
+    return quote_request(request)
+
+@router.post("/quote/batch", response_model=List[BatchQuoteResult])
+async def get_quotes(
+    request: BatchQuoteRequest,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Price several carts at once; a cart that cannot be priced gets an error instead of a quote"""
+    if len(request.quotes) > MAX_BATCH_QUOTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_QUOTES} quotes per request"
+        )
+    
+    results = []
+    for quote in request.quotes:
+        try:
+            results.append(BatchQuoteResult(quote=quote_request(quote)))
+        except HTTPException as e:
+            results.append(BatchQuoteResult(error=e.detail))
+    return results
+
 @router.post("/", response_model=Order)
 async def create_order(
     order_data: OrderCreate,
@@ -17,152 +130,266 @@ async def create_order(
     """Create a new delivery order"""
     db = await get_database()
     
-    # Check if user has enough points
-    if current_user.points < order_data.delivery_points:
+    # Verify establishment exists and price the order before charging anything.
+    # Both come from the in-memory catalog, so no database read is needed.
+    catalog = get_catalog()
+    establishment = get_establishment_or_404(order_data.establishment_id)
+    quote = quote_order(catalog, establishment, order_data.items, order_data.delivery_location)
+    if order_data.delivery_points is not None and order_data.delivery_points != quote.delivery_points:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient points for this delivery"
-        )
-
-    # Deduct points from customer when placing order
-    print(f"DEBUG: Deducting {order_data.delivery_points} points from customer {current_user.email}")
-    await db.users.update_one(
-        {"_id": ObjectId(current_user.id)},
-        {"$inc": {"points": -order_data.delivery_points}}
-    )
-    print(f"DEBUG: Points deducted successfully")
-
-    # Verify establishment exists
-    if not ObjectId.is_valid(order_data.establishment_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid establishment ID format"
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"The delivery price is now {quote.delivery_points} points"
         )
+    delivery_points = quote.delivery_points
     
-    establishment = await db.establishments.find_one({"_id": ObjectId(order_data.establishment_id)})
-    if not establishment:
+    # Deduct points from customer when placing order; the balance check is
+    # part of the write, so a stale current_user snapshot cannot overdraw
+    order_id = ObjectId()
+    logger.debug("Deducting %s points from customer %s", delivery_points, current_user.email)
+    if not await ledger.debit(str(current_user.id), delivery_points, str(order_id)):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Establishment not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Insufficient points for this delivery"
         )
+    principal_cache.invalidate(current_user.email)
     
     # Create order
     order_dict = {
+        "_id": order_id,
         "customer_id": str(current_user.id),
         "establishment_id": order_data.establishment_id,
-        "items": [item.dict() for item in order_data.items],
+        "items": [item.dict() for item in price_items(catalog, establishment, order_data.items)],
         "delivery_location": order_data.delivery_location.dict(),
         "special_instructions": order_data.special_instructions,
-        "delivery_points": order_data.delivery_points,
-        "status": OrderStatus.PENDING
+        "delivery_points": delivery_points,
+        "status": OrderStatus.PENDING,
+        "created_at": datetime.utcnow()
     }
     
-    result = await db.orders.insert_one(order_dict)
-    order_dict["id"] = str(result.inserted_id)  # Convert ObjectId to string and rename to id
-    if "_id" in order_dict:
-        del order_dict["_id"]  # Remove the _id field
-    
+    try:
+        await db.orders.insert_one(order_dict)
+    except Exception:
+        # The database that just failed may fail the refund too; the settlement sweep is the backstop
+        await refund_unplaced_order(str(current_user.id), delivery_points, str(order_id))
+        raise
+    order_dict["id"] = str(order_id)  # Convert ObjectId to string and rename to id
+    del order_dict["_id"]  # Remove the _id field
+    
+    publish_order_event(
+        "order.created", order_dict["id"], OrderStatus.PENDING.value,
+        customer_id=order_dict["customer_id"], broadcast=True
+    )
     return Order(**order_dict)
 
 @router.get("/my-orders", response_model=List[Order])
 async def get_my_orders(
     status_filter: Optional[OrderStatus] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description=f"Value of the {NEXT_CURSOR_HEADER} header from the previous page"),
+    include_images: bool = False,
     current_user: UserResponse = Depends(get_current_user)
 ):
-    """Get current user's orders"""
-    db = await get_database()
-    
+    """Get current user's orders, newest first"""
     filter_query = {"customer_id": str(current_user.id)}
     if status_filter:
         filter_query["status"] = status_filter
     
-    orders = []
-    async for order in db.orders.find(filter_query).sort("created_at", -1):
-        order["id"] = str(order["_id"])  # Convert ObjectId to string and rename to id
-        del order["_id"]  # Remove the _id field
-        print(f"DEBUG: My order after conversion: {order.get('id')}")
-        orders.append(Order(**order))
-    
-    return orders
+    return await fetch_order_page(filter_query, "created_at", -1, limit, cursor, include_images)
 
 @router.get("/available", response_model=List[Order])
-async def get_available_orders(current_user: UserResponse = Depends(get_current_user)):
-    """Get available orders for delivery (excluding user's own orders)"""
-    db = await get_database()
-    
-    orders = []
-    async for order in db.orders.find({
+async def get_available_orders(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description=f"Value of the {NEXT_CURSOR_HEADER} header from the previous page"),
+    include_images: bool = False,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Get available orders for delivery (excluding user's own orders), oldest first"""
+    filter_query = {
         "status": OrderStatus.PENDING,
         "customer_id": {"$ne": str(current_user.id)}
-    }).sort("created_at", 1):
-        order["id"] = str(order["_id"])  # Convert ObjectId to string and rename to id
-        del order["_id"]  # Remove the _id field
-        orders.append(Order(**order))
-    
-    return orders
+    }
+    return await fetch_order_page(filter_query, "created_at", 1, limit, cursor, include_images)
 
 @router.get("/delivering", response_model=List[Order])
-async def get_delivering_orders(current_user: UserResponse = Depends(get_current_user)):
-    """Get orders currently being delivered by the user"""
-    db = await get_database()
-    
-    orders = []
-    async for order in db.orders.find({
+async def get_delivering_orders(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description=f"Value of the {NEXT_CURSOR_HEADER} header from the previous page"),
+    include_images: bool = False,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Get orders currently being delivered by the user, earliest accepted first"""
+    filter_query = {
         "deliverer_id": str(current_user.id),
         "status": {"$in": [OrderStatus.ACCEPTED, OrderStatus.PICKED_UP]}
-    }).sort("accepted_at", 1):
-        order["id"] = str(order["_id"])  # Convert ObjectId to string and rename to id
-        del order["_id"]  # Remove the _id field
-        orders.append(Order(**order))
+    }
+    return await fetch_order_page(filter_query, "accepted_at", 1, limit, cursor, include_images)
+
+@router.get("/dispatch", response_model=List[DispatchCandidate])
+async def get_dispatch_candidates(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(10, ge=1, le=MAX_DISPATCH_LIMIT),
+    max_pickup_miles: Optional[float] = Query(None, gt=0, description="Skip orders whose pickup is farther than this"),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Available orders that suit a deliverer at (lat, lon) best, by trip length, points and waiting time"""
+    db = await get_database()
+    filter_query = {
+        "status": OrderStatus.PENDING,
+        "customer_id": {"$ne": str(current_user.id)}
+    }
     
-    return orders
+    # Rank on a slim projection of the oldest pending orders, then load only the winners
+    candidates = await db.orders.find(filter_query, RANKING_PROJECTION) \
+        .sort(keyset_sort("created_at", 1)) \
+        .limit(MAX_CANDIDATES) \
+        .to_list(length=MAX_CANDIDATES)
+    ranked = rank_orders(get_catalog(), lat, lon, candidates, limit, max_pickup_miles=max_pickup_miles)
+    if not ranked:
+        return documents_response([], DispatchCandidate)
+    
+    docs = await db.orders.find(
+        {**filter_query, "_id": {"$in": [ObjectId(r.order_id) for r in ranked]}},
+        {field: 0 for field in HEAVY_ORDER_FIELDS}
+    ).to_list(length=len(ranked))
+    by_id = {str(doc["_id"]): doc for doc in docs}
+    
+    # Orders accepted by someone else in the meantime simply drop out
+    return documents_response(
+        [
+            {
+                "order": by_id[r.order_id],
+                "pickup_miles": r.pickup_miles,
+                "delivery_miles": r.delivery_miles,
+                "total_miles": r.total_miles,
+                "waiting_minutes": r.waiting_minutes,
+                "score": r.score
+            }
+            for r in ranked if r.order_id in by_id
+        ],
+        DispatchCandidate
+    )
 
-@router.put("/{order_id}/accept")
-async def accept_order(
-    order_id: str,
+@router.get("/bundles", response_model=List[BundleProposal])
+async def get_bundle_proposals(
+    limit: int = Query(10, ge=1, le=MAX_DISPATCH_LIMIT),
     current_user: UserResponse = Depends(get_current_user)
 ):
-    """Accept an order for delivery"""
-    if not ObjectId.is_valid(order_id):
+    """Proposed multi-order trips: available orders with a shared pickup and nearby drop-offs"""
+    db = await get_database()
+    filter_query = {
+        "status": OrderStatus.PENDING,
+        "customer_id": {"$ne": str(current_user.id)}
+    }
+    orders = await db.orders.find(filter_query, {field: 0 for field in HEAVY_ORDER_FIELDS}) \
+        .sort(keyset_sort("created_at", 1)) \
+        .limit(MAX_BUNDLE_CANDIDATES) \
+        .to_list(length=MAX_BUNDLE_CANDIDATES)
+    
+    bundles = propose_bundles(get_catalog(), orders)[:limit]
+    return documents_response(
+        [
+            {
+                "order_ids": bundle.order_ids,
+                "establishment_ids": bundle.establishment_ids,
+                "total_points": bundle.total_points,
+                "orders": bundle.orders
+            }
+            for bundle in bundles
+        ],
+        BundleProposal
+    )
+
+@router.post("/bundles/accept")
+async def accept_order_bundle(
+    bundle: BundleAccept,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Accept several orders for one trip, all or nothing"""
+    if len(bundle.order_ids) > MAX_BUNDLE_ORDERS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid order ID format"
+            detail=f"A bundle can hold at most {MAX_BUNDLE_ORDERS} orders"
         )
     
-    db = await get_database()
-    order = await db.orders.find_one({"_id": ObjectId(order_id)})
+    deliverer_id = str(current_user.id)
+    bundle_id = await accept_bundle(bundle.order_ids, deliverer_id)
     
-    if not order:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Order not found"
+    db = await get_database()
+    async for order in db.orders.find({"bundle_id": bundle_id}, {"customer_id": 1}):
+        publish_order_event(
+            "order.accepted", str(order["_id"]), OrderStatus.ACCEPTED.value,
+            customer_id=order["customer_id"], deliverer_id=deliverer_id, broadcast=True
         )
-    
-    if order["status"] != OrderStatus.PENDING:
+    return {"message": "Bundle accepted successfully", "bundle_id": bundle_id}
+
+@router.put("/bundles/{bundle_id}/update-status")
+async def update_bundle_status(
+    bundle_id: str,
+    status_update: OrderUpdate,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Mark every order in a bundle as picked up or delivered (for deliverer)"""
+    if status_update.status not in (OrderStatus.PICKED_UP, OrderStatus.DELIVERED):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Order is not available for acceptance"
+            detail="Deliverers can only mark orders as picked up or delivered"
         )
     
-    if order["customer_id"] == str(current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cannot accept your own order"
-        )
+    orders = await transition_bundle(bundle_id, status_update.status, str(current_user.id))
     
-    # Update order
-    from datetime import datetime
-    await db.orders.update_one(
-        {"_id": ObjectId(order_id)},
-        {
-            "$set": {
-                "deliverer_id": str(current_user.id),
-                "status": OrderStatus.ACCEPTED,
-                "accepted_at": datetime.utcnow()
-            }
-        }
+    for order in orders:
+        publish_order_event(
+            "order.status", str(order["_id"]), OrderStatus(status_update.status).value,
+            customer_id=order["customer_id"], deliverer_id=order["deliverer_id"]
+        )
+    return {"message": "Bundle status updated successfully", "order_ids": [str(order["_id"]) for order in orders]}
+
+@router.get("/stream")
+async def stream_order_events(
+    request: Request,
+    current_user: UserResponse = Depends(get_current_user_from_query)
+):
+    """Server-Sent Events feed of order changes for the current user and new available orders"""
+    subscription = event_hub.subscribe([user_channel(str(current_user.id)), AVAILABLE_ORDERS_CHANNEL])
+    
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield format_sse(event)
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.put("/{order_id}/accept")
+async def accept_order(
+    order_id: str,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Accept an order for delivery"""
+    # Guarded on PENDING, so of several concurrent acceptors exactly one wins
+    order = await transition_order(
+        order_id, OrderStatus.ACCEPTED, str(current_user.id), ACCEPTOR,
+        set_fields={"deliverer_id": str(current_user.id), **transition_timestamps(OrderStatus.ACCEPTED)},
+        forbidden_detail="Cannot accept your own order",
+        forbidden_status_code=status.HTTP_400_BAD_REQUEST,
+        invalid_state_detail="Order is not available for acceptance"
     )
     
+    publish_order_event(
+        "order.accepted", order_id, OrderStatus.ACCEPTED.value,
+        customer_id=order["customer_id"], deliverer_id=str(current_user.id), broadcast=True
+    )
     return {"message": "Order accepted successfully"}
 
 @router.put("/{order_id}/update-status")
@@ -172,37 +399,22 @@ async def update_order_status(
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Update order status (for deliverer)"""
-    if not ObjectId.is_valid(order_id):
+    if status_update.status not in (OrderStatus.PICKED_UP, OrderStatus.DELIVERED):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid order ID format"
-        )
-    
-    db = await get_database()
-    order = await db.orders.find_one({"_id": ObjectId(order_id)})
-    
-    if not order:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Order not found"
-        )
-    
-    if order["deliverer_id"] != str(current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to update this order"
+            detail="Deliverers can only mark orders as picked up or delivered"
         )
     
-    update_data = {"status": status_update.status}
-    
-    if status_update.status == OrderStatus.DELIVERED:
-        update_data["completion_image_url"] = status_update.completion_image_url
-    
-    await db.orders.update_one(
-        {"_id": ObjectId(order_id)},
-        {"$set": update_data}
+    # Completion photos only arrive through upload-image; the image URL is never client-supplied
+    order = await transition_order(
+        order_id, status_update.status, str(current_user.id), DELIVERER,
+        forbidden_detail="Not authorized to update this order"
     )
     
+    publish_order_event(
+        "order.status", order_id, OrderStatus(status_update.status).value,
+        customer_id=order["customer_id"], deliverer_id=order["deliverer_id"]
+    )
     return {"message": "Order status updated successfully"}
 
 @router.put("/{order_id}/complete")
@@ -211,59 +423,30 @@ async def complete_order(
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Complete an order (customer confirms receipt)"""
-    print(f"DEBUG: Complete order called by {current_user.email} for order {order_id}")
-    if not ObjectId.is_valid(order_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid order ID format"
-        )
-    
-    db = await get_database()
-    order = await db.orders.find_one({"_id": ObjectId(order_id)})
-    
-    if not order:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Order not found"
-        )
-    
-    if order["customer_id"] != str(current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to complete this order"
-        )
-    
-    if order["status"] != OrderStatus.DELIVERED:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Order must be delivered before completion"
-        )
+    logger.debug("Complete order called by %s for order %s", current_user.email, order_id)
+    
+    # Mark order as completed first: the status guard makes a double completion
+    # (and so a double payout) impossible. The flag lets a sweep find orders
+    # whose payout job was lost if we crash before enqueueing it.
+    order = await transition_order(
+        order_id, OrderStatus.COMPLETED, str(current_user.id), CUSTOMER,
+        set_fields={**transition_timestamps(OrderStatus.COMPLETED), AWAITING_SETTLEMENT: True},
+        forbidden_detail="Not authorized to complete this order",
+        invalid_state_detail="Order must be delivered before completion"
+    )
     
     # Transfer points to deliverer (customer already paid when placing order)
-    deliverer_id = ObjectId(order["deliverer_id"])
     points = order["delivery_points"]
     
-    print(f"DEBUG: Transferring {points} points to deliverer {order['deliverer_id']}")
-    # Add points to deliverer
-    await db.users.update_one(
-        {"_id": deliverer_id},
-        {"$inc": {"points": points}}
-    )
-    print(f"DEBUG: Points transferred successfully")
+    logger.debug("Queueing transfer of %s points to deliverer %s", points, order["deliverer_id"])
+    # Paid by a background job; credits settling around the same time share one bulk write
+    await enqueue_delivery_credit(order_id, order["deliverer_id"], points)
     
-    # Mark order as completed
-    from datetime import datetime
-    await db.orders.update_one(
-        {"_id": ObjectId(order_id)},
-        {
-            "$set": {
-                "status": OrderStatus.COMPLETED,
-                "completed_at": datetime.utcnow()
-            }
-        }
+    publish_order_event(
+        "order.completed", order_id, OrderStatus.COMPLETED.value,
+        customer_id=order["customer_id"], deliverer_id=order["deliverer_id"]
     )
-    
-    return {"message": "Order completed successfully, points transferred"}
+    return {"message": "Order completed successfully, points will be transferred shortly"}
 
 @router.post("/{order_id}/upload-image")
 async def upload_completion_image(
@@ -279,44 +462,102 @@ async def upload_completion_image(
         )
     
     # Check file type
-    if not file.content_type.startswith('image/'):
+    if not file.content_type or not file.content_type.startswith('image/'):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File must be an image"
         )
     
-    db = await get_database()
-    order = await db.orders.find_one({"_id": ObjectId(order_id)})
+    # Stream the upload into the blob store; only its ID goes on the order
+    blob = await blob_store.save(
+        iter_upload(file, MAX_IMAGE_UPLOAD_BYTES), file.content_type, {"order_id": order_id}
+    )
+    image_url = f"/api/orders/{order_id}/image"
+    
+    # Update order with image and status; the document it replaced says which
+    # photo to delete, even if image processing swapped it in the meantime
+    try:
+        previous = await transition_order(
+            order_id, OrderStatus.DELIVERED, str(current_user.id), DELIVERER,
+            set_fields={
+                "completion_image_id": blob.id,
+                "completion_image_url": image_url,
+                "has_completion_image": True,
+                "completion_thumbnail_id": None,
+                "completion_thumbnail_url": None
+            },
+            forbidden_detail="Not authorized to upload image for this order",
+            return_previous=True
+        )
+    except HTTPException:
+        await blob_store.delete(blob.id)
+        raise
+    
+    # A re-submitted delivery replaces the earlier photo
+    for field in ("completion_image_id", "completion_thumbnail_id"):
+        previous_id = previous.get(field)
+        if previous_id and previous_id != blob.id:
+            await blob_store.delete(previous_id)
+    
+    # Resizing and thumbnailing happen after we respond; the raw photo is served meanwhile
+    await image_processor.submit(order_id, blob.id)
+    
+    publish_order_event(
+        "order.status", order_id, OrderStatus.DELIVERED.value,
+        customer_id=previous["customer_id"], deliverer_id=previous["deliverer_id"]
+    )
+    return {"message": "Image uploaded successfully", "image_url": image_url}
+
+async def serve_order_image(request: Request, order_id: str, current_user: UserResponse, field: str, label: str):
+    """Stream one of an order's stored images to its customer or deliverer"""
+    if not ObjectId.is_valid(order_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid order ID format"
+        )
     
+    db = await get_database()
+    order = await db.orders.find_one(
+        {"_id": ObjectId(order_id)},
+        {"customer_id": 1, "deliverer_id": 1, field: 1}
+    )
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
-    
-    if order["deliverer_id"] != str(current_user.id):
+    if (order["customer_id"] != str(current_user.id) and 
+        order.get("deliverer_id") != str(current_user.id)):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to upload image for this order"
+            detail="Not authorized to view this order"
         )
     
-    # Convert image to base64 for simple storage
-    image_data = await file.read()
-    image_base64 = base64.b64encode(image_data).decode()
-    image_url = f"data:{file.content_type};base64,{image_base64}"
-    
-    # Update order with image and status
-    await db.orders.update_one(
-        {"_id": ObjectId(order_id)},
-        {
-            "$set": {
-                "completion_image_url": image_url,
-                "status": OrderStatus.DELIVERED
-            }
-        }
-    )
-    
-    return {"message": "Image uploaded successfully", "image_url": image_url}
+    info = await blob_store.info(order[field]) if order.get(field) else None
+    if info is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{label} not found"
+        )
+    return serve_blob(request, info)
+
+@router.get("/{order_id}/image")
+async def get_completion_image(
+    order_id: str,
+    request: Request,
+    current_user: UserResponse = Depends(get_current_user_from_header_or_query)
+):
+    """Stream an order's completion image, with Range and conditional GET support"""
+    return await serve_order_image(request, order_id, current_user, "completion_image_id", "Completion image")
+
+@router.get("/{order_id}/thumbnail")
+async def get_completion_thumbnail(
+    order_id: str,
+    request: Request,
+    current_user: UserResponse = Depends(get_current_user_from_header_or_query)
+):
+    """Stream the small version of an order's completion image, once it has been processed"""
+    return await serve_order_image(request, order_id, current_user, "completion_thumbnail_id", "Thumbnail")
 
 @router.get("/{order_id}", response_model=Order)
 async def get_order(
@@ -347,4 +588,5 @@ async def get_order(
             detail="Not authorized to view this order"
         )
     
+    order["_id"] = str(order["_id"])  # Convert ObjectId to string
     return Order(**order)
\ No newline at end of file
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from models.schemas import Establishment, Location
+from utils.catalog import CatalogSnapshot
+from utils.dispatch import order_created_at, rank_orders
+
+def snapshot(*establishments):
+    return CatalogSnapshot(
+        version=1,
+        loaded_at=datetime.utcnow(),
+        establishments=tuple(establishments),
+        by_id={est.id: est for est in establishments}
+    )
+
+def order(establishment_id, **fields):
+    return {
+        "_id": ObjectId(),
+        "establishment_id": establishment_id,
+        "delivery_location": {"latitude": 39.981, "longitude": -75.155},
+        "delivery_points": 10,
+        **fields
+    }
+
+def test_rank_orders_accepts_orders_without_created_at():
+    est = Establishment(_id=str(ObjectId()), name="Cafe", category="Coffee",
+                        location=Location(latitude=39.98, longitude=-75.155, address="1 Main St"))
+    now = datetime.utcnow()
+    legacy = order(est.id)
+    recent = order(est.id, created_at=now - timedelta(minutes=5))
+
+    ranked = rank_orders(snapshot(est), 39.98, -75.155, [legacy, recent], limit=2, now=now + timedelta(minutes=1))
+
+    assert {r.order_id for r in ranked} == {str(legacy["_id"]), str(recent["_id"])}
+    assert all(r.waiting_minutes >= 0 for r in ranked)
+
+def test_order_created_at_falls_back_to_object_id():
+    legacy = order("x")
+    assert order_created_at(legacy) == legacy["_id"].generation_time.replace(tzinfo=None)
@@ -1,13 +1,20 @@
 from datetime import datetime, timedelta
+from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from decouple import config
 from models.schemas import TokenData, UserInDB
 from utils.database import get_database
+from utils.ledger import APPLIED_FIELD
+from utils.principal_cache import principal_cache
+from utils.hashing import password_hasher
+from utils.log import get_logger
 import re
 
+logger = get_logger("auth")
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -19,8 +26,16 @@ SECRET_KEY = os.environ.get("SECRET_KEY", "oAjF8gG618uiqvAOft0o_J3_antPMd_mjjxrp
 ALGORITHM = os.environ.get("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Comma-separated list of emails allowed to use the admin endpoints
+ADMIN_EMAILS = {
+    email.strip().lower()
+    for email in os.environ.get("ADMIN_EMAILS", "").split(",")
+    if email.strip()
+}
+
 # Security scheme
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -32,6 +47,14 @@ def get_password_hash(password):
         password = password_bytes[:72].decode('utf-8', errors='ignore')
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password, hashed_password):
+    """verify_password on the hashing pool, keeping the event loop free"""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """get_password_hash on the hashing pool, keeping the event loop free"""
+    return await password_hasher.run(get_password_hash, password)
+
 def validate_temple_email(email: str) -> bool:
     """Validate that the email is a temple.edu email"""
     pattern = r'^[a-zA-Z0-9._%+-]+@temple\.edu$'
@@ -50,7 +73,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 async def get_user_by_email(email: str):
     """Get user from database by email"""
     db = await get_database()
-    user = await db.users.find_one({"email": email})
+    user = await db.users.find_one({"email": email}, {APPLIED_FIELD: 0})
     if user:
         user["_id"] = str(user["_id"])  # Convert ObjectId to string
         return UserInDB(**user)
@@ -61,40 +84,68 @@ async def authenticate_user(email: str, password: str):
     user = await get_user_by_email(email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current authenticated user from JWT token"""
+    return await get_user_from_token(credentials.credentials)
+
+async def get_current_user_from_query(token: str = Query(..., description="JWT access token")):
+    """Get current user from a ?token= parameter, for clients that cannot set headers (EventSource, <img>)"""
+    return await get_user_from_token(token)
+
+async def get_current_user_from_header_or_query(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    token: Optional[str] = Query(None, description="JWT access token, when no Authorization header is sent")
+):
+    """Accept either a Bearer header or ?token=, for resources fetched both by API clients and <img> tags"""
+    if credentials is not None:
+        return await get_user_from_token(credentials.credentials)
+    if token:
+        return await get_user_from_token(token)
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Not authenticated"
+    )
+
+async def get_user_from_token(token: str):
+    """Resolve a JWT access token to the user it was issued for"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        print(f"DEBUG: Received token: {credentials.credentials[:50]}...")  # Only show first 50 chars
-        print(f"DEBUG: SECRET_KEY configured: {SECRET_KEY[:10]}...")  # Only show first 10 chars
-        print(f"DEBUG: ALGORITHM: {ALGORITHM}")
-        
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"DEBUG: Decoded payload: {payload}")
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         
         email: str = payload.get("sub")
         if email is None:
-            print("DEBUG: No 'sub' field in token payload")
+            logger.debug("Token payload has no 'sub' field")
             raise credentials_exception
         
-        print(f"DEBUG: Email from token: {email}")
         token_data = TokenData(email=email)
     except JWTError as e:
-        print(f"DEBUG: JWT decode error: {e}")
+        logger.debug("JWT decode error: %s", e)
         raise credentials_exception
     
-    user = await get_user_by_email(email=token_data.email)
+    user = principal_cache.get(token_data.email)
     if user is None:
-        print(f"DEBUG: User not found in database: {token_data.email}")
-        raise credentials_exception
+        user = await get_user_by_email(email=token_data.email)
+        if user is None:
+            logger.debug("Token user not found: %s", token_data.email)
+            raise credentials_exception
+        principal_cache.put(user)
     
-    print(f"DEBUG: User authenticated successfully: {user.email}")
-    return user
\ No newline at end of file
+    logger.debug("Authenticated %s", user.email)
+    return user
+
+async def get_current_admin(current_user: UserInDB = Depends(get_current_user)):
+    """Require the authenticated user to be listed in ADMIN_EMAILS"""
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
\ No newline at end of file
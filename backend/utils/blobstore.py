@@ -0,0 +1,281 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from bson import ObjectId
+from utils.database import get_database
+from utils.http_cache import not_modified, validator_headers
+from utils.log import get_logger
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+
+logger = get_logger("blobstore")
+
+CHUNK_SIZE = 256 * 1024
+MAX_IMAGE_UPLOAD_BYTES = int(os.environ.get("MAX_IMAGE_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+@dataclass(frozen=True)
+class BlobInfo:
+    id: str
+    length: int
+    content_type: str
+    sha256: str
+    uploaded_at: datetime
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256}"'
+
+def payload_too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File is too large (maximum {max_bytes // (1024 * 1024)} MB)"
+    )
+
+async def iter_upload(file: UploadFile, max_bytes: int) -> AsyncIterator[bytes]:
+    """Yield an upload in chunks, failing with 413 once it passes max_bytes"""
+    received = 0
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        received += len(chunk)
+        if received > max_bytes:
+            raise payload_too_large(max_bytes)
+        yield chunk
+
+class GridFSBlobStore:
+    """Blobs in a MongoDB GridFS bucket, so every app instance sees the same files"""
+
+    def __init__(self, bucket_name: str = "completion_images"):
+        self.bucket_name = bucket_name
+
+    async def _bucket(self):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        return AsyncIOMotorGridFSBucket(await get_database(), bucket_name=self.bucket_name)
+
+    async def save(self, chunks: AsyncIterator[bytes], content_type: str, metadata: Optional[dict] = None) -> BlobInfo:
+        bucket = await self._bucket()
+        digest = hashlib.sha256()
+        grid_in = bucket.open_upload_stream(
+            "blob",
+            chunk_size_bytes=CHUNK_SIZE,
+            metadata={"content_type": content_type, **(metadata or {})}
+        )
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                await grid_in.write(chunk)
+        except BaseException:
+            await grid_in.abort()
+            raise
+        await grid_in.set("sha256", digest.hexdigest())
+        await grid_in.close()
+        return BlobInfo(
+            id=str(grid_in._id),
+            length=grid_in.length,
+            content_type=content_type,
+            sha256=digest.hexdigest(),
+            uploaded_at=grid_in.upload_date
+        )
+
+    async def info(self, blob_id: str) -> Optional[BlobInfo]:
+        if not ObjectId.is_valid(blob_id):
+            return None
+        db = await get_database()
+        doc = await db[f"{self.bucket_name}.files"].find_one({"_id": ObjectId(blob_id)})
+        if doc is None:
+            return None
+        metadata = doc.get("metadata") or {}
+        return BlobInfo(
+            id=blob_id,
+            length=doc["length"],
+            content_type=metadata.get("content_type", "application/octet-stream"),
+            sha256=doc.get("sha256") or blob_id,
+            uploaded_at=doc["uploadDate"]
+        )
+
+    async def read_range(self, blob_id: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield bytes start..end inclusive"""
+        bucket = await self._bucket()
+        grid_out = await bucket.open_download_stream(ObjectId(blob_id))
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def delete(self, blob_id: str):
+        bucket = await self._bucket()
+        try:
+            await bucket.delete(ObjectId(blob_id))
+        except Exception as e:
+            logger.warning("Failed to delete blob %s: %s", blob_id, e)
+
+class LocalBlobStore:
+    """Content-addressed files on local disk, named by their SHA-256, for single-instance deployments"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, blob_id: str) -> str:
+        return os.path.join(self.root, blob_id[:2], blob_id)
+
+    def _valid(self, blob_id: str) -> bool:
+        return len(blob_id) == 64 and all(c in "0123456789abcdef" for c in blob_id)
+
+    def _commit(self, tmp_path: str, blob_id: str, content_type: str, metadata: Optional[dict]) -> datetime:
+        path = self._path(blob_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        with open(path + ".json", "w") as meta:
+            json.dump({"content_type": content_type, **(metadata or {})}, meta)
+        return datetime.utcfromtimestamp(os.path.getmtime(path))
+
+    def _discard(self, tmp_path: str):
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    async def save(self, chunks: AsyncIterator[bytes], content_type: str, metadata: Optional[dict] = None) -> BlobInfo:
+        await asyncio.to_thread(os.makedirs, self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        length = 0
+        fd, tmp_path = await asyncio.to_thread(tempfile.mkstemp, dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    length += len(chunk)
+                    await asyncio.to_thread(out.write, chunk)
+            blob_id = digest.hexdigest()
+            uploaded_at = await asyncio.to_thread(self._commit, tmp_path, blob_id, content_type, metadata)
+        except BaseException:
+            await asyncio.to_thread(self._discard, tmp_path)
+            raise
+        return BlobInfo(blob_id, length, content_type, blob_id, uploaded_at)
+
+    def _info(self, blob_id: str) -> Optional[BlobInfo]:
+        path = self._path(blob_id)
+        if not os.path.exists(path):
+            return None
+        content_type = "application/octet-stream"
+        if os.path.exists(path + ".json"):
+            with open(path + ".json") as meta:
+                content_type = json.load(meta).get("content_type", content_type)
+        return BlobInfo(blob_id, os.path.getsize(path), content_type, blob_id,
+                        datetime.utcfromtimestamp(os.path.getmtime(path)))
+
+    async def info(self, blob_id: str) -> Optional[BlobInfo]:
+        if not self._valid(blob_id):
+            return None
+        return await asyncio.to_thread(self._info, blob_id)
+
+    async def read_range(self, blob_id: str, start: int, end: int) -> AsyncIterator[bytes]:
+        blob = await asyncio.to_thread(open, self._path(blob_id), "rb")
+        try:
+            await asyncio.to_thread(blob.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(blob.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            blob.close()
+
+    def _remove(self, blob_id: str):
+        path = self._path(blob_id)
+        for name in (path, path + ".json"):
+            try:
+                os.unlink(name)
+            except FileNotFoundError:
+                pass
+
+    async def delete(self, blob_id: str):
+        if not self._valid(blob_id):
+            return
+        # Identical photos share one file, so it stays while any order still points at it
+        db = await get_database()
+        in_use = await db.orders.find_one(
+            {"$or": [{"completion_image_id": blob_id}, {"completion_thumbnail_id": blob_id}]}, {"_id": 1}
+        )
+        if in_use:
+            return
+        try:
+            await asyncio.to_thread(self._remove, blob_id)
+        except OSError as e:
+            logger.warning("Failed to delete blob %s: %s", blob_id, e)
+
+def create_blob_store():
+    backend = os.environ.get("BLOB_STORE", "gridfs")
+    if backend == "local":
+        return LocalBlobStore(os.environ.get("BLOB_STORE_PATH", os.path.join("data", "blobs")))
+    return GridFSBlobStore()
+
+blob_store = create_blob_store()
+
+# Blob IDs are never reused for different content, so responses can be cached for good
+BLOB_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+def _parse_range(header: str, length: int):
+    """(start, end) for a single "bytes=" range, None to serve everything, or raise 416"""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None  # Unsupported or multi-range: fall back to the full body
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(0, length - suffix), length - 1
+        else:
+            start = int(first)
+            end = int(last) if last else length - 1
+    except ValueError:
+        start, end = length, length  # Malformed: treat as unsatisfiable
+    if start >= length or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, min(end, length - 1)
+
+def serve_blob(request: Request, info: BlobInfo, store=None) -> Response:
+    """Stream a blob honouring If-None-Match, If-Modified-Since, Range and If-Range"""
+    store = store or blob_store
+    headers = {
+        **validator_headers(info.etag, info.uploaded_at, BLOB_CACHE_CONTROL),
+        "Accept-Ranges": "bytes"
+    }
+    if not_modified(request, info.etag, info.uploaded_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and info.length and (if_range is None or if_range.strip() == info.etag):
+        byte_range = _parse_range(range_header, info.length)
+
+    if byte_range is None:
+        start, end, status_code = 0, info.length - 1, status.HTTP_200_OK
+    else:
+        (start, end), status_code = byte_range, status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.length}"
+    headers["Content-Length"] = str(max(0, end - start + 1))
+
+    return StreamingResponse(
+        store.read_range(info.id, start, end) if info.length else iter(()),
+        status_code=status_code,
+        media_type=info.content_type,
+        headers=headers
+    )
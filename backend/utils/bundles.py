@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+import os
+import numpy as np
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+from models.schemas import OrderStatus
+from utils.catalog import CatalogSnapshot
+from utils.database import get_database
+from utils.dispatch import establishment_table
+from utils.distance import distances_from
+from utils.transitions import allowed_sources, transition_timestamps
+
+MAX_BUNDLE_ORDERS = int(os.environ.get("BUNDLE_MAX_ORDERS", "4"))
+# Establishments this close together count as a single pickup stop
+PICKUP_RADIUS_MILES = float(os.environ.get("BUNDLE_PICKUP_RADIUS_MILES", "0.1"))
+DROPOFF_RADIUS_MILES = float(os.environ.get("BUNDLE_DROPOFF_RADIUS_MILES", "0.25"))
+# Oldest pending orders considered when proposing bundles
+MAX_BUNDLE_CANDIDATES = int(os.environ.get("BUNDLE_MAX_CANDIDATES", "500"))
+
+@dataclass(frozen=True)
+class Bundle:
+    orders: Tuple[dict, ...]
+
+    @property
+    def order_ids(self) -> List[str]:
+        return [str(order["_id"]) for order in self.orders]
+
+    @property
+    def establishment_ids(self) -> List[str]:
+        return list(dict.fromkeys(order["establishment_id"] for order in self.orders))
+
+    @property
+    def total_points(self) -> int:
+        return sum(order["delivery_points"] for order in self.orders)
+
+def propose_bundles(snapshot: CatalogSnapshot, orders: Sequence[dict], max_orders: int = MAX_BUNDLE_ORDERS) -> List[Bundle]:
+    """Group pending orders (oldest first) into trips of at least two orders.
+
+    Each bundle starts from the oldest order not yet bundled and takes the
+    next oldest orders whose pickup and drop-off are both close to its own.
+    """
+    table = establishment_table(snapshot)
+    orders = [order for order in orders if order["establishment_id"] in table.rows]
+    if len(orders) < 2:
+        return []
+
+    rows = np.fromiter((table.rows[order["establishment_id"]] for order in orders), dtype=np.intp, count=len(orders))
+    dropoffs = np.array(
+        [(order["delivery_location"]["latitude"], order["delivery_location"]["longitude"]) for order in orders],
+        dtype=np.float64
+    )
+    unassigned = np.ones(len(orders), dtype=bool)
+    bundles = []
+    for seed in range(len(orders)):
+        if not unassigned[seed]:
+            continue
+        unassigned[seed] = False
+        nearby = (
+            unassigned
+            & (table.pairwise[rows[seed], rows] <= PICKUP_RADIUS_MILES)
+            & (distances_from(dropoffs[seed, 0], dropoffs[seed, 1], dropoffs) <= DROPOFF_RADIUS_MILES)
+        )
+        members = np.flatnonzero(nearby)[:max_orders - 1]
+        if len(members) == 0:
+            continue
+        unassigned[members] = False
+        bundles.append(Bundle(tuple(orders[i] for i in (seed, *members))))
+    return bundles
+
+async def accept_bundle(order_ids: Sequence[str], deliverer_id: str) -> str:
+    """Accept every order in the bundle or none of them; returns the new bundle id.
+
+    All acceptances go out in one bulk write, each guarded like a single
+    accept. If any order was taken meanwhile, the ones we did win are
+    released back to pending before reporting the conflict.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    if not all(ObjectId.is_valid(order_id) for order_id in order_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid order ID format"
+        )
+
+    db = await get_database()
+    bundle_id = str(ObjectId())
+    accepted = {
+        "status": OrderStatus.ACCEPTED,
+        "deliverer_id": deliverer_id,
+        "bundle_id": bundle_id,
+        **transition_timestamps(OrderStatus.ACCEPTED)
+    }
+    result = await db.orders.bulk_write(
+        [
+            UpdateOne(
+                {
+                    "_id": ObjectId(order_id),
+                    "status": {"$in": allowed_sources(OrderStatus.ACCEPTED)},
+                    "customer_id": {"$ne": deliverer_id}
+                },
+                {"$set": accepted}
+            )
+            for order_id in order_ids
+        ],
+        ordered=False
+    )
+    if result.modified_count == len(order_ids):
+        return bundle_id
+
+    await db.orders.update_many(
+        {"bundle_id": bundle_id, "deliverer_id": deliverer_id, "status": OrderStatus.ACCEPTED},
+        {"$set": {"status": OrderStatus.PENDING}, "$unset": {"deliverer_id": "", "bundle_id": "", "accepted_at": ""}}
+    )
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Some orders in this bundle are no longer available"
+    )
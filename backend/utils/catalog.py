@@ -0,0 +1,177 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+from pymongo import ReturnDocument
+from models.schemas import Establishment
+from utils.database import get_database
+from utils.geo import GeoIndex
+from utils.log import get_logger
+from utils.search import establishment_search
+from utils.serialization import dumps
+import asyncio
+import hashlib
+import os
+
+logger = get_logger("catalog")
+
+# Each process keeps its own snapshot; a reload anywhere bumps a revision in
+# Mongo, and every process reloads when it sees a revision it has not loaded
+CATALOG_POLL_SECONDS = float(os.environ.get("CATALOG_POLL_SECONDS", "30"))
+CATALOG_STATE_ID = "catalog"
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Immutable view of the establishment catalog at a given version"""
+    version: int
+    loaded_at: datetime
+    establishments: Tuple[Establishment, ...] = ()
+    by_id: Mapping[str, Establishment] = field(default_factory=lambda: MappingProxyType({}))
+    menus: Mapping[str, Tuple[dict, ...]] = field(default_factory=lambda: MappingProxyType({}))
+    geo: GeoIndex = field(default_factory=lambda: GeoIndex([]))
+    # Content validators for HTTP caching: a digest of the whole catalog and one per
+    # establishment, stable across reloads and processes while the data is unchanged
+    digest: str = ""
+    digests: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    modified_at: Optional[datetime] = None
+
+    @property
+    def active(self) -> Tuple[Establishment, ...]:
+        return tuple(est for est in self.establishments if est.is_active)
+
+    def get(self, establishment_id: str) -> Optional[Establishment]:
+        return self.by_id.get(establishment_id)
+
+    def menu(self, establishment_id: str) -> Tuple[dict, ...]:
+        return self.menus.get(establishment_id, ())
+
+    @property
+    def last_modified(self) -> datetime:
+        return self.modified_at or self.loaded_at
+
+class Catalog:
+    """In-process establishment catalog, seeded once and swapped atomically on reload"""
+
+    def __init__(self):
+        self._snapshot = CatalogSnapshot(version=0, loaded_at=datetime.utcnow())
+        self._seed = ()
+        self._lock = asyncio.Lock()
+        self._revision: Optional[int] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    async def load(self, seed=None, publish: bool = False) -> CatalogSnapshot:
+        """Sync the seed establishments into Mongo and publish a new snapshot.
+
+        With `publish`, the other processes are told to reload as well.
+        """
+        async with self._lock:
+            if seed is not None:
+                self._seed = tuple(seed)
+            db = await get_database()
+
+            # Upsert by name so existing establishment IDs survive a reload
+            for template in self._seed:
+                await db.establishments.update_one(
+                    {"name": template["name"]},
+                    {"$set": dict(template)},
+                    upsert=True
+                )
+            if self._seed:
+                # Establishments dropped from the seed stop taking orders; their IDs stay valid for old orders
+                await db.establishments.update_many(
+                    {"name": {"$nin": [template["name"] for template in self._seed]}, "is_active": {"$ne": False}},
+                    {"$set": {"is_active": False}}
+                )
+
+            # Read before the establishments, so a reload published meanwhile is not missed
+            if publish:
+                state = await db.catalog_state.find_one_and_update(
+                    {"_id": CATALOG_STATE_ID}, {"$inc": {"revision": 1}},
+                    upsert=True, return_document=ReturnDocument.AFTER
+                )
+                revision = state["revision"]
+            else:
+                revision = await self._stored_revision()
+
+            establishments = []
+            menus = {}
+            digests = {}
+            async for est in db.establishments.find({}):
+                est["_id"] = str(est["_id"])  # Convert ObjectId to string
+                menus[est["_id"]] = tuple(est.get("menu_items", []))
+                digests[est["_id"]] = hashlib.blake2b(dumps(est, sort_keys=True), digest_size=12).hexdigest()
+                establishments.append(Establishment(**est))
+
+            digest = hashlib.blake2b(
+                "".join(f"{est_id}:{digests[est_id]};" for est_id in sorted(digests)).encode(), digest_size=12
+            ).hexdigest()
+            now = datetime.utcnow()
+            previous = self._snapshot
+            self._snapshot = CatalogSnapshot(
+                version=previous.version + 1,
+                loaded_at=now,
+                establishments=tuple(establishments),
+                by_id=MappingProxyType({est.id: est for est in establishments}),
+                menus=MappingProxyType(menus),
+                geo=GeoIndex(
+                    (est.location.latitude, est.location.longitude, est)
+                    for est in establishments if est.is_active
+                ),
+                digest=digest,
+                digests=MappingProxyType(digests),
+                # A reload that changed nothing keeps clients' cached copies valid
+                modified_at=previous.modified_at if digest == previous.digest else now.replace(microsecond=0)
+            )
+            self._revision = revision
+            logger.info("Loaded establishment catalog v%s (%s establishments)", self._snapshot.version, len(establishments))
+
+            # Only establishments whose name, category or menu changed are re-indexed
+            changes = establishment_search.sync(self._snapshot)
+            logger.info("Search index v%s: %s", establishment_search.version, changes)
+            return self._snapshot
+
+    async def _stored_revision(self) -> int:
+        db = await get_database()
+        state = await db.catalog_state.find_one({"_id": CATALOG_STATE_ID})
+        return state["revision"] if state else 0
+
+    async def refresh(self) -> bool:
+        """Reload if another process has published a catalog this one has not loaded"""
+        if await self._stored_revision() == self._revision:
+            return False
+        await self.load()
+        return True
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("Catalog refresh failed: %s", e)
+
+    def start_watching(self, interval: float = CATALOG_POLL_SECONDS):
+        if self._watcher is None and interval > 0:
+            self._watcher = asyncio.create_task(self._watch(interval), name="catalog-watch")
+
+    async def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+catalog = Catalog()
+
+def get_catalog() -> CatalogSnapshot:
+    return catalog.snapshot
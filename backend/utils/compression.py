@@ -0,0 +1,178 @@
+from typing import Callable, Dict, FrozenSet, Optional
+import os
+import zlib
+from utils.metrics import compression_metrics
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+# Brotli's higher qualities cost far more CPU than they save on the wire for per-request compression
+BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Text formats worth compressing; images, archives and media are already compressed
+COMPRESSIBLE_TYPES: FrozenSet[str] = frozenset({
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+    "text/xml",
+})
+
+# Server preference when the client accepts several equally
+PREFERRED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick an encoding from an Accept-Encoding header, or None for identity"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+    best = None
+    for encoding in PREFERRED_ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = (encoding, weight)
+    return best[0] if best else None
+
+class _Gzip:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+COMPRESSORS: Dict[str, Callable[[], object]] = {"gzip": _Gzip, "br": _Brotli}
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+def _compressible(status: int, headers) -> bool:
+    if status < 200 or status in (204, 206, 304):
+        return False
+    if _header(headers, b"content-encoding") is not None:
+        return False
+    content_type = _header(headers, b"content-type")
+    if content_type is None:
+        return False
+    if content_type.split(b";")[0].strip().decode("latin-1").lower() not in COMPRESSIBLE_TYPES:
+        return False
+    cache_control = _header(headers, b"cache-control") or b""
+    return b"no-transform" not in cache_control.lower()
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli for text responses, compressed chunk by chunk as they stream.
+
+    Responses smaller than `minimum_size` (when that is known up front),
+    non-text types, partial content and anything already encoded pass
+    through untouched. Strong ETags become weak on compressed responses,
+    since the bytes differ from the identity representation.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept = _header(scope["headers"], b"accept-encoding")
+        encoding = negotiate(accept.decode("latin-1")) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        bytes_in = bytes_out = 0
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, bytes_in, bytes_out
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                # First body chunk: decide once, then stream
+                start, start_message = start_message, None
+                headers = list(start["headers"])
+                compressible = _compressible(start["status"], headers)
+                if compressible:
+                    headers = [(k, v) for k, v in headers if k.lower() != b"vary"] + [
+                        (b"vary", _vary(_header(headers, b"vary")))
+                    ]
+                length = _header(headers, b"content-length")
+                known_size = int(length) if length is not None else (None if more_body else len(body))
+                if not compressible or (known_size is not None and known_size < self.minimum_size):
+                    await send({**start, "headers": headers})
+                    await send(message)
+                    return
+                compressor = COMPRESSORS[encoding]()
+                headers = [
+                    (k, b"W/" + v if k.lower() == b"etag" and not v.startswith(b"W/") else v)
+                    for k, v in headers if k.lower() != b"content-length"
+                ]
+                headers.append((b"content-encoding", encoding.encode()))
+                await send({**start, "headers": headers})
+
+            if compressor is None:
+                await send(message)
+                return
+            bytes_in += len(body)
+            chunk = compressor.compress(body) if body else b""
+            if not more_body:
+                chunk += compressor.finish()
+                bytes_out += len(chunk)
+                compression_metrics.record(encoding, bytes_in, bytes_out)
+                await send({"type": "http.response.body", "body": chunk, "more_body": False})
+            elif chunk:
+                bytes_out += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        await self.app(scope, receive, send_compressed)
+
+def _vary(existing: Optional[bytes]) -> bytes:
+    if not existing:
+        return b"Accept-Encoding"
+    if b"accept-encoding" in existing.lower() or existing.strip() == b"*":
+        return existing
+    return existing + b", Accept-Encoding"
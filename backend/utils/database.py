@@ -1,30 +1,78 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from decouple import config
+from utils.log import get_logger
+from utils.metrics import mongo_command_metrics, pool_metrics
+from utils.slow_queries import slow_query_log
 import asyncio
+import time
+
+logger = get_logger("database")
+
+def _optional_ms(name: str):
+    value = config(name, default="")
+    return int(value) if value else None
+
+# Pool sizing and timeouts; unset timeouts keep the driver defaults
+POOL_OPTIONS = {
+    "maxPoolSize": config("MONGO_MAX_POOL_SIZE", default=100, cast=int),
+    "minPoolSize": config("MONGO_MIN_POOL_SIZE", default=0, cast=int),
+    "maxIdleTimeMS": _optional_ms("MONGO_MAX_IDLE_TIME_MS"),
+    "waitQueueTimeoutMS": _optional_ms("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+    "serverSelectionTimeoutMS": config("MONGO_SERVER_SELECTION_TIMEOUT_MS", default=5000, cast=int),
+    "connectTimeoutMS": config("MONGO_CONNECT_TIMEOUT_MS", default=5000, cast=int),
+    "socketTimeoutMS": _optional_ms("MONGO_SOCKET_TIMEOUT_MS"),
+}
+# Connections to open before taking traffic, so the first requests do not pay for handshakes
+POOL_WARMUP = config("MONGO_POOL_WARMUP", default=POOL_OPTIONS["minPoolSize"], cast=int)
 
 class Database:
     client: AsyncIOMotorClient = None
     database = None
+    # Whether the startup ping succeeded, and why not
+    connected: bool = False
+    last_error: str = None
+    # Command and pool listeners see every operation on every collection
+    command_listeners = (mongo_command_metrics, slow_query_log, pool_metrics)
 
 database = Database()
 
 async def get_database():
     return database.database
 
+async def ping() -> float:
+    """Round-trip a ping to the server; returns milliseconds"""
+    start = time.perf_counter()
+    await database.client.admin.command('ping')
+    return (time.perf_counter() - start) * 1000
+
+async def warm_pool(connections: int):
+    """Open up to `connections` pooled connections by pinging concurrently"""
+    connections = min(connections, POOL_OPTIONS["maxPoolSize"])
+    if connections > 0:
+        await asyncio.gather(*(ping() for _ in range(connections)))
+
 async def connect_to_mongo():
     """Create database connection"""
     MONGODB_URL = config("MONGODB_URL", default="mongodb://localhost:27017")
-    database.client = AsyncIOMotorClient(MONGODB_URL)
+    options = {name: value for name, value in POOL_OPTIONS.items() if value is not None}
+    database.client = AsyncIOMotorClient(MONGODB_URL, event_listeners=list(Database.command_listeners), **options)
+    slow_query_log.bind(database.client, asyncio.get_running_loop())
     database.database = database.client.owlhacks_delivery
-    
-    # Test connection
+
+    # Test connection; a failure leaves the app running but not ready (see /api/ready)
+    # while main.prepare_database keeps retrying the rest of startup
     try:
-        await database.client.admin.command('ping')
-        print("Successfully connected to MongoDB!")
+        await ping()
+        await warm_pool(POOL_WARMUP)
+        database.connected = True
+        database.last_error = None
+        logger.info("Successfully connected to MongoDB!")
     except Exception as e:
-        print(f"Failed to connect to MongoDB: {e}")
+        database.connected = False
+        database.last_error = str(e)
+        logger.error("Failed to connect to MongoDB: %s", e)
 
 async def close_mongo_connection():
     """Close database connection"""
     if database.client:
-        database.client.close()
\ No newline at end of file
+        database.client.close()
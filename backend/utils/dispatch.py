@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import heapq
+import os
+import numpy as np
+from utils.catalog import CatalogSnapshot
+from utils.distance import distance_matrix, distances_from, paired_distances
+
+# Score = points offered + time waited - trip length, each scaled by its weight
+MILE_WEIGHT = float(os.environ.get("DISPATCH_MILE_WEIGHT", "4"))
+POINT_WEIGHT = float(os.environ.get("DISPATCH_POINT_WEIGHT", "1"))
+WAIT_WEIGHT = float(os.environ.get("DISPATCH_WAIT_WEIGHT", "0.25"))  # per minute
+# Beyond this an order gains nothing more from waiting, so stale orders don't swamp the ranking
+MAX_WAIT_MINUTES = float(os.environ.get("DISPATCH_MAX_WAIT_MINUTES", "30"))
+# Oldest pending orders considered per request
+MAX_CANDIDATES = int(os.environ.get("DISPATCH_MAX_CANDIDATES", "2000"))
+
+# The only order fields ranking needs
+RANKING_PROJECTION = {"establishment_id": 1, "delivery_location": 1, "delivery_points": 1, "created_at": 1}
+
+@dataclass(frozen=True)
+class EstablishmentTable:
+    """Establishment coordinates in array form, built once per catalog version"""
+    version: int
+    rows: Dict[str, int]
+    coordinates: np.ndarray  # (establishments, 2) lat, lon
+    pairwise: np.ndarray  # (establishments, establishments) miles between establishments
+
+    def distances_from(self, lat: float, lon: float) -> np.ndarray:
+        """Miles from one point to every establishment, one vectorized pass"""
+        return distances_from(lat, lon, self.coordinates)
+
+_table: Optional[EstablishmentTable] = None
+
+def establishment_table(snapshot: CatalogSnapshot) -> EstablishmentTable:
+    global _table
+    if _table is None or _table.version != snapshot.version:
+        active = snapshot.active
+        coordinates = np.array(
+            [(est.location.latitude, est.location.longitude) for est in active], dtype=np.float64
+        ).reshape(-1, 2)
+        _table = EstablishmentTable(
+            version=snapshot.version,
+            rows={est.id: row for row, est in enumerate(active)},
+            coordinates=coordinates,
+            pairwise=distance_matrix(coordinates, coordinates)
+        )
+    return _table
+
+@dataclass(frozen=True)
+class RankedOrder:
+    order_id: str
+    score: float
+    pickup_miles: float
+    delivery_miles: float
+    waiting_minutes: float
+
+    @property
+    def total_miles(self) -> float:
+        return self.pickup_miles + self.delivery_miles
+
+def order_created_at(order: dict) -> datetime:
+    """When an order was placed; orders from before created_at was stored fall back to their ObjectId"""
+    created_at = order.get("created_at")
+    if created_at is None:
+        created_at = order["_id"].generation_time.replace(tzinfo=None)
+    return created_at
+
+def rank_orders(
+    snapshot: CatalogSnapshot,
+    lat: float,
+    lon: float,
+    orders: Sequence[dict],
+    limit: int,
+    max_pickup_miles: Optional[float] = None,
+    now: Optional[datetime] = None
+) -> List[RankedOrder]:
+    """Best `limit` orders for a deliverer at (lat, lon), best first.
+
+    Orders at establishments that are no longer active are skipped. Only a
+    bounded heap of `limit` entries is kept rather than sorting every order.
+    """
+    table = establishment_table(snapshot)
+    orders = [order for order in orders if order["establishment_id"] in table.rows]
+    if not orders or limit <= 0:
+        return []
+    now = now or datetime.utcnow()
+
+    rows = np.fromiter((table.rows[order["establishment_id"]] for order in orders), dtype=np.intp, count=len(orders))
+    pickup = table.distances_from(lat, lon)[rows]
+    dropoffs = [(order["delivery_location"]["latitude"], order["delivery_location"]["longitude"]) for order in orders]
+    delivery = paired_distances(table.coordinates[rows], dropoffs)
+    points = np.fromiter((order["delivery_points"] for order in orders), dtype=np.float64, count=len(orders))
+    waiting = np.fromiter(
+        ((now - order_created_at(order)).total_seconds() / 60 for order in orders), dtype=np.float64, count=len(orders)
+    )
+    waiting = np.clip(waiting, 0.0, None)
+    scores = points * POINT_WEIGHT + np.minimum(waiting, MAX_WAIT_MINUTES) * WAIT_WEIGHT - (pickup + delivery) * MILE_WEIGHT
+
+    candidates = range(len(orders))
+    if max_pickup_miles is not None:
+        candidates = np.flatnonzero(pickup <= max_pickup_miles)
+    best = heapq.nlargest(limit, candidates, key=scores.tolist().__getitem__)
+    return [
+        RankedOrder(
+            order_id=str(orders[i]["_id"]),
+            score=float(scores[i]),
+            pickup_miles=float(pickup[i]),
+            delivery_miles=float(delivery[i]),
+            waiting_minutes=float(waiting[i])
+        )
+        for i in best
+    ]
@@ -0,0 +1,54 @@
+from typing import NamedTuple, Sequence, Tuple
+import numpy as np
+
+EARTH_RADIUS_MILES = 3959
+
+Coordinates = Sequence[Tuple[float, float]]
+
+def _as_radians(points) -> np.ndarray:
+    """Convert a sequence of (lat, lon) pairs into an (N, 2) array of radians"""
+    array = np.asarray(points, dtype=np.float64)
+    if array.size == 0:
+        return np.empty((0, 2), dtype=np.float64)
+    return np.radians(array.reshape(-1, 2))
+
+def _haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Broadcasting haversine over radian arrays (in miles)"""
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def distances_from(lat: float, lon: float, points: Coordinates) -> np.ndarray:
+    """Distances in miles from one origin to every point"""
+    dest = _as_radians(points)
+    return _haversine(np.radians(lat), np.radians(lon), dest[:, 0], dest[:, 1])
+
+def paired_distances(origins: Coordinates, destinations: Coordinates) -> np.ndarray:
+    """Distances in miles between origins[i] and destinations[i]"""
+    orig = _as_radians(origins)
+    dest = _as_radians(destinations)
+    if len(orig) != len(dest):
+        raise ValueError("origins and destinations must have the same length")
+    return _haversine(orig[:, 0], orig[:, 1], dest[:, 0], dest[:, 1])
+
+def distance_matrix(origins: Coordinates, destinations: Coordinates) -> np.ndarray:
+    """(len(origins), len(destinations)) matrix of distances in miles"""
+    orig = _as_radians(origins)
+    dest = _as_radians(destinations)
+    return _haversine(
+        orig[:, 0][:, None], orig[:, 1][:, None],
+        dest[:, 0][None, :], dest[:, 1][None, :]
+    )
+
+class RouteMatrix(NamedTuple):
+    to_pickup: np.ndarray     # (deliverers, orders) deliverer -> pickup
+    delivery_leg: np.ndarray  # (orders,) pickup -> dropoff
+    total: np.ndarray         # (deliverers, orders) deliverer -> pickup -> dropoff
+
+def route_matrix(deliverers: Coordinates, pickups: Coordinates, dropoffs: Coordinates) -> RouteMatrix:
+    """Trip lengths in miles for every deliverer against every (pickup, dropoff) order"""
+    to_pickup = distance_matrix(deliverers, pickups)
+    delivery_leg = paired_distances(pickups, dropoffs)
+    return RouteMatrix(to_pickup, delivery_leg, to_pickup + delivery_leg[None, :])
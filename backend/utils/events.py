@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+import asyncio
+import json
+
+AVAILABLE_ORDERS_CHANNEL = "orders:available"
+
+def user_channel(user_id: str) -> str:
+    return f"user:{user_id}"
+
+class Subscription:
+    """A subscriber's bounded event queue; the oldest event is dropped when it overflows"""
+
+    def __init__(self, hub: "EventHub", channels: Set[str], maxsize: int):
+        self.hub = hub
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def deliver(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+class EventHub:
+    """In-process pub/sub fan-out of order lifecycle events to connected clients"""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        subscription = Subscription(self, set(channels), self.queue_size)
+        for channel in subscription.channels:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def publish(self, channels: Iterable[str], event: dict):
+        # A subscriber on several of the channels still gets the event once
+        targets = set()
+        for channel in channels:
+            targets.update(self._subscribers.get(channel, ()))
+        for subscription in targets:
+            subscription.deliver(event)
+        self.published += 1
+
+    @property
+    def connections(self) -> int:
+        return len({sub for subs in self._subscribers.values() for sub in subs})
+
+event_hub = EventHub()
+
+def publish_order_event(
+    event_type: str,
+    order_id: str,
+    status: str,
+    customer_id: str,
+    deliverer_id: Optional[str] = None,
+    broadcast: bool = False
+):
+    """Notify the customer, the deliverer and optionally everyone watching available orders"""
+    channels = [user_channel(customer_id)]
+    if deliverer_id:
+        channels.append(user_channel(deliverer_id))
+    if broadcast:
+        channels.append(AVAILABLE_ORDERS_CHANNEL)
+    event_hub.publish(channels, {
+        "type": event_type,
+        "order_id": str(order_id),
+        "status": status,
+        "customer_id": customer_id,
+        "deliverer_id": deliverer_id,
+        "at": datetime.utcnow().isoformat()
+    })
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
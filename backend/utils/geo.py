@@ -0,0 +1,131 @@
+from typing import Any, Callable, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+from utils.distance import EARTH_RADIUS_MILES, distances_from
+import heapq
+import math
+
+MILES_PER_DEGREE_LAT = 69.0
+
+T = TypeVar("T")
+
+def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calculate distance between two coordinates using Haversine formula (in miles)"""
+    R = EARTH_RADIUS_MILES
+
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+
+    return R * c
+
+class GeoIndex(Generic[T]):
+    """Uniform lat/lon grid answering radius and k-nearest queries.
+
+    Queries visit cells in rings around the origin and stop as soon as no
+    unvisited cell can hold a closer point, so cost tracks the size of the
+    answer rather than the size of the catalog.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[float, float, T]], cell_size: float = 0.01):
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, T]]] = {}
+        self._size = 0
+        for lat, lon, item in entries:
+            self._cells.setdefault(self._cell(lat, lon), []).append((lat, lon, item))
+            self._size += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def _ring(self, center: Tuple[int, int], ring: int):
+        row, col = center
+        if ring == 0:
+            yield center
+            return
+        for dc in range(-ring, ring + 1):
+            yield (row - ring, col + dc)
+            yield (row + ring, col + dc)
+        for dr in range(-ring + 1, ring):
+            yield (row + dr, col - ring)
+            yield (row + dr, col + ring)
+
+    def _ring_lower_bound(self, lat: float, ring: int) -> float:
+        """Minimum distance in miles from the origin to any point at or beyond `ring`"""
+        if ring <= 1:
+            return 0.0
+        # The origin can sit anywhere inside its own cell, so only ring - 1 cells are guaranteed
+        reach = (ring - 1) * self.cell_size
+        # Longitude degrees shrink towards the poles, so use the widest latitude reached
+        widest_lat = min(89.9, abs(lat) + reach)
+        return reach * MILES_PER_DEGREE_LAT * math.cos(math.radians(widest_lat))
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        limit: Optional[int] = None,
+        radius: Optional[float] = None,
+        predicate: Optional[Callable[[T], bool]] = None
+    ) -> List[Tuple[float, T]]:
+        """Return (distance_miles, item) pairs nearest first, bounded by limit and radius"""
+        if not self._size or limit == 0:
+            return []
+
+        center = self._cell(lat, lon)
+        # Max-heap of the best candidates so far: (-distance, tiebreak, item)
+        best: List[Tuple[float, int, Any]] = []
+        counter = 0
+
+        def consider(points):
+            nonlocal counter
+            if predicate is not None:
+                points = [point for point in points if predicate(point[2])]
+            if not points:
+                return
+            distances = distances_from(lat, lon, [(point_lat, point_lon) for point_lat, point_lon, _ in points])
+            for distance, (_, _, item) in zip(distances.tolist(), points):
+                if radius is not None and distance > radius:
+                    continue
+                counter += 1
+                entry = (-distance, counter, item)
+                if limit is None or len(best) < limit:
+                    heapq.heappush(best, entry)
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, entry)
+
+        ring = 0
+        seen = 0
+        while seen < self._size:
+            lower_bound = self._ring_lower_bound(lat, ring)
+            if radius is not None and lower_bound > radius:
+                break
+            if limit is not None and len(best) >= limit and -best[0][0] <= lower_bound:
+                break
+            if 8 * ring > len(self._cells):
+                # The ring now has more cells than are occupied: scan the rest directly
+                consider([
+                    point
+                    for cell, points in self._cells.items()
+                    if max(abs(cell[0] - center[0]), abs(cell[1] - center[1])) >= ring
+                    for point in points
+                ])
+                break
+            ring_points = [
+                point
+                for cell in self._ring(center, ring)
+                for point in self._cells.get(cell, ())
+            ]
+            seen += len(ring_points)
+            consider(ring_points)
+            ring += 1
+
+        return [(-neg_distance, item) for neg_distance, _, item in sorted(best, reverse=True)]
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict
+from fastapi import Request, Response, status
+import calendar
+import os
+
+# Catalog responses are the same for every user; set to e.g.
+# "public, max-age=60, stale-while-revalidate=300" when a CDN sits in front
+CATALOG_CACHE_CONTROL = os.environ.get("CATALOG_CACHE_CONTROL", "private, max-age=60")
+
+def http_date(moment: datetime) -> str:
+    """RFC 7231 date for a naive UTC datetime"""
+    return format_datetime(moment.replace(tzinfo=timezone.utc), usegmt=True)
+
+def not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Whether the client's copy is current; If-None-Match wins over If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return calendar.timegm(last_modified.timetuple()) <= since.timestamp()
+    return False
+
+def validator_headers(etag: str, last_modified: datetime, cache_control: str) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Cache-Control": cache_control
+    }
+
+def conditional_response(
+    request: Request,
+    etag: str,
+    last_modified: datetime,
+    render: Callable[[], Response],
+    cache_control: str = CATALOG_CACHE_CONTROL
+) -> Response:
+    """304 if the client already has this representation, otherwise render() with validators.
+
+    The check happens before render(), so a revalidation costs no serialization.
+    """
+    headers = validator_headers(etag, last_modified, cache_control)
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response = render()
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from bson import ObjectId
+from utils.blobstore import blob_store
+from utils.database import get_database
+from utils.jobs import job_queue
+from utils.log import get_logger
+import asyncio
+import io
+import multiprocessing
+import os
+
+logger = get_logger("images")
+
+IMAGE_MAX_DIMENSION = int(os.environ.get("IMAGE_MAX_DIMENSION", "1600"))
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "80"))
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", "320"))
+THUMBNAIL_QUALITY = 70
+
+# Refuse to decode anything larger than a ~50 MP photo (decompression bombs)
+MAX_SOURCE_PIXELS = 50_000_000
+
+IMAGE_JOB = "process_image"
+
+class UnprocessableImage(Exception):
+    """The upload cannot be decoded as an image; retrying would fail the same way"""
+
+def _encode_jpeg(image, max_dimension: int, quality: int) -> bytes:
+    copy = image.copy()
+    copy.thumbnail((max_dimension, max_dimension))
+    out = io.BytesIO()
+    # No exif/icc arguments: the output carries pixels only, so GPS tags and device info are dropped
+    copy.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+def process_image(data: bytes, max_dimension: int, quality: int, thumbnail_size: int) -> Tuple[bytes, bytes]:
+    """Re-encode a photo to a bounded JPEG without metadata, plus a thumbnail. Runs in a worker process."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            # Phones store rotation as an EXIF tag; bake it in before the tag is discarded
+            image = ImageOps.exif_transpose(source)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            return (
+                _encode_jpeg(image, max_dimension, quality),
+                _encode_jpeg(image, thumbnail_size, THUMBNAIL_QUALITY),
+            )
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise UnprocessableImage(str(e)) from None
+
+async def _read_blob(blob_id: str) -> Optional[bytes]:
+    info = await blob_store.info(blob_id)
+    if info is None:
+        return None
+    return b"".join([chunk async for chunk in blob_store.read_range(blob_id, 0, info.length - 1)])
+
+async def _single_chunk(data: bytes):
+    yield data
+
+class ImageProcessor:
+    """Re-encodes uploaded completion photos in a process pool after the upload has returned.
+
+    Work is queued as a job, so a photo uploaded just before a restart is still
+    processed. Until processing finishes (or if it fails) the raw upload keeps
+    being served, so a slow or broken photo never blocks the delivery flow.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+        self.running = 0
+        self.processed = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the parent runs an event loop and driver threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def submit(self, order_id: str, raw_blob_id: str):
+        """Schedule processing of an order's freshly uploaded photo"""
+        await job_queue.enqueue(
+            IMAGE_JOB, {"order_id": order_id, "raw_blob_id": raw_blob_id}, key=f"{IMAGE_JOB}:{order_id}:{raw_blob_id}"
+        )
+
+    async def handle_job(self, payload: dict):
+        self.running += 1
+        try:
+            await self._process(payload["order_id"], payload["raw_blob_id"])
+        except asyncio.CancelledError:
+            raise
+        except UnprocessableImage as e:
+            # Finish the job instead of retrying; the raw upload keeps being served
+            self.failed += 1
+            logger.warning("Completion image for order %s cannot be processed: %s", payload["order_id"], e)
+        except Exception as e:
+            self.failed += 1
+            logger.warning("Failed to process completion image for order %s: %s", payload["order_id"], e)
+            raise
+        finally:
+            self.running -= 1
+
+    async def _process(self, order_id: str, raw_blob_id: str):
+        # Idempotent: after the swap below a rerun finds the raw blob deleted, or no longer
+        # on the order (it can be shared by an identical photo), and changes nothing
+        raw = await _read_blob(raw_blob_id)
+        if raw is None:
+            return
+        loop = asyncio.get_running_loop()
+        full, thumbnail = await loop.run_in_executor(
+            self._get_executor(), process_image, raw, IMAGE_MAX_DIMENSION, IMAGE_QUALITY, THUMBNAIL_SIZE
+        )
+        metadata = {"order_id": order_id}
+        full_blob = await blob_store.save(_single_chunk(full), "image/jpeg", metadata)
+        thumbnail_blob = await blob_store.save(_single_chunk(thumbnail), "image/jpeg", metadata)
+
+        # Only swap if the order still points at this upload; a newer photo wins, and
+        # the upload route deletes whatever its replace overwrote, so nothing is orphaned
+        db = await get_database()
+        result = await db.orders.update_one(
+            {"_id": ObjectId(order_id), "completion_image_id": raw_blob_id},
+            {"$set": {
+                "completion_image_id": full_blob.id,
+                "completion_thumbnail_id": thumbnail_blob.id,
+                "completion_thumbnail_url": f"/api/orders/{order_id}/thumbnail"
+            }}
+        )
+        if result.matched_count == 0:
+            await blob_store.delete(full_blob.id)
+            await blob_store.delete(thumbnail_blob.id)
+            return
+        if full_blob.id != raw_blob_id:
+            await blob_store.delete(raw_blob_id)
+
+        self.processed += 1
+        self.bytes_in += len(raw)
+        self.bytes_out += len(full) + len(thumbnail)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "processed": self.processed,
+            "failed": self.failed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out
+        }
+
+    async def shutdown(self):
+        """Stop the pool; call after the job queue has stopped handing out photos"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+image_processor = ImageProcessor(
+    workers=int(os.environ.get("IMAGE_WORKERS", str(min(2, os.cpu_count() or 1))))
+)
+
+job_queue.register(IMAGE_JOB, image_processor.handle_job)
@@ -0,0 +1,134 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+from utils.database import get_database
+from utils.jobs import JOB_RETENTION_SECONDS
+from utils.log import get_logger
+
+logger = get_logger("indexes")
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """An index the application relies on, and the query it exists for"""
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    name: str
+    unique: bool = False
+    serves: str = ""
+    options: Dict = field(default_factory=dict)
+
+# Compound orders indexes follow equality -> sort -> range so each router
+# query can walk the index in sort order without an in-memory sort.
+INDEXES: List[IndexSpec] = [
+    IndexSpec("users", (("email", ASCENDING),), "users_email_unique", unique=True,
+              serves="auth lookups, register duplicate check"),
+    IndexSpec("users", (("username", ASCENDING),), "users_username_unique", unique=True,
+              serves="register duplicate check"),
+    IndexSpec("establishments", (("name", ASCENDING),), "establishments_name_unique", unique=True,
+              serves="catalog seed upserts"),
+    IndexSpec("orders", (("customer_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)),
+              "orders_customer_created", serves="GET /orders/my-orders"),
+    IndexSpec("orders", (("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)),
+              "orders_status_created", serves="GET /orders/available, GET /orders/dispatch"),
+    IndexSpec("orders", (("deliverer_id", ASCENDING), ("accepted_at", ASCENDING), ("_id", ASCENDING)),
+              "orders_deliverer_accepted", serves="GET /orders/delivering"),
+    IndexSpec("orders", (("bundle_id", ASCENDING), ("deliverer_id", ASCENDING)), "orders_bundle",
+              serves="PUT /orders/bundles/{bundle_id}/update-status",
+              options={"partialFilterExpression": {"bundle_id": {"$exists": True}}}),
+    IndexSpec("orders", (("completion_image_id", ASCENDING),), "orders_completion_image",
+              serves="local blob store reference check before deleting a photo",
+              options={"partialFilterExpression": {"completion_image_id": {"$type": "string"}}}),
+    IndexSpec("orders", (("completion_thumbnail_id", ASCENDING),), "orders_completion_thumbnail",
+              serves="local blob store reference check before deleting a thumbnail",
+              options={"partialFilterExpression": {"completion_thumbnail_id": {"$type": "string"}}}),
+    IndexSpec("orders", (("completed_at", ASCENDING),), "orders_awaiting_settlement",
+              serves="settlement sweep of completed orders not yet paid out",
+              options={"partialFilterExpression": {"awaiting_settlement": True}}),
+    IndexSpec("points_ledger", (("order_id", ASCENDING), ("reason", ASCENDING)), "ledger_order_reason_unique",
+              unique=True, serves="idempotent settlement",
+              options={"partialFilterExpression": {"order_id": {"$exists": True}}}),
+    IndexSpec("points_ledger", (("user_id", ASCENDING), ("created_at", ASCENDING)), "ledger_user_created",
+              serves="balance recomputation"),
+    IndexSpec("points_ledger", (("reason", ASCENDING), ("created_at", ASCENDING)), "ledger_reason_created",
+              serves="settlement sweep of order debits whose order was never created"),
+    IndexSpec("points_ledger", (("created_at", ASCENDING),), "ledger_unapplied",
+              serves="reconciliation of rows left unapplied by a crash",
+              options={"partialFilterExpression": {"applied": False}}),
+    IndexSpec("jobs", (("status", ASCENDING), ("run_at", ASCENDING)), "jobs_status_run_at",
+              serves="job claims, lease recovery, dead-letter view"),
+    IndexSpec("jobs", (("key", ASCENDING),), "jobs_key_unique", unique=True,
+              serves="at-most-once enqueue per side effect",
+              options={"partialFilterExpression": {"key": {"$exists": True}}}),
+    IndexSpec("jobs", (("finished_at", ASCENDING),), "jobs_finished_ttl",
+              serves="expiry of finished jobs",
+              options={"expireAfterSeconds": JOB_RETENTION_SECONDS}),
+]
+
+# Results of the last ensure_indexes run, keyed by index name
+last_sync: Dict[str, str] = {}
+
+def _collections() -> List[str]:
+    return sorted({spec.collection for spec in INDEXES})
+
+async def ensure_indexes() -> Dict[str, str]:
+    """Create every declared index; failures are recorded, not raised, so startup continues"""
+    db = await get_database()
+    results = {}
+    for spec in INDEXES:
+        try:
+            await db[spec.collection].create_index(
+                list(spec.keys), name=spec.name, unique=spec.unique, **spec.options
+            )
+            results[spec.name] = "ok"
+        except PyMongoError as e:
+            # e.g. duplicate existing emails prevent a unique index from building
+            results[spec.name] = f"error: {e}"
+            logger.error("Failed to create index %s.%s: %s", spec.collection, spec.name, e)
+    last_sync.clear()
+    last_sync.update(results)
+    return results
+
+async def _index_usage(collection) -> Optional[Dict[str, int]]:
+    """Operation counts per index since the server started, if $indexStats is available"""
+    try:
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+    except PyMongoError:
+        return None
+    return {stat["name"]: int(stat.get("accesses", {}).get("ops", 0)) for stat in stats}
+
+async def index_report() -> dict:
+    """Compare declared indexes with what exists on the server and how much each is used"""
+    db = await get_database()
+    report = {}
+    for name in _collections():
+        collection = db[name]
+        declared = {spec.name: spec for spec in INDEXES if spec.collection == name}
+        existing = {}
+        async for index in collection.list_indexes():
+            # Directions are numeric except for special indexes such as "text" or "2dsphere"
+            existing[index["name"]] = tuple(
+                (key, direction if isinstance(direction, str) else int(direction))
+                for key, direction in index["key"].items()
+            )
+        usage = await _index_usage(collection)
+
+        mismatched = [
+            index_name for index_name, spec in declared.items()
+            if index_name in existing and existing[index_name] != spec.keys
+        ]
+        report[name] = {
+            "missing": sorted(set(declared) - set(existing)),
+            "undeclared": sorted(set(existing) - set(declared) - {"_id_"}),
+            "mismatched": sorted(mismatched),
+            "unused": sorted(
+                index_name for index_name, ops in usage.items()
+                if ops == 0 and index_name != "_id_"
+            ) if usage is not None else None,
+            "usage": usage,
+            "declared": {
+                index_name: {"keys": list(spec.keys), "unique": spec.unique, "serves": spec.serves}
+                for index_name, spec in declared.items()
+            },
+        }
+    return {"collections": report, "last_sync": dict(last_sync)}
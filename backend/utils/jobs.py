@@ -0,0 +1,296 @@
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import os
+import random
+import socket
+import time
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from utils.database import get_database
+from utils.log import get_logger
+from utils.metrics import job_metrics
+
+logger = get_logger("jobs")
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))  # 0 = enqueue only; another instance runs them
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "2"))
+# A running job whose worker has not finished within the lease is assumed lost and run again
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "8"))
+JOB_BACKOFF_SECONDS = float(os.environ.get("JOB_BACKOFF_SECONDS", "1"))
+JOB_MAX_BACKOFF_SECONDS = float(os.environ.get("JOB_MAX_BACKOFF_SECONDS", "300"))
+# Finished jobs are removed by a TTL index after this long; dead jobs are kept until retried
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+MAX_ERROR_LENGTH = 500
+
+Handler = Callable[[dict], Awaitable[None]]
+Sweep = Callable[[], Awaitable[int]]
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential delay before retry number `attempts`, with jitter so failures do not retry in lockstep"""
+    delay = min(JOB_BACKOFF_SECONDS * 2 ** (attempts - 1), JOB_MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+class JobQueue:
+    """Durable work queue in the `jobs` collection, run by worker coroutines in this process.
+
+    A job is claimed with one atomic find_one_and_update, so any number of
+    workers and instances can share the collection. Handlers must be
+    idempotent: a job whose worker dies mid-run is retried once its lease
+    expires. Failures back off exponentially until max_attempts, after which
+    the job is parked as dead for an admin to inspect and retry.
+    """
+
+    def __init__(self, workers: int, poll_interval: float, lease_seconds: float, max_attempts: int):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers: Dict[str, Handler] = {}
+        self._sweeps: List[Sweep] = []
+        self._tasks: Set[asyncio.Task] = set()
+        self._maintenance: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.running = 0
+        self.enqueued = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.dead = 0
+        self.recovered = 0
+
+    def register(self, kind: str, handler: Handler):
+        self._handlers[kind] = handler
+
+    def register_sweep(self, sweep: Sweep):
+        """Run `sweep` periodically to re-enqueue work whose enqueue was lost in a crash"""
+        self._sweeps.append(sweep)
+
+    async def enqueue(self, kind: str, payload: dict, key: Optional[str] = None, delay: float = 0) -> str:
+        """Persist a job and return its id; a job with the same `key` is only ever enqueued once"""
+        now = datetime.utcnow()
+        doc = {
+            "kind": kind,
+            "payload": payload,
+            "status": QUEUED,
+            "attempts": 0,
+            "run_at": now + timedelta(seconds=delay),
+            "created_at": now
+        }
+        if key is not None:
+            doc["key"] = key
+        db = await get_database()
+        try:
+            result = await db.jobs.insert_one(doc)
+        except DuplicateKeyError:
+            existing = await db.jobs.find_one({"key": key}, {"_id": 1})
+            return str(existing["_id"]) if existing else ""
+        self.enqueued += 1
+        if delay <= 0:
+            self._wakeup.set()
+        return str(result.inserted_id)
+
+    async def start(self):
+        self._stopping = False
+        if self.workers <= 0:
+            return
+        await self._maintain()
+        for number in range(self.workers):
+            task = asyncio.create_task(self._work(), name=f"job-worker-{number}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self._maintenance = asyncio.create_task(self._maintenance_loop(), name="job-maintenance")
+
+    async def _work(self):
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Failed to claim a job: %s", e)
+                job = None
+            if job is None:
+                await self._idle()
+                continue
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Recording the outcome failed; the lease expiry runs the job again
+                logger.warning("Failed to record the outcome of job %s: %s", job["_id"], e)
+
+    async def _idle(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        db = await get_database()
+        return await db.jobs.find_one_and_update(
+            {"status": QUEUED, "run_at": {"$lte": now}, "kind": {"$in": list(self._handlers)}},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "worker": self.worker_id,
+                    "started_at": now,
+                    "locked_until": now + timedelta(seconds=self.lease_seconds)
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run(self, job: dict):
+        kind = job["kind"]
+        start = time.perf_counter()
+        self.running += 1
+        try:
+            await self._handlers[kind](job["payload"])
+        except asyncio.CancelledError:
+            # Shutting down: leave it running; the lease expiry hands it to the next worker
+            raise
+        except Exception as e:
+            await self._fail(job, e, time.perf_counter() - start)
+            return
+        finally:
+            self.running -= 1
+
+        db = await get_database()
+        now = datetime.utcnow()
+        await db.jobs.update_one(
+            {"_id": job["_id"], "status": RUNNING, "worker": self.worker_id},
+            {"$set": {"status": DONE, "finished_at": now}, "$unset": {"locked_until": "", "worker": ""}}
+        )
+        self.succeeded += 1
+        job_metrics.record(kind, DONE, time.perf_counter() - start)
+
+    async def _fail(self, job: dict, error: Exception, seconds: float):
+        kind = job["kind"]
+        message = (str(error) or type(error).__name__)[:MAX_ERROR_LENGTH]
+        now = datetime.utcnow()
+        update = {"last_error": message}
+        if job["attempts"] >= self.max_attempts:
+            update.update(status=DEAD, failed_at=now)
+            self.dead += 1
+            outcome = DEAD
+            logger.error("Job %s (%s) failed %s times, giving up: %s", job["_id"], kind, job["attempts"], message)
+        else:
+            update.update(status=QUEUED, run_at=now + timedelta(seconds=backoff_seconds(job["attempts"])))
+            self.retried += 1
+            outcome = "retry"
+            logger.warning("Job %s (%s) failed on attempt %s, retrying: %s", job["_id"], kind, job["attempts"], message)
+        db = await get_database()
+        await db.jobs.update_one(
+            {"_id": job["_id"], "status": RUNNING, "worker": self.worker_id},
+            {"$set": update, "$unset": {"locked_until": "", "worker": ""}}
+        )
+        job_metrics.record(kind, outcome, seconds)
+
+    async def _maintenance_loop(self):
+        while not self._stopping:
+            await asyncio.sleep(max(self.poll_interval, self.lease_seconds / 2))
+            await self._maintain()
+
+    async def _maintain(self):
+        """Requeue jobs whose lease ran out, then let each sweep re-enqueue anything missing"""
+        try:
+            self.recovered += await self.requeue_expired()
+        except Exception as e:
+            logger.warning("Failed to requeue expired jobs: %s", e)
+        for sweep in self._sweeps:
+            try:
+                await sweep()
+            except Exception as e:
+                logger.warning("Job sweep %s failed: %s", getattr(sweep, "__name__", sweep), e)
+
+    async def requeue_expired(self) -> int:
+        now = datetime.utcnow()
+        db = await get_database()
+        expired = {"status": RUNNING, "locked_until": {"$lt": now}}
+        # A job that keeps killing its worker must not be retried forever
+        await db.jobs.update_many(
+            {**expired, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": DEAD, "failed_at": now, "last_error": "lease expired"},
+             "$unset": {"locked_until": "", "worker": ""}}
+        )
+        result = await db.jobs.update_many(
+            expired,
+            {"$set": {"status": QUEUED, "run_at": now}, "$unset": {"locked_until": "", "worker": ""}}
+        )
+        if result.modified_count:
+            self._wakeup.set()
+        return result.modified_count
+
+    async def retry(self, job_id: str) -> bool:
+        """Put a dead job back on the queue with a fresh attempt budget"""
+        db = await get_database()
+        result = await db.jobs.update_one(
+            {"_id": ObjectId(job_id), "status": DEAD},
+            {"$set": {"status": QUEUED, "attempts": 0, "run_at": datetime.utcnow()}, "$unset": {"failed_at": ""}}
+        )
+        if result.modified_count:
+            self._wakeup.set()
+        return result.modified_count == 1
+
+    async def dead_jobs(self, limit: int, kind: Optional[str] = None) -> List[dict]:
+        """Most recently failed dead jobs first"""
+        query = {"status": DEAD}
+        if kind is not None:
+            query["kind"] = kind
+        db = await get_database()
+        return await db.jobs.find(query).sort("run_at", -1).limit(limit).to_list(length=limit)
+
+    async def counts(self) -> Dict[str, int]:
+        db = await get_database()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, DEAD: 0}
+        async for row in db.jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "worker_id": self.worker_id,
+            "kinds": sorted(self._handlers),
+            "running": self.running,
+            "enqueued": self.enqueued,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "dead": self.dead,
+            "recovered": self.recovered
+        }
+
+    async def shutdown(self, timeout: float = 10.0):
+        """Stop claiming, give running handlers a chance to finish, then cancel the rest"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            self._maintenance = None
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+            for task in list(self._tasks):
+                task.cancel()
+
+job_queue = JobQueue(
+    workers=JOB_WORKERS,
+    poll_interval=JOB_POLL_SECONDS,
+    lease_seconds=JOB_LEASE_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS
+)
@@ -0,0 +1,279 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Set, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from utils.database import get_database
+from utils.log import get_logger
+import asyncio
+
+logger = get_logger("ledger")
+
+# Ledger entry reasons
+SIGNUP_GRANT = "signup_grant"
+ORDER_DEBIT = "order_debit"
+ORDER_REFUND = "order_refund"
+DELIVERY_CREDIT = "delivery_credit"
+
+DUPLICATE_KEY = 11000
+
+# Ids of the ledger rows most recently applied to a user's balance. The balance
+# update is guarded on this list, so re-applying a row after a crash cannot count it
+# twice; it only needs to cover rows whose application might still be retried.
+APPLIED_FIELD = "applied_ledger"
+APPLIED_WINDOW = 100
+
+# Times recompute_balance re-reads the ledger when the balance moves underneath it
+RECOMPUTE_ATTEMPTS = 5
+
+@dataclass(frozen=True)
+class LedgerEntry:
+    user_id: str
+    delta: int
+    reason: str
+    order_id: Optional[str] = None
+
+    def to_document(self, applied: bool = False) -> dict:
+        """A new ledger row; rows start unapplied and are flipped once the balance has moved"""
+        doc = {
+            "_id": ObjectId(),
+            "user_id": self.user_id,
+            "delta": self.delta,
+            "reason": self.reason,
+            "applied": applied,
+            "created_at": datetime.utcnow()
+        }
+        if self.order_id is not None:
+            doc["order_id"] = self.order_id
+        return doc
+
+def _apply(user_id: str, row_id: ObjectId, delta: int, condition: Optional[dict] = None) -> Tuple[dict, dict]:
+    """(filter, update) moving a balance by one ledger row, unless that row was already applied"""
+    return (
+        {"_id": ObjectId(user_id), APPLIED_FIELD: {"$ne": row_id}, **(condition or {})},
+        {
+            "$inc": {"points": delta},
+            "$push": {APPLIED_FIELD: {"$each": [row_id], "$slice": -APPLIED_WINDOW}}
+        }
+    )
+
+async def record_grant(user_id: str, amount: int):
+    """Record the opening balance a new user starts with"""
+    db = await get_database()
+    # The user document was created with this balance, so the row is applied from the start
+    await db.points_ledger.insert_one(LedgerEntry(user_id, amount, SIGNUP_GRANT).to_document(applied=True))
+
+async def debit(user_id: str, amount: int, order_id: str) -> bool:
+    """Take `amount` points from a user if, and only if, they have that many.
+
+    The ledger row is written first, then the balance is moved. The balance
+    check is part of that update's filter, so concurrent orders cannot
+    overdraw a stale balance. Returns False when points are short.
+    """
+    if amount <= 0:
+        raise ValueError("Debit amount must be positive")
+    db = await get_database()
+    row = LedgerEntry(user_id, -amount, ORDER_DEBIT, order_id).to_document()
+    await db.points_ledger.insert_one(row)
+
+    result = await db.users.update_one(*_apply(user_id, row["_id"], -amount, {"points": {"$gte": amount}}))
+    if result.modified_count == 0:
+        # Never took effect, so it is not part of the history
+        await db.points_ledger.delete_one({"_id": row["_id"]})
+        return False
+    await db.points_ledger.update_one({"_id": row["_id"]}, {"$set": {"applied": True}})
+    return True
+
+async def _apply_rows(rows: List[dict]):
+    """Move balances for unapplied rows, then mark them applied; safe to repeat"""
+    if not rows:
+        return
+    db = await get_database()
+    await db.users.bulk_write([UpdateOne(*_apply(row["user_id"], row["_id"], row["delta"])) for row in rows], ordered=False)
+    await db.points_ledger.update_many({"_id": {"$in": [row["_id"] for row in rows]}}, {"$set": {"applied": True}})
+
+async def settle(entries: List[LedgerEntry]) -> List[LedgerEntry]:
+    """Apply credits in a few round trips however many there are; returns the entries applied.
+
+    Ledger rows are written first, unapplied, and are unique per
+    (order_id, reason). A retried entry finds its row already there: if that
+    row was applied it is skipped, otherwise the earlier attempt stopped
+    short and this one finishes it. The balance update is guarded per row,
+    so finishing never pays twice.
+    """
+    if not entries:
+        return []
+    db = await get_database()
+
+    docs = [entry.to_document() for entry in entries]
+    duplicates = set()
+    try:
+        await db.points_ledger.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") != DUPLICATE_KEY:
+                raise
+            duplicates.add(error["index"])
+
+    rows: List[Optional[dict]] = list(docs)
+    if duplicates:
+        existing = await db.points_ledger.find(
+            {"$or": [{"order_id": entries[index].order_id, "reason": entries[index].reason} for index in duplicates]}
+        ).to_list(length=None)
+        by_key = {(row["order_id"], row["reason"]): row for row in existing}
+        for index in duplicates:
+            row = by_key.get((entries[index].order_id, entries[index].reason))
+            # Rows from before the applied flag existed were applied when written
+            rows[index] = row if row is not None and row.get("applied") is False else None
+
+    pending = [(entry, row) for entry, row in zip(entries, rows) if row is not None]
+    await _apply_rows([row for _, row in pending])
+    return [entry for entry, _ in pending]
+
+async def refund(user_id: str, amount: int, order_id: str):
+    """Return points taken by a debit whose order could not be created"""
+    await settle([LedgerEntry(user_id, amount, ORDER_REFUND, order_id)])
+
+class SettlementBatcher:
+    """Coalesces credits issued close together into a single settle() call.
+
+    Each caller still awaits its own credit; under load many completions share
+    one pair of bulk writes instead of one write each.
+    """
+
+    def __init__(self, max_batch: int = 100, max_delay: float = 0.01):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[LedgerEntry, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # Running flushes; the loop only keeps weak references to tasks
+        self._flushes: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.settled = 0
+
+    async def submit(self, entry: LedgerEntry) -> bool:
+        """Queue a credit and wait for it to settle; False if it was already settled before"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((entry, future))
+        if len(self._pending) >= self.max_batch:
+            self._schedule_flush(loop, 0)
+        elif self._flush_handle is None:
+            self._schedule_flush(loop, self.max_delay)
+        return await future
+
+    def _schedule_flush(self, loop, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        task = asyncio.create_task(self._flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task):
+        self._flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Settlement flush failed: %s", task.exception())
+
+    async def _flush(self):
+        self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            applied = await settle([entry for entry, _ in batch])
+        except Exception as e:
+            logger.warning("Settling a batch of %s credits failed: %s", len(batch), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        applied_ids = {id(entry) for entry in applied}
+        for entry, future in batch:
+            if not future.done():
+                future.set_result(id(entry) in applied_ids)
+        self.batches += 1
+        self.settled += len(applied)
+
+async def credit_delivery(user_id: str, amount: int, order_id: str) -> bool:
+    """Pay a deliverer for a completed order via the settlement batcher"""
+    return await settlement_batcher.submit(LedgerEntry(user_id, amount, DELIVERY_CREDIT, order_id))
+
+async def ledger_balance(user_id: str, landed: Sequence[ObjectId] = ()) -> Tuple[int, int]:
+    """(sum of ledger deltas, number of entries) for a user.
+
+    `landed` are rows already in the user's balance that may not be flagged
+    applied yet, as listed in the user's applied_ledger.
+    """
+    db = await get_database()
+    applied = {"applied": {"$ne": False}}
+    if landed:
+        applied = {"$or": [applied, {"_id": {"$in": list(landed)}}]}
+    totals = await db.points_ledger.aggregate([
+        {"$match": {"user_id": user_id, **applied}},
+        {"$group": {"_id": None, "total": {"$sum": "$delta"}, "entries": {"$sum": 1}}}
+    ]).to_list(length=1)
+    if not totals:
+        return 0, 0
+    return int(totals[0]["total"]), int(totals[0]["entries"])
+
+async def has_opening_balance(user_id: str) -> bool:
+    db = await get_database()
+    return await db.points_ledger.find_one({"user_id": user_id, "reason": SIGNUP_GRANT}) is not None
+
+async def reconcile_unapplied(user_id: Optional[str] = None, older_than: float = 60) -> int:
+    """Finish or discard ledger rows left unapplied by a crash; returns how many were resolved.
+
+    A row whose balance update landed is just marked applied. Otherwise a
+    credit is applied now, and a debit is dropped: its order was never
+    created, because that only happens after the debit succeeds.
+    """
+    db = await get_database()
+    query = {"applied": False, "created_at": {"$lt": datetime.utcnow() - timedelta(seconds=older_than)}}
+    if user_id is not None:
+        query["user_id"] = user_id
+    rows = await db.points_ledger.find(query).to_list(length=None)
+    if not rows:
+        return 0
+
+    users = await db.users.find(
+        {"_id": {"$in": list({ObjectId(row["user_id"]) for row in rows})}}, {APPLIED_FIELD: 1}
+    ).to_list(length=None)
+    landed = {row_id for user in users for row_id in user.get(APPLIED_FIELD, [])}
+
+    done = [row["_id"] for row in rows if row["_id"] in landed]
+    if done:
+        await db.points_ledger.update_many({"_id": {"$in": done}}, {"$set": {"applied": True}})
+    stale_debits = [row["_id"] for row in rows if row["_id"] not in landed and row["delta"] < 0]
+    if stale_debits:
+        await db.points_ledger.delete_many({"_id": {"$in": stale_debits}, "applied": False})
+    await _apply_rows([row for row in rows if row["_id"] not in landed and row["delta"] >= 0])
+    return len(rows)
+
+async def recompute_balance(user_id: str) -> Optional[int]:
+    """Reset a user's stored points to the ledger total and return it.
+
+    Every balance change pushes its row onto applied_ledger, so the write is
+    guarded on the list read before summing: a change landing in between makes
+    it miss, and the sum is taken again. None if the balance kept changing.
+    """
+    await reconcile_unapplied(user_id)
+    db = await get_database()
+    for _ in range(RECOMPUTE_ATTEMPTS):
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, {APPLIED_FIELD: 1})
+        if user is None:
+            return None
+        landed = user.get(APPLIED_FIELD)
+        total, _ = await ledger_balance(user_id, landed or ())
+        result = await db.users.update_one(
+            {"_id": ObjectId(user_id), APPLIED_FIELD: landed if landed is not None else {"$exists": False}},
+            {"$set": {"points": total}}
+        )
+        if result.matched_count:
+            return total
+    return None
+
+settlement_batcher = SettlementBatcher()
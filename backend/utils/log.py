@@ -0,0 +1,36 @@
+import logging
+import os
+import random
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Fraction of DEBUG records that are emitted, so debug logging can stay on under load
+DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+class DebugSampler(logging.Filter):
+    """Drops all but `rate` of DEBUG records; INFO and above always pass"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+_root = logging.getLogger("owlhacks")
+
+def _configure():
+    if _root.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(DebugSampler(DEBUG_SAMPLE_RATE))
+    _root.addHandler(handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the app namespace; pass arguments lazily (logger.debug("x %s", y)) so disabled levels cost nothing"""
+    _configure()
+    return _root.getChild(name)
@@ -0,0 +1,295 @@
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+from pymongo import monitoring
+import threading
+import time
+
+# Seconds; covers a cached auth hit through a slow bcrypt login or image upload
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label used for requests that matched no route, so scanners cannot blow up cardinality
+UNMATCHED_ROUTE = "unmatched"
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterable[Tuple[str, int]]:
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            yield repr(bound), running
+        yield "+Inf", running + self.counts[-1]
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def _render_histograms(name: str, help_text: str, histograms: Dict[tuple, Histogram], label_names: Tuple[str, ...]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, histogram in sorted(histograms.items()):
+        labels = dict(zip(label_names, key))
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+    return lines
+
+def _render_counter(name: str, help_text: str, counts: Dict[tuple, int], label_names: Tuple[str, ...]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    for key, count in sorted(counts.items()):
+        lines.append(f"{name}{_labels(**dict(zip(label_names, key)))} {count}")
+    return lines
+
+class HttpMetrics:
+    """Per-route request latency, status codes and in-flight requests.
+
+    Only touched from the event loop, so it needs no locking.
+    """
+
+    def __init__(self):
+        self.latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.responses: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status_code: int, seconds: float):
+        self.latency[(method, route)].observe(seconds)
+        self.responses[(method, route, str(status_code))] += 1
+
+    def render(self) -> List[str]:
+        lines = _render_histograms(
+            "http_request_duration_seconds", "Time from request start to the last response byte",
+            self.latency, ("method", "route")
+        )
+        lines += _render_counter(
+            "http_responses_total", "Responses by route and status code",
+            self.responses, ("method", "route", "status")
+        )
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being handled",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+        ]
+        return lines
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """PyMongo command listener timing every command per collection.
+
+    Driver callbacks arrive on Motor's worker threads, hence the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collections: Dict[Tuple[int, int], str] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.failures: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    @staticmethod
+    def _collection_of(event: monitoring.CommandStartedEvent) -> str:
+        target = event.command.get(event.command_name)
+        return target if isinstance(target, str) else event.database_name
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        with self._lock:
+            self._collections[(event.request_id, event.operation_id)] = self._collection_of(event)
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            collection = self._collections.pop((event.request_id, event.operation_id), "unknown")
+            key = (collection, event.command_name)
+            self.latency[key].observe(event.duration_micros / 1e6)
+            if failed:
+                self.failures[key] += 1
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, failed=True)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            lines = _render_histograms(
+                "mongodb_command_duration_seconds", "Driver-measured MongoDB command round trips",
+                self.latency, ("collection", "command")
+            )
+            lines += _render_counter(
+                "mongodb_command_failures_total", "MongoDB commands that returned an error",
+                self.failures, ("collection", "command")
+            )
+        return lines
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool (CMAP) listener: open, checked-out and waiting connections per server.
+
+    Lets "MongoDB is slow" (command latency) be told apart from "we are
+    starved for connections" (requests queued for a checkout).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools: Dict[str, Dict[str, int]] = {}
+
+    def _pool(self, address) -> Dict[str, int]:
+        key = f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+        if key not in self.pools:
+            self.pools[key] = {
+                "open": 0, "checked_out": 0, "waiting": 0, "max_waiting": 0,
+                "created": 0, "closed": 0, "checkouts": 0, "checkout_failures": 0, "cleared": 0
+            }
+        return self.pools[key]
+
+    def _update(self, address, **deltas):
+        with self._lock:
+            pool = self._pool(address)
+            for name, delta in deltas.items():
+                pool[name] += delta
+            pool["max_waiting"] = max(pool["max_waiting"], pool["waiting"])
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        self._update(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, waiting=-1, checked_out=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, checked_out=-1)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self.pools.items()}
+
+    def render(self) -> List[str]:
+        pools = self.stats()
+        lines = []
+        for name, field, kind, help_text in (
+            ("mongodb_pool_connections", "open", "gauge", "Open connections in the pool"),
+            ("mongodb_pool_checked_out", "checked_out", "gauge", "Connections currently lent to operations"),
+            ("mongodb_pool_wait_queue", "waiting", "gauge", "Operations waiting for a connection"),
+            ("mongodb_pool_checkout_failures_total", "checkout_failures", "counter", "Checkouts that timed out or failed"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_labels(server=address)} {pool[field]}" for address, pool in sorted(pools.items())]
+        return lines
+
+class CompressionMetrics:
+    """Responses and bytes before and after compression, by encoding"""
+
+    def __init__(self):
+        self.responses: Dict[str, int] = defaultdict(int)
+        self.bytes_in: Dict[str, int] = defaultdict(int)
+        self.bytes_out: Dict[str, int] = defaultdict(int)
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int):
+        self.responses[encoding] += 1
+        self.bytes_in[encoding] += bytes_in
+        self.bytes_out[encoding] += bytes_out
+
+    def render(self) -> List[str]:
+        lines = []
+        for name, counts, help_text in (
+            ("http_compressed_responses_total", self.responses, "Responses sent compressed"),
+            ("http_compression_bytes_in_total", self.bytes_in, "Response body bytes before compression"),
+            ("http_compression_bytes_out_total", self.bytes_out, "Response body bytes after compression"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f"{name}{_labels(encoding=encoding)} {count}" for encoding, count in sorted(counts.items())]
+        return lines
+
+class JobMetrics:
+    """Background job runs by kind and outcome, and how long each took"""
+
+    def __init__(self):
+        self.latency: Dict[Tuple[str], Histogram] = defaultdict(Histogram)
+        self.outcomes: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def record(self, kind: str, outcome: str, seconds: float):
+        self.latency[(kind,)].observe(seconds)
+        self.outcomes[(kind, outcome)] += 1
+
+    def render(self) -> List[str]:
+        lines = _render_histograms(
+            "job_duration_seconds", "Time spent running a background job handler",
+            self.latency, ("kind",)
+        )
+        lines += _render_counter(
+            "jobs_total", "Background job runs by outcome (done, retry, dead)",
+            self.outcomes, ("kind", "outcome")
+        )
+        return lines
+
+http_metrics = HttpMetrics()
+mongo_command_metrics = MongoCommandMetrics()
+pool_metrics = PoolMetrics()
+compression_metrics = CompressionMetrics()
+job_metrics = JobMetrics()
+
+class MetricsMiddleware:
+    """ASGI middleware feeding http_metrics; plain ASGI so streamed responses pass through untouched"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_metrics.in_flight -= 1
+            # The router stores the matched route in the scope; use its template, not the raw path
+            route = scope.get("route")
+            route_path = getattr(route, "path_format", None) or getattr(route, "path", None) or UNMATCHED_ROUTE
+            http_metrics.observe(scope["method"], route_path, status_code, time.perf_counter() - start)
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return "\n".join(http_metrics.render() + mongo_command_metrics.render() + pool_metrics.render() + compression_metrics.render() + job_metrics.render()) + "\n"
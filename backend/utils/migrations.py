@@ -0,0 +1,98 @@
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Tuple
+import base64
+import binascii
+from pymongo import UpdateOne
+from pymongo.errors import ConnectionFailure
+from utils.blobstore import blob_store
+from utils.database import get_database
+from utils.log import get_logger
+
+logger = get_logger("migrations")
+
+class MigrationError(Exception):
+    """A migration failed for a reason other than losing the connection"""
+
+async def backfill_completion_image_flag(db) -> int:
+    """Orders photographed before has_completion_image existed carry only the inline image"""
+    result = await db.orders.update_many(
+        {"has_completion_image": {"$exists": False}, "completion_image_url": {"$nin": [None, ""]}},
+        {"$set": {"has_completion_image": True}}
+    )
+    return result.modified_count
+
+async def backfill_order_created_at(db) -> int:
+    """Orders placed before created_at was stored take it from their ObjectId, so time-ordered queries see them"""
+    updates = [
+        UpdateOne({"_id": order["_id"]}, {"$set": {"created_at": order["_id"].generation_time.replace(tzinfo=None)}})
+        async for order in db.orders.find({"created_at": None}, {"_id": 1})
+    ]
+    if not updates:
+        return 0
+    result = await db.orders.bulk_write(updates, ordered=False)
+    return result.modified_count
+
+async def _single_chunk(data: bytes):
+    yield data
+
+async def move_inline_images(db) -> int:
+    """Move photos stored inline as data: URLs into the blob store, so the image route serves them.
+
+    Anything else in completion_image_url was set by a client and is dropped;
+    the frontend only ever loads photos from the order's own image route.
+    """
+    moved = 0
+    async for order in db.orders.find(
+        {"completion_image_url": {"$regex": "^data:"}, "completion_image_id": {"$exists": False}},
+        {"completion_image_url": 1}
+    ):
+        header, _, payload = order["completion_image_url"].partition(",")
+        content_type = header[len("data:"):].split(";")[0] or "application/octet-stream"
+        try:
+            data = base64.b64decode(payload, validate=True) if header.endswith(";base64") else None
+        except (binascii.Error, ValueError):
+            data = None
+        update = {"completion_image_url": None, "has_completion_image": False}
+        if data and content_type.startswith("image/"):
+            blob = await blob_store.save(_single_chunk(data), content_type, {"order_id": str(order["_id"])})
+            update = {
+                "completion_image_id": blob.id,
+                "completion_image_url": f"/api/orders/{order['_id']}/image",
+                "has_completion_image": True
+            }
+            moved += 1
+        await db.orders.update_one({"_id": order["_id"]}, {"$set": update})
+
+    await db.orders.update_many(
+        {"completion_image_url": {"$nin": [None, ""]}, "completion_image_id": {"$exists": False}},
+        {"$set": {"completion_image_url": None, "has_completion_image": False}}
+    )
+    return moved
+
+# Applied in order, each at most once per database; append, never reorder
+MIGRATIONS: List[Tuple[str, Callable[..., Awaitable[int]]]] = [
+    ("orders_has_completion_image", backfill_completion_image_flag),
+    ("orders_inline_images_to_blob_store", move_inline_images),
+    ("orders_created_at", backfill_order_created_at),
+]
+
+async def run_migrations() -> Dict[str, int]:
+    """Apply data migrations this database has not seen yet; returns documents changed per migration"""
+    db = await get_database()
+    applied = {doc["_id"] async for doc in db.migrations.find({}, {"_id": 1})}
+    results = {}
+    for name, migrate in MIGRATIONS:
+        if name in applied:
+            continue
+        try:
+            changed = await migrate(db)
+        except ConnectionFailure:
+            raise
+        except Exception as e:
+            raise MigrationError(f"migration {name} failed: {str(e) or type(e).__name__}") from e
+        await db.migrations.update_one(
+            {"_id": name}, {"$set": {"applied_at": datetime.utcnow(), "changed": changed}}, upsert=True
+        )
+        logger.info("Applied migration %s (%s documents changed)", name, changed)
+        results[name] = changed
+    return results
@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, status
+from bson import ObjectId
+from bson.errors import InvalidId
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Response header carrying the cursor for the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(value: Optional[datetime], doc_id: ObjectId) -> str:
+    """Opaque cursor pointing just after (value, _id) in a keyset ordering"""
+    payload = {"v": value.isoformat() if value is not None else None, "id": str(doc_id)}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = datetime.fromisoformat(payload["v"]) if payload["v"] is not None else None
+        return value, ObjectId(payload["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def keyset_filter(field: str, direction: int, cursor: Optional[str]) -> dict:
+    """Filter selecting documents after the cursor when sorted by (field, _id) in `direction`.
+
+    Documents missing `field` sort as null: first when ascending, last when
+    descending, matching MongoDB's own ordering.
+    """
+    if not cursor:
+        return {}
+    value, doc_id = decode_cursor(cursor)
+    id_op = "$gt" if direction > 0 else "$lt"
+
+    if value is None:
+        same_key = {field: None, "_id": {id_op: doc_id}}
+        if direction > 0:
+            return {"$or": [same_key, {field: {"$ne": None}}]}
+        return same_key
+
+    value_op = "$gt" if direction > 0 else "$lt"
+    clauses = [{field: {value_op: value}}, {field: value, "_id": {id_op: doc_id}}]
+    if direction < 0:
+        clauses.append({field: None})
+    return {"$or": clauses}
+
+def keyset_sort(field: str, direction: int) -> List[Tuple[str, int]]:
+    return [(field, direction), ("_id", direction)]
+
+def page_cursor(docs: List[dict], field: str, limit: int) -> Optional[str]:
+    """Cursor for the page after `docs`, which were fetched with limit + 1"""
+    if len(docs) <= limit:
+        return None
+    last = docs[limit - 1]
+    return encode_cursor(last.get(field), last["_id"])
@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+import math
+import os
+import time
+from fastapi import HTTPException, status
+from models.schemas import Establishment, Location, OrderItem
+from utils.catalog import CatalogSnapshot
+from utils.dispatch import establishment_table
+from utils.distance import distances_from
+
+# points = ceil((BASE + subtotal * SUBTOTAL_RATE + miles * PER_MILE) * night multiplier)
+BASE_POINTS = float(os.environ.get("PRICING_BASE_POINTS", "10"))
+SUBTOTAL_RATE = float(os.environ.get("PRICING_SUBTOTAL_RATE", "0.05"))  # points per dollar of food
+PER_MILE_POINTS = float(os.environ.get("PRICING_PER_MILE_POINTS", "4"))
+NIGHT_MULTIPLIER = float(os.environ.get("PRICING_NIGHT_MULTIPLIER", "1.25"))
+NIGHT_START_HOUR = int(os.environ.get("PRICING_NIGHT_START_HOUR", "22"))
+NIGHT_END_HOUR = int(os.environ.get("PRICING_NIGHT_END_HOUR", "6"))
+TIMEZONE = ZoneInfo(os.environ.get("PRICING_TIMEZONE", "America/New_York"))
+
+# Drop-offs are priced on a ~10 m grid so quotes from the same spot share a cache entry
+LOCATION_PRECISION = 4
+MAX_BATCH_QUOTES = 20
+
+@dataclass(frozen=True)
+class Quote:
+    delivery_points: int
+    subtotal: float
+    distance_miles: float
+    night: bool
+
+class QuoteCache:
+    """Bounded LRU of recent quotes; entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, Tuple[float, Quote]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[Quote]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: tuple, quote: Quote):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, quote)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+quote_cache = QuoteCache(
+    maxsize=int(os.environ.get("QUOTE_CACHE_SIZE", "4096")),
+    ttl=float(os.environ.get("QUOTE_CACHE_TTL_SECONDS", "30"))
+)
+
+def _menu_key(name: str) -> str:
+    return " ".join(name.casefold().split())
+
+@dataclass(frozen=True)
+class MenuPrices:
+    version: int
+    prices: Dict[str, Dict[str, Tuple[str, float]]]  # establishment id -> menu key -> (name, price)
+
+_menu_prices: Optional[MenuPrices] = None
+
+def menu_prices(snapshot: CatalogSnapshot) -> MenuPrices:
+    global _menu_prices
+    if _menu_prices is None or _menu_prices.version != snapshot.version:
+        _menu_prices = MenuPrices(
+            version=snapshot.version,
+            prices={
+                est_id: {_menu_key(item["name"]): (item["name"], float(item["price"])) for item in menu}
+                for est_id, menu in snapshot.menus.items()
+            }
+        )
+    return _menu_prices
+
+def is_night(now: Optional[datetime] = None) -> bool:
+    hour = (now or datetime.now(timezone.utc)).astimezone(TIMEZONE).hour
+    if NIGHT_START_HOUR <= NIGHT_END_HOUR:
+        return NIGHT_START_HOUR <= hour < NIGHT_END_HOUR
+    return hour >= NIGHT_START_HOUR or hour < NIGHT_END_HOUR
+
+def price_items(snapshot: CatalogSnapshot, establishment: Establishment, items: Sequence[OrderItem]) -> List[OrderItem]:
+    """The items with their names and prices taken from the menu rather than the client"""
+    menu = menu_prices(snapshot).prices.get(establishment.id, {})
+    priced = []
+    for item in items:
+        if item.quantity < 1:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Quantity of {item.name} must be at least 1"
+            )
+        entry = menu.get(_menu_key(item.name))
+        if entry is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{item.name} is not on the {establishment.name} menu"
+            )
+        priced.append(item.model_copy(update={"name": entry[0], "price": entry[1]}))
+    return priced
+
+def _price(
+    snapshot: CatalogSnapshot,
+    establishment: Establishment,
+    items: Sequence[OrderItem],
+    lat: float,
+    lon: float,
+    night: bool
+) -> Quote:
+    subtotal = round(sum(item.price * item.quantity for item in price_items(snapshot, establishment, items)), 2)
+
+    table = establishment_table(snapshot)
+    row = table.rows[establishment.id]
+    miles = float(distances_from(lat, lon, table.coordinates[row:row + 1])[0])
+
+    points = BASE_POINTS + subtotal * SUBTOTAL_RATE + miles * PER_MILE_POINTS
+    if night:
+        points *= NIGHT_MULTIPLIER
+    return Quote(
+        delivery_points=math.ceil(round(points, 6)),
+        subtotal=subtotal,
+        distance_miles=miles,
+        night=night
+    )
+
+def quote_order(
+    snapshot: CatalogSnapshot,
+    establishment: Establishment,
+    items: Sequence[OrderItem],
+    delivery_location: Location,
+    now: Optional[datetime] = None
+) -> Quote:
+    """Price a delivery from menu prices, trip length and time of day, memoized briefly.
+
+    Uses only the in-memory catalog, so pricing never costs a database read.
+    """
+    if not items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="An order needs at least one item"
+        )
+    if not establishment.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Establishment is not taking orders"
+        )
+    lat = round(delivery_location.latitude, LOCATION_PRECISION)
+    lon = round(delivery_location.longitude, LOCATION_PRECISION)
+    night = is_night(now)
+    key = (
+        snapshot.version,
+        establishment.id,
+        tuple(sorted((_menu_key(item.name), item.quantity) for item in items)),
+        lat,
+        lon,
+        night
+    )
+    quote = quote_cache.get(key)
+    if quote is None:
+        quote = _price(snapshot, establishment, items, lat, lon, night)
+        quote_cache.put(key, quote)
+    return quote
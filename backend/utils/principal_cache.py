@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from models.schemas import UserInDB
+import os
+import time
+
+class PrincipalCache:
+    """Bounded LRU cache of authenticated users keyed by token subject (email).
+
+    Entries expire after `ttl` seconds so changes made by other processes are
+    picked up eventually; writes in this process invalidate explicitly.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, UserInDB]]" = OrderedDict()
+        self._emails_by_id: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, email: str) -> Optional[UserInDB]:
+        entry = self._entries.get(email)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            self._drop(email)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(email)
+        self.hits += 1
+        return user
+
+    def put(self, user: UserInDB):
+        if self.maxsize <= 0:
+            return
+        self._entries[user.email] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user.email)
+        if user.id:
+            self._emails_by_id[str(user.id)] = user.email
+        while len(self._entries) > self.maxsize:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._forget_id(evicted)
+            self.evictions += 1
+
+    def invalidate(self, email: str):
+        if email in self._entries:
+            self._drop(email)
+            self.invalidations += 1
+
+    def invalidate_user(self, user_id: str):
+        """Invalidate by user ID, e.g. when crediting a deliverer we only know by ID"""
+        email = self._emails_by_id.get(str(user_id))
+        if email is not None:
+            self.invalidate(email)
+
+    def clear(self):
+        self._entries.clear()
+        self._emails_by_id.clear()
+
+    def _drop(self, email: str):
+        entry = self._entries.pop(email, None)
+        if entry is not None:
+            self._forget_id(entry[1])
+
+    def _forget_id(self, user: UserInDB):
+        if user.id and self._emails_by_id.get(str(user.id)) == user.email:
+            del self._emails_by_id[str(user.id)]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+principal_cache = PrincipalCache(
+    maxsize=int(os.environ.get("PRINCIPAL_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+)
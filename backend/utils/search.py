@@ -0,0 +1,280 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Set, Tuple
+import math
+import re
+import unicodedata
+
+# How much a match counts depending on where it was found
+NAME_WEIGHT = 3.0
+CATEGORY_WEIGHT = 2.0
+MENU_ITEM_WEIGHT = 1.5
+MENU_CATEGORY_WEIGHT = 1.0
+
+# Match quality: whole word, typed prefix of a word, part of a word, or a close misspelling
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.6
+INFIX_MATCH = 0.4
+FUZZY_MATCH = 0.5
+MIN_FUZZY_SIMILARITY = 0.45
+
+# Bound the work one query can cause
+MAX_QUERY_LENGTH = 100
+MAX_QUERY_TERMS = 8
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSIONS = 50
+
+ESTABLISHMENT = "establishment"
+CATEGORY = "category"
+MENU_ITEM = "menu_item"
+
+_WORD = re.compile(r"[^\W_]+")
+
+def normalize(text: str) -> str:
+    """Casefold and strip accents so "Café" matches "cafe" """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+def _stem(word: str) -> str:
+    # Just enough stemming for menus: "nuggets" -> "nugget", "fries" -> "fry"
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(word) for word in _WORD.findall(normalize(text))]
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+@dataclass(frozen=True)
+class Entry:
+    """One searchable piece of text: an establishment's name or category, or a menu item"""
+    establishment_id: str
+    kind: str
+    text: str
+    weight: float
+    tokens: Tuple[str, ...]
+
+@dataclass(frozen=True)
+class Suggestion:
+    kind: str
+    text: str
+    establishment_id: str
+    score: float
+
+class SearchIndex:
+    """In-process inverted index over establishment names, categories and menu items.
+
+    Supports ranked establishment search, prefix typeahead and trigram
+    fuzzy matching. sync() diffs a new catalog against what is indexed and
+    only re-indexes establishments that changed.
+    """
+
+    def __init__(self):
+        self._entries: Dict[int, Entry] = {}
+        self._next_entry = 0
+        self._by_establishment: Dict[str, List[int]] = {}
+        self._fingerprints: Dict[str, tuple] = {}
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._vocabulary: List[str] = []  # sorted, for prefix lookups
+        self._trigram_postings: Dict[str, Set[str]] = defaultdict(set)
+        self.version = 0
+
+    # Indexing
+
+    @staticmethod
+    def _fingerprint(establishment, menu: Iterable[dict]) -> tuple:
+        return (
+            establishment.name,
+            establishment.category,
+            establishment.is_active,
+            tuple((item.get("name", ""), item.get("category", "")) for item in menu),
+        )
+
+    def _add_token(self, token: str, entry_id: int):
+        if token not in self._postings:
+            insort(self._vocabulary, token)
+            for trigram in _trigrams(token):
+                self._trigram_postings[trigram].add(token)
+        self._postings[token].add(entry_id)
+
+    def _remove_token(self, token: str, entry_id: int):
+        postings = self._postings.get(token)
+        if postings is None:
+            return
+        postings.discard(entry_id)
+        if not postings:
+            del self._postings[token]
+            index = bisect_left(self._vocabulary, token)
+            if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                del self._vocabulary[index]
+            for trigram in _trigrams(token):
+                self._trigram_postings[trigram].discard(token)
+                if not self._trigram_postings[trigram]:
+                    del self._trigram_postings[trigram]
+
+    def _add_entry(self, establishment_id: str, kind: str, text: str, weight: float):
+        tokens = tuple(dict.fromkeys(tokenize(text)))
+        if not tokens:
+            return
+        entry_id = self._next_entry
+        self._next_entry += 1
+        self._entries[entry_id] = Entry(establishment_id, kind, text, weight, tokens)
+        self._by_establishment.setdefault(establishment_id, []).append(entry_id)
+        for token in tokens:
+            self._add_token(token, entry_id)
+
+    def _remove_establishment(self, establishment_id: str):
+        for entry_id in self._by_establishment.pop(establishment_id, []):
+            entry = self._entries.pop(entry_id)
+            for token in entry.tokens:
+                self._remove_token(token, entry_id)
+        self._fingerprints.pop(establishment_id, None)
+
+    def _index_establishment(self, establishment, menu: Iterable[dict]):
+        establishment_id = establishment.id
+        self._add_entry(establishment_id, ESTABLISHMENT, establishment.name, NAME_WEIGHT)
+        self._add_entry(establishment_id, CATEGORY, establishment.category, CATEGORY_WEIGHT)
+        for item in menu:
+            self._add_entry(establishment_id, MENU_ITEM, item.get("name", ""), MENU_ITEM_WEIGHT)
+            if item.get("category"):
+                self._add_entry(establishment_id, CATEGORY, item["category"], MENU_CATEGORY_WEIGHT)
+
+    def sync(self, snapshot) -> Dict[str, int]:
+        """Bring the index in line with a catalog snapshot, touching only what changed"""
+        current = {}
+        for establishment in snapshot.establishments:
+            if establishment.is_active:
+                current[establishment.id] = establishment
+
+        removed = [est_id for est_id in self._fingerprints if est_id not in current]
+        for est_id in removed:
+            self._remove_establishment(est_id)
+
+        added = updated = 0
+        for est_id, establishment in current.items():
+            menu = snapshot.menu(est_id)
+            fingerprint = self._fingerprint(establishment, menu)
+            previous = self._fingerprints.get(est_id)
+            if previous == fingerprint:
+                continue
+            if previous is None:
+                added += 1
+            else:
+                updated += 1
+                self._remove_establishment(est_id)
+            self._index_establishment(establishment, menu)
+            self._fingerprints[est_id] = fingerprint
+
+        if added or updated or removed:
+            self.version += 1
+        return {"added": added, "updated": updated, "removed": len(removed)}
+
+    # Querying
+
+    def _idf(self, token: str) -> float:
+        establishments = {self._entries[entry_id].establishment_id for entry_id in self._postings[token]}
+        return math.log(1 + len(self._fingerprints) / len(establishments))
+
+    def _expand(self, term: str, prefix: bool) -> Dict[str, float]:
+        """Indexed tokens a query term can match, with the quality of each match"""
+        matches = {}
+        if term in self._postings:
+            matches[term] = EXACT_MATCH
+        if prefix:
+            start = bisect_left(self._vocabulary, term)
+            for token in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+                if not token.startswith(term):
+                    break
+                matches.setdefault(token, PREFIX_MATCH)
+            if not matches and len(term) >= 3:
+                # Inside a compound word, e.g. "nug" in "mcnuggets"
+                inner = {term[i:i + 3] for i in range(len(term) - 2)}
+                candidates = set.intersection(*(self._trigram_postings.get(trigram, set()) for trigram in inner))
+                for token in sorted(candidates)[:MAX_PREFIX_EXPANSIONS]:
+                    if term in token:
+                        matches[token] = INFIX_MATCH
+        if not matches and len(term) >= 4:
+            term_trigrams = _trigrams(term)
+            overlap = defaultdict(int)
+            for trigram in term_trigrams:
+                for token in self._trigram_postings.get(trigram, ()):
+                    overlap[token] += 1
+            for token, shared in overlap.items():
+                similarity = shared / len(term_trigrams | _trigrams(token))
+                if similarity >= MIN_FUZZY_SIMILARITY:
+                    matches[token] = FUZZY_MATCH * similarity
+        return matches
+
+    def _parse(self, query: str) -> List[str]:
+        terms = tokenize(query[:MAX_QUERY_LENGTH])
+        return list(dict.fromkeys(terms))[:MAX_QUERY_TERMS]
+
+    def _entry_scores(self, query: str) -> Tuple[int, Dict[int, Dict[int, float]]]:
+        """entry_id -> {term position: best score} for every entry matching at least one term"""
+        terms = self._parse(query)
+        scores: Dict[int, Dict[int, float]] = defaultdict(dict)
+        for position, term in enumerate(terms):
+            # Only the word being typed is treated as a prefix; earlier words are complete.
+            # A lone single letter would match half the catalog, so it needs company.
+            prefix = position == len(terms) - 1 and (len(term) >= MIN_PREFIX_LENGTH or position > 0)
+            for token, quality in self._expand(term, prefix).items():
+                idf = self._idf(token)
+                for entry_id in self._postings[token]:
+                    score = quality * idf * self._entries[entry_id].weight
+                    if score > scores[entry_id].get(position, 0.0):
+                        scores[entry_id][position] = score
+        return len(terms), scores
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        """(establishment_id, score) for establishments matching every query term, best first.
+
+        Terms may match different fields, e.g. "teppanyaki chicken" matches
+        the name of one place and a menu item at that same place.
+        """
+        term_count, entry_scores = self._entry_scores(query)
+        if not term_count:
+            return []
+        by_establishment: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for entry_id, positions in entry_scores.items():
+            best = by_establishment[self._entries[entry_id].establishment_id]
+            for position, score in positions.items():
+                if score > best.get(position, 0.0):
+                    best[position] = score
+        ranked = [
+            (est_id, sum(positions.values()))
+            for est_id, positions in by_establishment.items()
+            if len(positions) == term_count
+        ]
+        ranked.sort(key=lambda match: -match[1])
+        return ranked
+
+    def suggest(self, query: str, limit: int) -> List[Suggestion]:
+        """Typeahead: names, categories and menu items whose own text matches every term"""
+        term_count, entry_scores = self._entry_scores(query)
+        best: Dict[tuple, Suggestion] = {}
+        for entry_id, positions in entry_scores.items():
+            if len(positions) != term_count:
+                continue
+            entry = self._entries[entry_id]
+            score = sum(positions.values())
+            # A category is one suggestion however many places share it
+            key = (entry.kind, normalize(entry.text)) if entry.kind == CATEGORY else (entry.kind, entry_id)
+            if key not in best or score > best[key].score:
+                best[key] = Suggestion(entry.kind, entry.text, entry.establishment_id, score)
+        return sorted(best.values(), key=lambda suggestion: (-suggestion.score, suggestion.text))[:limit]
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "establishments": len(self._fingerprints),
+            "entries": len(self._entries),
+            "terms": len(self._vocabulary),
+        }
+
+establishment_search = SearchIndex()
@@ -0,0 +1,92 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, Union, get_args, get_origin
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from bson import ObjectId
+import orjson
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any, sort_keys: bool = False) -> bytes:
+    """JSON bytes for plain data that may contain ObjectIds and naive datetimes"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_SORT_KEYS if sort_keys else None)
+
+class DocumentShape:
+    """The top-level output of `model` (keys, order, defaults) applied to raw MongoDB documents.
+
+    Produces what FastAPI would send for `response_model=model` without
+    building or validating a model per document. Only use it for documents
+    the application wrote itself.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.fields = []
+        for name, field in model.model_fields.items():
+            key = field.alias or name
+            source = key if key == "_id" else name
+            default = None if field.is_required() else (field.default_factory or (lambda value=field.default: value))
+            self.fields.append((source, key, default, _nested(field.annotation)))
+        # Documents that already have exactly the model's keys only need their nested values shaped
+        self.keys = frozenset(source for source, _, _, _ in self.fields)
+        self.passthrough = all(source == key for source, key, _, _ in self.fields)
+        self.nested = [(key, nested) for _, key, _, nested in self.fields if nested is not None]
+
+    def apply(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        if self.passthrough and doc.keys() == self.keys:
+            if not self.nested:
+                return doc  # ObjectIds are left to the encoder
+            shaped = dict(doc)
+            for key, (many, shape) in self.nested:
+                value = shaped[key]
+                if value is not None:
+                    shaped[key] = [shape.apply(item) for item in value] if many else shape.apply(value)
+            return shaped
+
+        shaped = {}
+        for source, key, default, nested in self.fields:
+            if source in doc:
+                value = doc[source]
+                if isinstance(value, ObjectId):
+                    value = str(value)
+                elif nested is not None and value is not None:
+                    many, shape = nested
+                    value = [shape.apply(item) for item in value] if many else shape.apply(value)
+                shaped[key] = value
+            elif default is not None:
+                shaped[key] = default()
+        return shaped
+
+def _nested(annotation) -> Optional[Tuple[bool, "DocumentShape"]]:
+    """(is_list, shape) when a field holds a model or a list of models"""
+    args = [arg for arg in get_args(annotation) if arg is not type(None)]
+    if get_origin(annotation) in (list, List) and args:
+        inner = _nested(args[0])
+        return (True, inner[1]) if inner is not None and not inner[0] else None
+    if args and get_origin(annotation) is Union and len(args) == 1:
+        return _nested(args[0])
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return False, shape_for(annotation)
+    return None
+
+_shapes: Dict[type, DocumentShape] = {}
+_list_adapters: Dict[type, TypeAdapter] = {}
+
+def shape_for(model: Type[BaseModel]) -> DocumentShape:
+    if model not in _shapes:
+        _shapes[model] = DocumentShape(model)
+    return _shapes[model]
+
+def documents_response(docs: Iterable[dict], model: Type[BaseModel], headers: Optional[dict] = None) -> Response:
+    """Encode trusted MongoDB documents straight to a JSON response shaped like List[model]"""
+    shape = shape_for(model)
+    return Response(dumps([shape.apply(doc) for doc in docs]), media_type="application/json", headers=headers)
+
+def models_response(items: List[BaseModel], model: Type[BaseModel], headers: Optional[dict] = None) -> Response:
+    """Encode already-validated models in one pass, skipping FastAPI's re-validation"""
+    if model not in _list_adapters:
+        _list_adapters[model] = TypeAdapter(List[model])
+    body = _list_adapters[model].dump_json(items, by_alias=True)
+    return Response(body, media_type="application/json", headers=headers)
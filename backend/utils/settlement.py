@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+import os
+from bson import ObjectId
+from utils.database import get_database
+from utils.jobs import job_queue
+from utils.log import get_logger
+from utils.principal_cache import principal_cache
+from utils import ledger
+
+logger = get_logger("settlement")
+
+# Job kinds
+DELIVERY_CREDIT_JOB = "delivery_credit"
+ORDER_REFUND_JOB = "order_refund"
+
+# Completed orders still flagged after this long are assumed to have lost their credit job
+SETTLEMENT_SWEEP_GRACE_SECONDS = float(os.environ.get("SETTLEMENT_SWEEP_GRACE_SECONDS", "60"))
+SETTLEMENT_SWEEP_BATCH = 500
+# How far back the sweep looks for order debits that never got their order
+ORPHAN_DEBIT_LOOKBACK_SECONDS = float(os.environ.get("ORPHAN_DEBIT_LOOKBACK_SECONDS", str(24 * 3600)))
+
+# Set on an order in the same write that completes it, cleared once the deliverer is paid
+AWAITING_SETTLEMENT = "awaiting_settlement"
+
+async def enqueue_delivery_credit(order_id: str, deliverer_id: str, points: int):
+    """Queue the deliverer's payout for a completed order; safe to call more than once"""
+    await job_queue.enqueue(
+        DELIVERY_CREDIT_JOB,
+        {"order_id": order_id, "user_id": deliverer_id, "amount": points},
+        key=f"{DELIVERY_CREDIT_JOB}:{order_id}"
+    )
+
+async def enqueue_refund(customer_id: str, points: int, order_id: str):
+    """Queue the return of a debit whose order was never created"""
+    await job_queue.enqueue(
+        ORDER_REFUND_JOB,
+        {"order_id": order_id, "user_id": customer_id, "amount": points},
+        key=f"{ORDER_REFUND_JOB}:{order_id}"
+    )
+
+async def refund_unplaced_order(customer_id: str, points: int, order_id: str):
+    """Return a debit whose order insert just failed, without letting a second failure mask the first.
+
+    The refund is tried inline, then queued; if the database is down for
+    both, sweep_orphaned_debits finds the debit once it is back.
+    """
+    try:
+        await ledger.refund(customer_id, points, order_id)
+        principal_cache.invalidate_user(customer_id)
+        return
+    except Exception as e:
+        logger.warning("Refund for unplaced order %s failed, queueing it: %s", order_id, e)
+    try:
+        await enqueue_refund(customer_id, points, order_id)
+    except Exception as e:
+        logger.warning("Could not queue refund for unplaced order %s, leaving it to the sweep: %s", order_id, e)
+
+async def _credit_delivery(payload: dict):
+    # The ledger skips a credit already recorded for this order, so reruns pay once
+    await ledger.credit_delivery(payload["user_id"], payload["amount"], payload["order_id"])
+    principal_cache.invalidate_user(payload["user_id"])
+    db = await get_database()
+    credited = await db.points_ledger.find_one(
+        {"order_id": payload["order_id"], "reason": ledger.DELIVERY_CREDIT, "applied": {"$ne": False}}, {"_id": 1}
+    )
+    if credited is None:
+        # The row is there but the balance has not moved yet; fail so the job retries
+        raise RuntimeError(f"Delivery credit for order {payload['order_id']} is not applied yet")
+    await db.orders.update_one({"_id": ObjectId(payload["order_id"])}, {"$unset": {AWAITING_SETTLEMENT: ""}})
+
+async def _refund(payload: dict):
+    await ledger.refund(payload["user_id"], payload["amount"], payload["order_id"])
+    principal_cache.invalidate_user(payload["user_id"])
+
+async def sweep_unsettled() -> int:
+    """Re-enqueue credits for completed orders whose job was lost, e.g. to a crash right after completion"""
+    db = await get_database()
+    cutoff = datetime.utcnow() - timedelta(seconds=SETTLEMENT_SWEEP_GRACE_SECONDS)
+    orders = await db.orders.find(
+        {AWAITING_SETTLEMENT: True, "completed_at": {"$lt": cutoff}},
+        {"deliverer_id": 1, "delivery_points": 1}
+    ).limit(SETTLEMENT_SWEEP_BATCH).to_list(length=SETTLEMENT_SWEEP_BATCH)
+    for order in orders:
+        await enqueue_delivery_credit(str(order["_id"]), order["deliverer_id"], order["delivery_points"])
+    return len(orders)
+
+async def sweep_orphaned_debits() -> int:
+    """Refund order debits whose order never got written, then finish rows a crash left unapplied"""
+    await ledger.reconcile_unapplied(older_than=SETTLEMENT_SWEEP_GRACE_SECONDS)
+    db = await get_database()
+    now = datetime.utcnow()
+    debits = await db.points_ledger.find(
+        {
+            "reason": ledger.ORDER_DEBIT,
+            "created_at": {
+                "$gte": now - timedelta(seconds=ORPHAN_DEBIT_LOOKBACK_SECONDS),
+                "$lt": now - timedelta(seconds=SETTLEMENT_SWEEP_GRACE_SECONDS)
+            },
+            "applied": {"$ne": False}
+        },
+        {"user_id": 1, "delta": 1, "order_id": 1}
+    ).limit(SETTLEMENT_SWEEP_BATCH).to_list(length=SETTLEMENT_SWEEP_BATCH)
+    if not debits:
+        return 0
+
+    order_ids = [debit["order_id"] for debit in debits]
+    placed = {
+        str(order["_id"]) async for order in
+        db.orders.find({"_id": {"$in": [ObjectId(order_id) for order_id in order_ids]}}, {"_id": 1})
+    }
+    refunded = {
+        row["order_id"] async for row in
+        db.points_ledger.find({"order_id": {"$in": order_ids}, "reason": ledger.ORDER_REFUND}, {"order_id": 1})
+    }
+    settled = placed | refunded
+    orphans = [debit for debit in debits if debit["order_id"] not in settled]
+    for debit in orphans:
+        logger.warning("Order %s was never created, refunding its debit", debit["order_id"])
+        await enqueue_refund(debit["user_id"], -debit["delta"], debit["order_id"])
+    return len(orphans)
+
+job_queue.register(DELIVERY_CREDIT_JOB, _credit_delivery)
+job_queue.register(ORDER_REFUND_JOB, _refund)
+job_queue.register_sweep(sweep_unsettled)
+job_queue.register_sweep(sweep_orphaned_debits)
@@ -0,0 +1,175 @@
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from pymongo import monitoring
+from bson import json_util
+from utils.log import get_logger
+import asyncio
+import json
+import os
+import threading
+import time
+
+logger = get_logger("slow_queries")
+
+# Commands explain() accepts; anything else is logged without a plan
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Driver housekeeping that is never interesting (and explain itself, to avoid feedback)
+IGNORED_COMMANDS = {"explain", "hello", "isMaster", "ismaster", "ping", "endSessions", "saslStart", "saslContinue", "killCursors"}
+# Parts of a command that hold values (redacted in the shape) or pure structure (kept as-is)
+VALUE_FIELDS = ("filter", "query", "pipeline", "updates", "deletes", "update")
+STRUCTURE_FIELDS = ("sort", "projection", "fields", "hint")
+# Re-explain a query shape at most this often
+EXPLAIN_INTERVAL_SECONDS = 60
+
+def query_shape(value: Any) -> Any:
+    """The structure of a filter with every literal replaced by "?" so queries group by shape"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = [query_shape(item) for item in value]
+        # A list of literals ($in values, ...) has one shape regardless of length
+        return shapes[:1] if all(shape == "?" for shape in shapes) else shapes
+    return "?"
+
+def command_shape(command: dict) -> dict:
+    shape = {field: query_shape(command[field]) for field in VALUE_FIELDS if field in command}
+    shape.update({field: command[field] for field in STRUCTURE_FIELDS if field in command})
+    return shape
+
+def _explainable(command: dict) -> dict:
+    """The command minus the driver's session and routing fields, ready to wrap in explain"""
+    return {key: value for key, value in command.items() if not key.startswith("$") and key not in ("lsid", "txnNumber")}
+
+def plan_summary(plan: dict) -> str:
+    """Winning plan as "STAGE <- STAGE(index)", innermost last"""
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage += f"({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Records MongoDB commands slower than a threshold, with their shape and explain() plan.
+
+    Registered on the client in connect_to_mongo, so every collection access
+    is covered. Disabled (threshold None) it only pays a None check per
+    command. Keeps the most recent `size` entries.
+    """
+
+    def __init__(self, threshold_ms: Optional[float], size: int, explain: bool = True):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.entries: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._commands: Dict[Tuple[int, int], Tuple[str, dict]] = {}
+        self._explained: Dict[str, float] = {}
+        self._plans: Dict[str, Tuple[str, dict]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+
+    def bind(self, client, loop: asyncio.AbstractEventLoop):
+        """Give the log a client and loop to run explain() on"""
+        self._client = client
+        self._loop = loop
+
+    def configure(self, threshold_ms: Optional[float] = None, size: Optional[int] = None):
+        if size is not None and size != self.entries.maxlen:
+            self.entries = deque(self.entries, maxlen=size)
+        self.threshold_ms = threshold_ms
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if self.threshold_ms is None or event.command_name in IGNORED_COMMANDS:
+            return
+        with self._lock:
+            self._commands[(event.request_id, event.operation_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, error=None)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, error=str(event.failure))
+
+    def _finish(self, event, error: Optional[str]):
+        if not self._commands:
+            return
+        with self._lock:
+            started = self._commands.pop((event.request_id, event.operation_id), None)
+        threshold_ms = self.threshold_ms
+        duration_ms = event.duration_micros / 1000
+        if started is None or threshold_ms is None or duration_ms < threshold_ms:
+            return
+
+        database_name, command = started
+        # getMore names its collection separately; the cursor id is in the command slot
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        shape = command_shape(command)
+        entry = {
+            "at": datetime.utcnow(),
+            "database": database_name,
+            "collection": collection if isinstance(collection, str) else None,
+            "command": event.command_name,
+            "duration_ms": round(duration_ms, 3),
+            "shape": shape,
+            "error": error,
+            "plan": None,
+            "explain": None,
+        }
+        self.entries.append(entry)
+        logger.warning("Slow MongoDB %s on %s: %.1f ms %s", event.command_name, entry["collection"], duration_ms, shape)
+
+        if self.explain and event.command_name in EXPLAINABLE_COMMANDS:
+            self._schedule_explain(entry, database_name, command)
+
+    def _schedule_explain(self, entry: dict, database_name: str, command: dict):
+        if self._loop is None or self._client is None or self._loop.is_closed():
+            return
+        key = json.dumps([entry["collection"], entry["command"], entry["shape"]], sort_keys=True, default=str)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(key, -EXPLAIN_INTERVAL_SECONDS) < EXPLAIN_INTERVAL_SECONDS:
+                # Explained recently: reuse that plan rather than asking the server again
+                if key in self._plans:
+                    entry["plan"], entry["explain"] = self._plans[key]
+                return
+            self._explained[key] = now
+        # Driver callbacks run off the event loop; hand the explain back to it
+        asyncio.run_coroutine_threadsafe(self._explain(entry, key, database_name, command), self._loop)
+
+    async def _explain(self, entry: dict, key: str, database_name: str, command: dict):
+        try:
+            result = await self._client[database_name].command(
+                {"explain": _explainable(command), "verbosity": "queryPlanner"}
+            )
+        except Exception as e:
+            entry["explain"] = {"error": str(e)}
+            return
+        # Round-trip through extended JSON so BSON-only types render in the admin endpoint
+        winning_plan = json.loads(json_util.dumps(result.get("queryPlanner", {}).get("winningPlan", {})))
+        entry["plan"] = plan_summary(winning_plan.get("queryPlan", winning_plan))
+        entry["explain"] = {"winningPlan": winning_plan}
+        with self._lock:
+            self._plans[key] = (entry["plan"], entry["explain"])
+
+    def recent(self, limit: Optional[int] = None) -> list:
+        entries = list(self.entries)[::-1]
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        self.entries.clear()
+        with self._lock:
+            self._explained.clear()
+            self._plans.clear()
+
+def _threshold_from_env() -> Optional[float]:
+    value = os.environ.get("SLOW_QUERY_MS", "").strip()
+    return float(value) if value else None
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=_threshold_from_env(),
+    size=int(os.environ.get("SLOW_QUERY_LOG_SIZE", "100")),
+    explain=os.environ.get("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+)
@@ -0,0 +1,147 @@
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Optional
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from bson import ObjectId
+from models.schemas import OrderStatus
+from utils.database import get_database
+
+# Declared order state machine: status -> statuses it may move to
+ORDER_TRANSITIONS: Dict[OrderStatus, FrozenSet[OrderStatus]] = {
+    OrderStatus.PENDING: frozenset({OrderStatus.ACCEPTED, OrderStatus.CANCELLED}),
+    OrderStatus.ACCEPTED: frozenset({OrderStatus.PICKED_UP, OrderStatus.DELIVERED, OrderStatus.CANCELLED}),
+    OrderStatus.PICKED_UP: frozenset({OrderStatus.DELIVERED}),
+    # A deliverer may re-submit delivery (e.g. replace the photo) until the customer confirms
+    OrderStatus.DELIVERED: frozenset({OrderStatus.DELIVERED, OrderStatus.COMPLETED}),
+    OrderStatus.COMPLETED: frozenset(),
+    OrderStatus.CANCELLED: frozenset(),
+}
+
+# Who may drive a transition, expressed as a filter on the order document
+CUSTOMER = "customer"
+DELIVERER = "deliverer"
+ACCEPTOR = "acceptor"
+
+# Set by each bundle write, so it can read back exactly the orders it moved
+BUNDLE_TRANSITION_FIELD = "bundle_transition_id"
+
+def allowed_sources(to_status: OrderStatus) -> list:
+    """Statuses from which an order may move to `to_status`"""
+    return [source.value for source, targets in ORDER_TRANSITIONS.items() if to_status in targets]
+
+def can_transition(from_status: OrderStatus, to_status: OrderStatus) -> bool:
+    return to_status in ORDER_TRANSITIONS.get(OrderStatus(from_status), frozenset())
+
+def _actor_filter(role: str, actor_id: str) -> dict:
+    if role == CUSTOMER:
+        return {"customer_id": actor_id}
+    if role == DELIVERER:
+        return {"deliverer_id": actor_id}
+    if role == ACCEPTOR:
+        return {"customer_id": {"$ne": actor_id}}
+    raise ValueError(f"Unknown transition role: {role}")
+
+def _actor_matches(role: str, actor_id: str, order: dict) -> bool:
+    if role == CUSTOMER:
+        return order.get("customer_id") == actor_id
+    if role == DELIVERER:
+        return order.get("deliverer_id") == actor_id
+    return order.get("customer_id") != actor_id
+
+async def transition_order(
+    order_id: str,
+    to_status: OrderStatus,
+    actor_id: str,
+    role: str,
+    set_fields: Optional[dict] = None,
+    forbidden_detail: str = "Not authorized to update this order",
+    invalid_state_detail: Optional[str] = None,
+    forbidden_status_code: int = status.HTTP_403_FORBIDDEN,
+    return_previous: bool = False
+) -> dict:
+    """Atomically move an order to `to_status` if its current status and owner allow it.
+
+    The status and actor checks are part of the update filter, so concurrent
+    callers cannot both win; the happy path is a single round trip. Returns
+    the updated order document, or with `return_previous` the one it replaced.
+    """
+    if not ObjectId.is_valid(order_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid order ID format"
+        )
+
+    db = await get_database()
+    guard = {
+        "_id": ObjectId(order_id),
+        "status": {"$in": allowed_sources(to_status)},
+        **_actor_filter(role, actor_id)
+    }
+    update = {"status": to_status, **(set_fields or {})}
+    order = await db.orders.find_one_and_update(
+        guard,
+        {"$set": update},
+        return_document=ReturnDocument.BEFORE if return_previous else ReturnDocument.AFTER
+    )
+    if order is not None:
+        return order
+
+    # Slow path: the guard failed, read the order once to explain why
+    current = await db.orders.find_one({"_id": ObjectId(order_id)}, {"status": 1, "customer_id": 1, "deliverer_id": 1})
+    if not current:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Order not found"
+        )
+    if not _actor_matches(role, actor_id, current):
+        raise HTTPException(
+            status_code=forbidden_status_code,
+            detail=forbidden_detail
+        )
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=invalid_state_detail or f"Cannot change order from {OrderStatus(current['status']).value} to {OrderStatus(to_status).value}"
+    )
+
+async def transition_bundle(
+    bundle_id: str,
+    to_status: OrderStatus,
+    deliverer_id: str,
+    set_fields: Optional[dict] = None
+) -> List[dict]:
+    """Move every order of a deliverer's bundle that is allowed to make the move, in one write.
+
+    Orders that left the bundle's path (e.g. cancelled by their customer)
+    are skipped. Returns only the orders this call moved: each write tags
+    its orders with a fresh id, so orders already in `to_status`, or moved
+    by a concurrent call, are left out.
+    """
+    db = await get_database()
+    bundle = {"bundle_id": bundle_id, "deliverer_id": deliverer_id}
+    transition_id = ObjectId()
+    result = await db.orders.update_many(
+        {**bundle, "status": {"$in": allowed_sources(to_status)}},
+        {"$set": {"status": to_status, BUNDLE_TRANSITION_FIELD: transition_id, **(set_fields or {})}}
+    )
+    if result.matched_count == 0:
+        if not await db.orders.count_documents(bundle, limit=1):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Bundle not found"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"No orders in this bundle can move to {OrderStatus(to_status).value}"
+        )
+    return await db.orders.find(
+        {**bundle, BUNDLE_TRANSITION_FIELD: transition_id}, {"customer_id": 1, "deliverer_id": 1}
+    ).to_list(length=None)
+
+def transition_timestamps(to_status: OrderStatus) -> dict:
+    """Lifecycle timestamps recorded when an order enters `to_status`"""
+    now = datetime.utcnow()
+    if to_status == OrderStatus.ACCEPTED:
+        return {"accepted_at": now}
+    if to_status == OrderStatus.COMPLETED:
+        return {"completed_at": now}
+    return {}
@@ -9,6 +9,7 @@ class OwlHacksDeliveryApp {
         this.selectedEstablishment = null;
         this.orderItems = [];
         this.refreshInterval = null;
+        this.eventSource = null;
         
         this.init();
     }
@@ -147,9 +148,55 @@ class OwlHacksDeliveryApp {
     }
 
     startAutoRefresh() {
-        // Clear any existing interval first
+        // Clear any existing stream or interval first
         this.stopAutoRefresh();
-        
+
+        // Prefer the server-push order feed; fall back to polling if unavailable
+        if (window.EventSource) {
+            this.eventSource = new EventSource(`${this.baseURL}/orders/stream?token=${encodeURIComponent(this.token)}`);
+            const onOrderEvent = (e) => this.handleOrderEvent(JSON.parse(e.data));
+            ['order.created', 'order.accepted', 'order.status', 'order.completed'].forEach(type => {
+                this.eventSource.addEventListener(type, onOrderEvent);
+            });
+            this.eventSource.onopen = () => {
+                console.log('Order stream connected');
+                this.stopPolling();
+            };
+            this.eventSource.onerror = () => {
+                // EventSource reconnects on its own; poll until it does
+                console.log('Order stream interrupted, polling until it reconnects');
+                this.startPolling();
+            };
+        } else {
+            this.startPolling();
+        }
+    }
+
+    handleOrderEvent(event) {
+        if (!this.currentUser) return;
+        const isDeliverTab = !document.getElementById('deliverContent').classList.contains('hidden');
+        const myId = this.currentUser._id || this.currentUser.id;
+        const involvesMe = event.customer_id === myId || event.deliverer_id === myId;
+
+        if (event.customer_id === myId) {
+            this.loadMyOrders();
+        }
+        if (isDeliverTab) {
+            if (event.type === 'order.created' || event.type === 'order.accepted') {
+                this.loadAvailableOrders();
+            }
+            if (event.deliverer_id === myId) {
+                this.loadMyDeliveries();
+            }
+        }
+        if (involvesMe && event.type === 'order.completed') {
+            this.loadCurrentUser(); // Refresh user points
+        }
+    }
+
+    startPolling() {
+        if (this.refreshInterval) return;
+
         // Set up auto-refresh every 10 seconds
         this.refreshInterval = setInterval(() => {
             if (this.currentUser) {
@@ -165,7 +212,7 @@ class OwlHacksDeliveryApp {
         console.log('Auto-refresh started (10 second intervals)');
     }
 
-    stopAutoRefresh() {
+    stopPolling() {
         if (this.refreshInterval) {
             clearInterval(this.refreshInterval);
             this.refreshInterval = null;
@@ -173,6 +220,14 @@ class OwlHacksDeliveryApp {
         }
     }
 
+    stopAutoRefresh() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+        this.stopPolling();
+    }
+
     // UI Navigation Methods
     showAuthScreen() {
         document.getElementById('authScreen').classList.remove('hidden');
@@ -301,11 +356,32 @@ class OwlHacksDeliveryApp {
                 const establishments = await response.json();
                 this.renderEstablishments(establishments);
             }
+            this.loadSearchSuggestions(query);
         } catch (error) {
             this.showAlert('Search failed', 'error');
         }
     }
 
+    async loadSearchSuggestions(query) {
+        const response = await fetch(`${this.baseURL}/establishments/typeahead?q=${encodeURIComponent(query)}&limit=8`, {
+            headers: {
+                'Authorization': `Bearer ${this.token}`,
+            },
+        });
+        if (!response.ok) return;
+
+        const datalist = document.getElementById('establishmentSuggestions');
+        datalist.innerHTML = '';
+        (await response.json()).forEach(suggestion => {
+            const option = document.createElement('option');
+            option.value = suggestion.text;
+            if (suggestion.kind === 'menu_item') {
+                option.label = `${suggestion.text} at ${suggestion.establishment_name}`;
+            }
+            datalist.appendChild(option);
+        });
+    }
+
     renderEstablishments(establishments) {
         const container = document.getElementById('establishmentsList');
         container.innerHTML = '';
@@ -318,12 +394,12 @@ class OwlHacksDeliveryApp {
             establishmentElement.className = 'bg-white rounded-lg shadow-md p-4 cursor-pointer hover:shadow-lg transition-shadow';
             establishmentElement.innerHTML = `
                 <div class="flex items-center space-x-4">
-                    <img src="${establishment.image_url}" alt="${establishment.name}" 
+                    <img src="${this.escapeHTML(establishment.image_url)}" alt="${this.escapeHTML(establishment.name)}" 
                          class="w-16 h-16 rounded-lg object-cover">
                     <div class="flex-1">
-                        <h3 class="font-bold text-lg">${establishment.name}</h3>
-                        <p class="text-gray-600">${establishment.category}</p>
-                        <p class="text-sm text-gray-500">${establishment.location.address}</p>
+                        <h3 class="font-bold text-lg">${this.escapeHTML(establishment.name)}</h3>
+                        <p class="text-gray-600">${this.escapeHTML(establishment.category)}</p>
+                        <p class="text-sm text-gray-500">${this.escapeHTML(establishment.location.address)}</p>
                         ${distanceText}
                     </div>
                     <i class="fas fa-chevron-right text-gray-400"></i>
@@ -389,7 +465,7 @@ class OwlHacksDeliveryApp {
             const categoryElement = document.createElement('div');
             categoryElement.className = 'mb-4';
             categoryElement.innerHTML = `
-                <h5 class="font-medium text-gray-700 mb-2 border-b pb-1">${category}</h5>
+                <h5 class="font-medium text-gray-700 mb-2 border-b pb-1">${this.escapeHTML(category)}</h5>
             `;
             
             const itemsContainer = document.createElement('div');
@@ -400,7 +476,7 @@ class OwlHacksDeliveryApp {
                 itemElement.className = 'flex justify-between items-center p-2 hover:bg-gray-50 rounded cursor-pointer border';
                 itemElement.innerHTML = `
                     <div>
-                        <div class="font-medium text-sm">${item.name}</div>
+                        <div class="font-medium text-sm">${this.escapeHTML(item.name)}</div>
                         <div class="text-xs text-gray-500">$${item.price.toFixed(2)}</div>
                     </div>
                     <button class="bg-green-600 hover:bg-green-700 text-white px-3 py-1 rounded text-sm">
@@ -456,7 +532,7 @@ class OwlHacksDeliveryApp {
             itemElement.className = 'flex justify-between items-start bg-gray-50 p-3 rounded';
             itemElement.innerHTML = `
                 <div class="flex-1">
-                    <div class="font-medium">${item.name}</div>
+                    <div class="font-medium">${this.escapeHTML(item.name)}</div>
                     <div class="text-sm text-gray-600 mb-2">
                         <div class="flex items-center space-x-2">
                             <button class="text-red-500 hover:text-red-700 w-6 h-6 flex items-center justify-center border border-gray-300 rounded" onclick="app.updateItemQuantity(${index}, -1)">-</button>
@@ -464,7 +540,7 @@ class OwlHacksDeliveryApp {
                             <button class="text-green-500 hover:text-green-700 w-6 h-6 flex items-center justify-center border border-gray-300 rounded" onclick="app.updateItemQuantity(${index}, 1)">+</button>
                         </div>
                     </div>
-                    ${item.notes ? `<div class="text-sm text-gray-500">${item.notes}</div>` : ''}
+                    ${item.notes ? `<div class="text-sm text-gray-500">${this.escapeHTML(item.notes)}</div>` : ''}
                     <button class="text-blue-500 hover:text-blue-700 text-xs" onclick="app.addItemNotes(${index})">Add Notes</button>
                 </div>
                 <div class="text-right">
@@ -480,9 +556,8 @@ class OwlHacksDeliveryApp {
         // Update totals
         document.getElementById('subtotal').textContent = `$${subtotal.toFixed(2)}`;
         
-        // Calculate delivery points (example: 10 points + 5% of subtotal)
-        const deliveryPoints = Math.ceil(10 + (subtotal * 0.05));
-        document.getElementById('deliveryPoints').textContent = deliveryPoints;
+        // Delivery points are priced by the server (order size, distance, time of day)
+        this.updateDeliveryQuote();
 
         // Enable/disable request button
         const requestBtn = document.getElementById('requestDeliveryBtn');
@@ -492,6 +567,45 @@ class OwlHacksDeliveryApp {
         requestBtn.disabled = !hasItems || !hasAddress;
     }
 
+    deliveryLocation(address = '') {
+        return {
+            latitude: this.currentLocation ? this.currentLocation.latitude : 39.9811,
+            longitude: this.currentLocation ? this.currentLocation.longitude : -75.1540,
+            address: address
+        };
+    }
+
+    async updateDeliveryQuote() {
+        const pointsElement = document.getElementById('deliveryPoints');
+        const establishmentId = this.selectedEstablishment && (this.selectedEstablishment._id || this.selectedEstablishment.id);
+        if (this.orderItems.length === 0 || !establishmentId) {
+            pointsElement.textContent = 0;
+            return;
+        }
+
+        // Only the newest quote counts if the cart changes while one is in flight
+        const sequence = this.quoteSequence = (this.quoteSequence || 0) + 1;
+        try {
+            const response = await fetch(`${this.baseURL}/orders/quote`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${this.token}`,
+                },
+                body: JSON.stringify({
+                    establishment_id: establishmentId,
+                    items: this.orderItems,
+                    delivery_location: this.deliveryLocation()
+                }),
+            });
+            if (response.ok && sequence === this.quoteSequence) {
+                pointsElement.textContent = (await response.json()).delivery_points;
+            }
+        } catch (error) {
+            console.error('Failed to price delivery:', error);
+        }
+    }
+
     removeOrderItem(index) {
         this.orderItems.splice(index, 1);
         this.renderOrderSidebar();
@@ -560,11 +674,7 @@ class OwlHacksDeliveryApp {
             const orderData = {
                 establishment_id: establishmentId,
                 items: this.orderItems,
-                delivery_location: {
-                    latitude: this.currentLocation ? this.currentLocation.latitude : 39.9811,
-                    longitude: this.currentLocation ? this.currentLocation.longitude : -75.1540,
-                    address: deliveryAddress
-                },
+                delivery_location: this.deliveryLocation(deliveryAddress),
                 special_instructions: specialInstructions,
                 delivery_points: deliveryPoints
             };
@@ -583,6 +693,11 @@ class OwlHacksDeliveryApp {
                 this.resetOrderForm();
                 this.loadMyOrders();
                 await this.loadCurrentUser(); // Refresh user points
+            } else if (response.status === 409) {
+                // The price moved since it was shown; show the new one and let the user confirm again
+                const error = await response.json();
+                await this.updateDeliveryQuote();
+                this.showAlert(error.detail, 'error');
             } else {
                 const error = await response.json();
                 console.error('Order placement failed:', error);
@@ -605,25 +720,54 @@ class OwlHacksDeliveryApp {
     }
 
     // Orders Display Methods
-    async loadMyOrders() {
-        try {
-            const response = await fetch(`${this.baseURL}/orders/my-orders`, {
-                headers: {
-                    'Authorization': `Bearer ${this.token}`,
-                },
-            });
+    async fetchOrderPage(path, cursor = null) {
+        // Order lists come a page at a time; X-Next-Cursor is absent on the last page
+        const separator = path.includes('?') ? '&' : '?';
+        const url = cursor
+            ? `${this.baseURL}${path}${separator}cursor=${encodeURIComponent(cursor)}`
+            : `${this.baseURL}${path}`;
+        const response = await fetch(url, {
+            headers: {
+                'Authorization': `Bearer ${this.token}`,
+            },
+        });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return { orders: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') };
+    }
 
-            if (response.ok) {
-                const orders = await response.json();
-                this.renderMyOrders(orders);
-            }
+    renderLoadMore(container, nextCursor, loadNextPage) {
+        const existing = container.querySelector('.load-more-orders');
+        if (existing) existing.remove();
+        if (!nextCursor) return;
+
+        const button = document.createElement('button');
+        button.className = 'load-more-orders w-full bg-gray-100 hover:bg-gray-200 text-gray-700 px-4 py-2 rounded-md';
+        button.textContent = 'Load more';
+        button.addEventListener('click', () => {
+            button.disabled = true;
+            loadNextPage(nextCursor);
+        });
+        container.appendChild(button);
+    }
+
+    async loadMyOrders(cursor = null) {
+        try {
+            const { orders, nextCursor } = await this.fetchOrderPage('/orders/my-orders', cursor);
+            this.renderMyOrders(orders, !!cursor);
+            this.renderLoadMore(document.getElementById('myOrdersList'), nextCursor, next => this.loadMyOrders(next));
         } catch (error) {
             this.showAlert('Failed to load orders', 'error');
         }
     }
 
-    renderMyOrders(orders) {
+    renderMyOrders(orders, append = false) {
         const container = document.getElementById('myOrdersList');
+        if (append) {
+            orders.forEach(order => {
+                this.renderOrderCard(container, order, true);
+            });
+            return;
+        }
         container.innerHTML = '';
 
         if (orders.length === 0) {
@@ -636,25 +780,39 @@ class OwlHacksDeliveryApp {
         });
     }
 
-    async loadAvailableOrders() {
+    async loadAvailableOrders(cursor = null) {
         try {
-            const response = await fetch(`${this.baseURL}/orders/available`, {
-                headers: {
-                    'Authorization': `Bearer ${this.token}`,
-                },
-            });
-
-            if (response.ok) {
-                const orders = await response.json();
-                this.renderAvailableOrders(orders);
+            // With a location, show the orders that best fit this deliverer's route first
+            if (this.currentLocation) {
+                const response = await fetch(
+                    `${this.baseURL}/orders/dispatch?lat=${this.currentLocation.latitude}&lon=${this.currentLocation.longitude}&limit=20`, {
+                    headers: {
+                        'Authorization': `Bearer ${this.token}`,
+                    },
+                });
+                if (response.ok) {
+                    const results = await response.json();
+                    this.renderAvailableOrders(results.map(candidate => ({ ...candidate.order, trip_miles: candidate.total_miles })));
+                }
+                return;
             }
+
+            const { orders, nextCursor } = await this.fetchOrderPage('/orders/available', cursor);
+            this.renderAvailableOrders(orders, !!cursor);
+            this.renderLoadMore(document.getElementById('availableOrdersList'), nextCursor, next => this.loadAvailableOrders(next));
         } catch (error) {
             this.showAlert('Failed to load available orders', 'error');
         }
     }
 
-    renderAvailableOrders(orders) {
+    renderAvailableOrders(orders, append = false) {
         const container = document.getElementById('availableOrdersList');
+        if (append) {
+            orders.forEach(order => {
+                this.renderOrderCard(container, order, false, true);
+            });
+            return;
+        }
         container.innerHTML = '';
 
         if (orders.length === 0) {
@@ -667,25 +825,24 @@ class OwlHacksDeliveryApp {
         });
     }
 
-    async loadMyDeliveries() {
+    async loadMyDeliveries(cursor = null) {
         try {
-            const response = await fetch(`${this.baseURL}/orders/delivering`, {
-                headers: {
-                    'Authorization': `Bearer ${this.token}`,
-                },
-            });
-
-            if (response.ok) {
-                const orders = await response.json();
-                this.renderMyDeliveries(orders);
-            }
+            const { orders, nextCursor } = await this.fetchOrderPage('/orders/delivering', cursor);
+            this.renderMyDeliveries(orders, !!cursor);
+            this.renderLoadMore(document.getElementById('myDeliveriesList'), nextCursor, next => this.loadMyDeliveries(next));
         } catch (error) {
             this.showAlert('Failed to load deliveries', 'error');
         }
     }
 
-    renderMyDeliveries(orders) {
+    renderMyDeliveries(orders, append = false) {
         const container = document.getElementById('myDeliveriesList');
+        if (append) {
+            orders.forEach(order => {
+                this.renderOrderCard(container, order, false, false, true);
+            });
+            return;
+        }
         container.innerHTML = '';
 
         if (orders.length === 0) {
@@ -707,60 +864,64 @@ class OwlHacksDeliveryApp {
             'completed': 'bg-gray-100 text-gray-800',
             'cancelled': 'bg-red-100 text-red-800'
         };
+        const esc = value => this.escapeHTML(value);
 
         const orderElement = document.createElement('div');
         orderElement.className = 'bg-white rounded-lg shadow-md p-6';
 
         const itemsList = order.items.map(item => 
-            `<li>${item.quantity}x ${item.name} ($${item.price.toFixed(2)})</li>`
+            `<li>${esc(item.quantity)}x ${esc(item.name)} ($${item.price.toFixed(2)})</li>`
         ).join('');
 
+        // Buttons name an action; handlers are attached below, so no order data ends up in inline scripts
+        const actions = {};
         let actionButtons = '';
         
         if (isAvailable) {
+            actions.accept = () => this.acceptOrder(order._id);
             actionButtons = `
-                <button onclick="app.acceptOrder('${order._id}')" 
+                <button data-action="accept" 
                     class="bg-green-600 hover:bg-green-700 text-white px-4 py-2 rounded-md">
-                    Accept Order (+${order.delivery_points} points)
+                    Accept Order (+${esc(order.delivery_points)} points)
                 </button>
+                ${order.trip_miles !== undefined ? `<span class="text-gray-500 text-sm ml-2">${order.trip_miles.toFixed(1)} mile trip</span>` : ''}
             `;
         } else if (isMyDelivery) {
             if (order.status === 'accepted') {
+                actions.pickUp = () => this.updateOrderStatus(order._id, 'picked_up');
                 actionButtons = `
-                    <button onclick="app.updateOrderStatus('${order._id}', 'picked_up')" 
+                    <button data-action="pickUp" 
                         class="bg-blue-600 hover:bg-blue-700 text-white px-4 py-2 rounded-md mr-2">
                         Mark as Picked Up
                     </button>
                 `;
             } else if (order.status === 'picked_up') {
+                actions.choosePhoto = () => orderElement.querySelector('.completion-image-input').click();
                 actionButtons = `
-                    <input type="file" id="completionImage-${order._id}" accept="image/*" class="hidden">
-                    <button onclick="document.getElementById('completionImage-${order._id}').click()" 
+                    <input type="file" accept="image/*" class="completion-image-input hidden">
+                    <button data-action="choosePhoto" 
                         class="bg-green-600 hover:bg-green-700 text-white px-4 py-2 rounded-md mr-2">
                         Upload Photo & Complete
                     </button>
                 `;
-                
-                // Add event listener for file upload
-                setTimeout(() => {
-                    const fileInput = document.getElementById(`completionImage-${order._id}`);
-                    if (fileInput) {
-                        fileInput.addEventListener('change', (e) => {
-                            if (e.target.files[0]) {
-                                this.uploadCompletionImage(order._id, e.target.files[0]);
-                            }
-                        });
-                    }
-                }, 100);
             }
-        } else if (isMyOrder && order.status === 'delivered' && order.completion_image_url) {
+        } else if (isMyOrder && order.status === 'delivered' && order.has_completion_image) {
             console.log('DEBUG: Showing completion button with photo for order:', order._id);
+            actions.viewPhoto = () => this.viewCompletionImage(order._id);
+            actions.complete = () => this.completeOrder(order._id);
+            // The thumbnail URL only says whether one exists; the path is always built from the order id
+            const thumbnail = order.completion_thumbnail_url
+                ? `<img src="${esc(this.orderMediaURL(order._id, 'thumbnail'))}" alt="Delivery photo"
+                    data-action="viewPhoto"
+                    class="w-16 h-16 object-cover rounded-md mr-2 inline-block align-middle cursor-pointer">`
+                : '';
             actionButtons = `
-                <button onclick="app.viewCompletionImage('${order.completion_image_url}')" 
+                ${thumbnail}
+                <button data-action="viewPhoto" 
                     class="bg-blue-600 hover:bg-blue-700 text-white px-4 py-2 rounded-md mr-2">
                     View Photo
                 </button>
-                <button onclick="app.completeOrder('${order._id}')" 
+                <button data-action="complete" 
                     class="bg-green-600 hover:bg-green-700 text-white px-4 py-2 rounded-md">
                     Confirm Received
                 </button>
@@ -768,8 +929,9 @@ class OwlHacksDeliveryApp {
         } else if (isMyOrder && order.status === 'delivered') {
             // Show complete button even without image for testing
             console.log('DEBUG: Showing completion button without photo for order:', order._id);
+            actions.complete = () => this.completeOrder(order._id);
             actionButtons = `
-                <button onclick="app.completeOrder('${order._id}')" 
+                <button data-action="complete" 
                     class="bg-green-600 hover:bg-green-700 text-white px-4 py-2 rounded-md">
                     Confirm Received (No Photo)
                 </button>
@@ -779,8 +941,8 @@ class OwlHacksDeliveryApp {
             console.log('DEBUG: My order with status:', order.status, 'Order:', order._id);
             actionButtons = `
                 <div class="text-sm text-gray-600">
-                    Order Status: ${order.status} | My Order: ${isMyOrder} | Has Photo: ${!!order.completion_image_url}
-                    <br>Order ID: ${order._id}
+                    Order Status: ${esc(order.status)} | My Order: ${isMyOrder} | Has Photo: ${!!order.has_completion_image}
+                    <br>Order ID: ${esc(order._id)}
                 </div>
             `;
         }
@@ -788,17 +950,17 @@ class OwlHacksDeliveryApp {
         orderElement.innerHTML = `
             <div class="flex justify-between items-start mb-4">
                 <div>
-                    <span class="px-2 py-1 rounded-full text-xs font-medium ${statusColors[order.status]}">
-                        ${order.status.replace('_', ' ').toUpperCase()}
+                    <span class="px-2 py-1 rounded-full text-xs font-medium ${statusColors[order.status] || ''}">
+                        ${esc(order.status.replace('_', ' ').toUpperCase())}
                     </span>
                     <div class="text-sm text-gray-500 mt-1">
-                        Order #${order._id.slice(-8)}
+                        Order #${esc(order._id.slice(-8))}
                     </div>
                 </div>
                 <div class="text-right">
-                    <div class="font-bold text-temple-red">${order.delivery_points} points</div>
+                    <div class="font-bold text-temple-red">${esc(order.delivery_points)} points</div>
                     <div class="text-sm text-gray-500">
-                        ${new Date(order.created_at).toLocaleDateString()}
+                        ${esc(new Date(order.created_at).toLocaleDateString())}
                     </div>
                 </div>
             </div>
@@ -812,16 +974,28 @@ class OwlHacksDeliveryApp {
             
             <div class="mb-4">
                 <div class="text-sm">
-                    <strong>Delivery to:</strong> ${order.delivery_location.address}
+                    <strong>Delivery to:</strong> ${esc(order.delivery_location.address)}
                 </div>
                 ${order.special_instructions ? 
-                    `<div class="text-sm mt-1"><strong>Instructions:</strong> ${order.special_instructions}</div>` : ''
+                    `<div class="text-sm mt-1"><strong>Instructions:</strong> ${esc(order.special_instructions)}</div>` : ''
                 }
             </div>
             
             ${actionButtons ? `<div class="mt-4">${actionButtons}</div>` : ''}
         `;
 
+        orderElement.querySelectorAll('[data-action]').forEach(element => {
+            element.addEventListener('click', actions[element.dataset.action]);
+        });
+        const fileInput = orderElement.querySelector('.completion-image-input');
+        if (fileInput) {
+            fileInput.addEventListener('change', (e) => {
+                if (e.target.files[0]) {
+                    this.uploadCompletionImage(order._id, e.target.files[0]);
+                }
+            });
+        }
+
         container.appendChild(orderElement);
     }
 
@@ -921,7 +1095,7 @@ class OwlHacksDeliveryApp {
             if (response.ok) {
                 const result = await response.json();
                 console.log('DEBUG: Complete order success:', result);
-                this.showAlert('Order completed! Points transferred.', 'success');
+                this.showAlert('Order completed! Points will be transferred shortly.', 'success');
                 this.loadMyOrders();
                 await this.loadCurrentUser(); // Refresh user points
             } else {
@@ -937,26 +1111,40 @@ class OwlHacksDeliveryApp {
         }
     }
 
-    viewCompletionImage(imageUrl) {
-        // Create modal to display the image
+    viewCompletionImage(orderId) {
+        // Built with DOM nodes, not markup, and always pointed at this API's own image route
         const modal = document.createElement('div');
         modal.className = 'fixed inset-0 bg-black bg-opacity-75 flex items-center justify-center z-50';
         modal.innerHTML = `
             <div class="bg-white p-4 rounded-lg max-w-lg max-h-96">
                 <div class="flex justify-between items-center mb-4">
                     <h3 class="text-lg font-semibold">Delivery Confirmation Photo</h3>
-                    <button onclick="this.parentElement.parentElement.parentElement.remove()" 
-                        class="text-gray-500 hover:text-gray-700">
+                    <button class="text-gray-500 hover:text-gray-700">
                         <i class="fas fa-times"></i>
                     </button>
                 </div>
-                <img src="${imageUrl}" alt="Delivery confirmation" class="max-w-full max-h-64 object-contain">
+                <img alt="Delivery confirmation" class="max-w-full max-h-64 object-contain">
             </div>
         `;
+        const image = modal.querySelector('img');
+        image.addEventListener('error', () => this.showAlert('Failed to load delivery photo', 'error'));
+        image.src = this.orderMediaURL(orderId, 'image');
+        modal.querySelector('button').addEventListener('click', () => modal.remove());
         document.body.appendChild(modal);
     }
 
     // Utility Methods
+    orderMediaURL(orderId, kind) {
+        // Photos are served from the blob store; <img> cannot send headers, so pass the token.
+        // Only ever built from an order id, so the token cannot be sent anywhere but this API.
+        return `${this.baseURL}/orders/${encodeURIComponent(orderId)}/${kind}?token=${encodeURIComponent(this.token)}`;
+    }
+
+    escapeHTML(value) {
+        const entities = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' };
+        return String(value ?? '').replace(/[&<>"']/g, character => entities[character]);
+    }
+
     showLoading(show) {
         const spinner = document.getElementById('loadingSpinner');
         if (show) {
@@ -989,7 +1177,7 @@ class OwlHacksDeliveryApp {
         alert.className = `${colors[type]} text-white px-6 py-3 rounded-md shadow-lg`;
         alert.innerHTML = `
             <div class="flex items-center justify-between">
-                <span>${displayMessage}</span>
+                <span>${this.escapeHTML(displayMessage)}</span>
                 <button onclick="this.parentElement.parentElement.remove()" class="ml-4">
                     <i class="fas fa-times"></i>
                 </button>